@@ -1,207 +1,632 @@
+#!/usr/bin/env python3
+"""
+GitHubのIssueを分析し、関連ファイルとコード改善案をIssueにコメントする
+
+処理はステージごとの関数に分かれています:
+    load_issue → select_files → fetch_files → pack_context → analyze → publish
+モデル（complete(prompt) を持つオブジェクト）と GitHub クライアント（post_comment を持つ
+オブジェクト）は run_pipeline に渡すため、偽のモデル・ローカルのGitHubサーバーに
+差し替えて動かせます（bench_analyze_issue.py を参照）。
+
+分析結果は (正規化したIssueのタイトル・本文, コミットSHA, プロンプトのバージョン) をキーに
+キャッシュし、同じ内容での再実行ではモデルを呼ばずに前回の結果を使います。
+コメントには目印を埋め込み、既に投稿済みのコメントがあれば新しく投稿せずに更新します。
+
+Usage:
+    python analyze_issue.py                     # GitHub Actions（GITHUB_EVENT_PATH / ISSUE_* を使用）
+    python analyze_issue.py --no-publish        # コメントせずに結果を表示
+    python analyze_issue.py --issue-number 12 --issue-title "..." --issue-body "..."
+    python analyze_issue.py --no-cache          # キャッシュを使わずに分析し直す
+"""
+
 import os
+import sys
 import json
+import time
+import hashlib
+import argparse
+import unicodedata
+import re
 import requests
-import base64
-from anthropic import Anthropic
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from code_index import CodeIndex, load_index
+from context_packer import PackedContext, pack_context
 
 # GitHub APIのベースURL
-GITHUB_API_BASE = "https://api.github.com"
-
-# 環境変数から認証情報を取得
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-if not GITHUB_TOKEN:
-    raise ValueError("環境変数 'GITHUB_TOKEN' が設定されていません。")
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-if not ANTHROPIC_API_KEY:
-    raise ValueError("環境変数 'ANTHROPIC_API_KEY' が設定されていません。")
-
-# GitHubイベントの情報を取得
-if "GITHUB_EVENT_PATH" in os.environ:
-    with open(os.environ["GITHUB_EVENT_PATH"]) as event_file:
-        github_event = json.load(event_file)
-
-    if "issue" in github_event:
-        issue_number = github_event["issue"]["number"]
-        issue_title = github_event["issue"]["title"]
-        issue_body = github_event["issue"]["body"]
-        repo_full_name = github_event["repository"]["full_name"]
-    else:
-        # workflow_dispatch からの入力を使用
-        issue_number = os.environ["ISSUE_NUMBER"]
-        issue_title = os.environ["ISSUE_TITLE"]
-        issue_body = os.environ["ISSUE_BODY"]
-        repo_full_name = os.environ["GITHUB_REPOSITORY"]
-else:
-    # workflow_dispatch からの入力を使用
-    issue_number = os.environ["ISSUE_NUMBER"]
-    issue_title = os.environ["ISSUE_TITLE"]
-    issue_body = os.environ["ISSUE_BODY"]
-    repo_full_name = os.environ["GITHUB_REPOSITORY"]
-
-# サマリーファイルの内容を読み込む
-with open("docs/summary.md") as summary_file:
-    summary_content = summary_file.read()
-
-# Claude APIクライアントを初期化
-anthropic = Anthropic(api_key=ANTHROPIC_API_KEY)
-
-# GitHub API用のヘッダーを定義
-headers = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github.v3+json",
-}
-
-# 関連ファイルを特定するためのClaude API呼び出し
-try:
-    response = anthropic.messages.create(
-        model="claude-3-5-sonnet-20240620",
-        max_tokens=2048,
-        messages=[
+GITHUB_API_BASE = os.getenv("GITHUB_API_URL", "https://api.github.com")
+
+# 改善案の生成に使うモデル
+MODEL_NAME = "claude-3-5-sonnet-20240620"
+# プロンプト・関連ファイルの選び方を変えたら上げる（古いキャッシュを使わないため）
+PROMPT_VERSION = "1"
+
+# コードインデックスから選ぶ関連ファイル数の上限
+MAX_RELATED_FILES = 20
+
+# 改善案のプロンプトに入れるコードのトークン数の上限
+CONTEXT_TOKEN_BUDGET = int(os.getenv("ANALYZE_CONTEXT_TOKENS", "30000"))
+
+# ファイル取得の同時実行数
+FETCH_WORKERS = int(os.getenv("ANALYZE_FETCH_WORKERS", "8"))
+# GitHub API から取得したファイルのキャッシュ（空文字列で無効化）
+FETCH_CACHE_DIR = os.getenv(
+    "ANALYZE_FETCH_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".issue_fetch_cache"),
+)
+# 分析結果のキャッシュ（空文字列で無効化）
+ANALYSIS_CACHE_DIR = os.getenv(
+    "ANALYZE_RESULT_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".issue_analysis_cache"),
+)
+
+# ボットのコメントを見分けるための目印（表示されないHTMLコメント）
+COMMENT_MARKER = "<!-- aituber-kit:issue-analyzer -->"
+# コメントを投稿するボットのアカウント（GITHUB_TOKEN の場合は github-actions[bot]）
+COMMENT_BOT_LOGIN = os.getenv("ANALYZE_BOT_LOGIN", "github-actions[bot]")
+
+HTML_COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.S)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+@dataclass
+class Issue:
+    number: str
+    title: str
+    body: str
+    repo_full_name: str
+
+    @property
+    def query(self) -> str:
+        """関連ファイルの検索に使うテキスト"""
+        return f"{self.title}\n{self.body}"
+
+    @property
+    def content_hash(self) -> str:
+        """空白・HTMLコメント（Issueテンプレートの説明）などの違いを無視したハッシュ"""
+        return hashlib.sha256(
+            f"{normalize_text(self.title)}\n{normalize_text(self.body)}".encode("utf-8")
+        ).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """分析結果に影響しない違い（全角・半角、空白、HTMLコメント）を取り除く"""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = HTML_COMMENT_PATTERN.sub(" ", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+class StageTimer:
+    """ステージごとの所要時間（秒）を記録する"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - started
+
+    def report(self) -> str:
+        return ", ".join(
+            f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.timings.items()
+        )
+
+
+# --- クライアント ---
+class AnthropicModel:
+    """Claude API で改善案を生成する"""
+
+    def __init__(self, api_key: str, model: str = MODEL_NAME, max_tokens: int = 2048):
+        from anthropic import Anthropic
+
+        self.client = Anthropic(api_key=api_key)
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def complete(self, prompt: str) -> str:
+        response = self.client.messages.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return response.content[0].text
+
+
+class GitHubClient:
+    """Issueへのコメントを投稿する（接続はセッションで使い回す）"""
+
+    def __init__(self, token: str, api_base: str = GITHUB_API_BASE):
+        self.api_base = api_base
+        self.session = requests.Session()
+        self.session.headers.update(
             {
-                "role": "user",
-                "content": (
-                    "あなたは、GitHubリポジトリの内容を深く理解し、Issueと関連するファイルを特定する能力を持つAIアシスタントです。以下の指示に従って、与えられたIssueに関連するファイルを特定し、JSONフォーマットで出力してください。\n\n"
-                    "まず、GitHubで作成されたIssueの内容を確認してください：\n\n"
-                    "<issue_title>\n"
-                    f"{issue_title}\n"
-                    "</issue_title>\n\n"
-                    "<issue_body>\n"
-                    f"{issue_body}\n"
-                    "</issue_body>\n\n"
-                    "次に、サマリーファイルの内容を確認してください：\n\n"
-                    "<summary_content>\n"
-                    f"{summary_content}\n"
-                    "</summary_content>\n\n"
-                    "あなたの課題は、このIssueに関連すると考えられるファイルを特定し、以下のJSONフォーマットで出力することです：\n\n"
-                    "[\n"
-                    "  {\n"
-                    '    "file_path": "ファイルパス",\n'
-                    '    "reason": "このファイルが関連すると考えられる理由"\n'
-                    "  },\n"
-                    "  ...\n"
-                    "]\n\n"
-                    "ファイルの選択と出力に関する重要なガイドライン：\n\n"
-                    "1. 関連するファイルを5つから30つ選択してください。\n"
-                    "2. できるだけ多くの候補を挙げることが望ましいです。\n"
-                    "3. 各ファイルについて、そのファイルがIssueに関連すると考えられる具体的な理由を日本語で説明してください。\n"
-                    "4. ファイルパスは、リポジトリのルートからの相対パスで指定してください。\n"
-                    "5. Issueの内容、サマリーファイルの情報、およびソフトウェア開発の一般的な知識を活用して、関連性の高いファイルを選択してください。\n\n"
-                    "出力に関する注意事項：\n"
-                    "- 必ずJSONフォーマットのみで出力してください。\n"
-                    "- JSONの前後に説明文や追加のテキストを含めないでください。\n"
-                    '- すべての説明（"reason"フィールド）は日本語で記述してください。\n\n'
-                    "それでは、Issueの内容とサマリーファイルの情報を分析し、関連するファイルをJSONフォーマットで出力してください。"
-                ),
-            },
-        ],
+                "Authorization": f"token {token}",
+                "Accept": "application/vnd.github.v3+json",
+            }
+        )
+
+    def post_comment(self, repo_full_name: str, issue_number: str, body: str) -> bool:
+        url = f"{self.api_base}/repos/{repo_full_name}/issues/{issue_number}/comments"
+        response = self.session.post(url, json={"body": body})
+        if response.status_code == 201:
+            return True
+        print(f"コメントの追加に失敗しました。ステータスコード: {response.status_code}")
+        print(response.text)
+        return False
+
+    def find_comment(
+        self, repo_full_name: str, issue_number: str, marker: str = COMMENT_MARKER
+    ) -> Optional[dict]:
+        """ボットが投稿した、目印を含むコメントを探す（複数あれば最新のもの）
+
+        ユーザーがボットのコメントを引用すると目印もコピーされるため、投稿者も確認する。
+        """
+        url = f"{self.api_base}/repos/{repo_full_name}/issues/{issue_number}/comments"
+        params: Optional[dict] = {"per_page": 100}
+        found = None
+        while url:
+            response = self.session.get(url, params=params)
+            if response.status_code != 200:
+                print(f"コメントの取得に失敗しました。ステータスコード: {response.status_code}")
+                return found
+            for comment in response.json():
+                if marker in (comment.get("body") or "") and is_bot_comment(comment):
+                    found = comment  # 一覧は古い順のため、最後に一致したものが最新
+            # 次のページのURLにはクエリが含まれる
+            url = response.links.get("next", {}).get("url")
+            params = None
+        return found
+
+    def update_comment(self, repo_full_name: str, comment_id: int, body: str) -> bool:
+        url = f"{self.api_base}/repos/{repo_full_name}/issues/comments/{comment_id}"
+        response = self.session.patch(url, json={"body": body})
+        if response.status_code == 200:
+            return True
+        print(f"コメントの更新に失敗しました。ステータスコード: {response.status_code}")
+        print(response.text)
+        return False
+
+    def upsert_comment(self, repo_full_name: str, issue_number: str, body: str) -> bool:
+        """目印付きのコメントがあれば更新し（内容が同じなら何もしない）、無ければ投稿する"""
+        existing = self.find_comment(repo_full_name, issue_number)
+        if existing is None:
+            return self.post_comment(repo_full_name, issue_number, body)
+        if existing.get("body") == body:
+            print("同じ内容のコメントが投稿済みのため、更新しません。")
+            return True
+        return self.update_comment(repo_full_name, existing["id"], body)
+
+
+def is_bot_comment(comment: dict) -> bool:
+    user = comment.get("user") or {}
+    return user.get("type") == "Bot" or user.get("login") == COMMENT_BOT_LOGIN
+
+
+# --- 分析結果のキャッシュ ---
+class AnalysisCache:
+    """関連ファイルの選択結果と改善案を保存する
+
+    キーは (正規化したIssueのハッシュ, コミットSHA, プロンプトのバージョン, モデル, トークン予算)。
+    コードが同じでIssueの内容も実質同じなら、前回の結果をそのまま使える。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = ANALYSIS_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def key(self, issue: Issue, commit_sha: str, budget: int) -> str:
+        parts = [issue.content_hash, commit_sha, PROMPT_VERSION, MODEL_NAME, str(budget)]
+        return hashlib.sha256(":".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, record: dict) -> None:
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+
+# --- ファイル取得 ---
+class LocalFetcher:
+    """チェックアウト済みの作業ツリーからファイルを読み込む"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def fetch(self, file_path: str) -> Optional[str]:
+        full_path = os.path.abspath(os.path.join(self.root, file_path))
+        if not full_path.startswith(self.root + os.sep):
+            return None  # リポジトリ外のパスは読まない
+        try:
+            with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+
+class GitHubFetcher:
+    """GitHub REST API からファイルを取得する
+
+    接続はセッションで使い回し、raw 形式で取得するため contents API の1MB制限を受けない。
+    取得結果は ETag と一緒にディスクに保存し、ref がコミットSHAなら次回はネットワークを使わず、
+    ブランチ名なら If-None-Match で変更が無いことを確認して再利用する。
+    """
+
+    def __init__(
+        self,
+        token: Optional[str],
+        repo_full_name: str,
+        ref: Optional[str] = None,
+        cache_dir: Optional[str] = FETCH_CACHE_DIR,
+        pool_size: int = FETCH_WORKERS,
+        api_base: str = GITHUB_API_BASE,
+    ):
+        self.repo_full_name = repo_full_name
+        self.api_base = api_base
+        self.ref = ref
+        self.cache_dir = cache_dir
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept"] = "application/vnd.github.raw+json"
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+
+    def _cache_path(self, file_path: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        key = f"{self.repo_full_name}:{self.ref or ''}:{file_path}"
+        return os.path.join(
+            self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def _read_cache(self, cache_path: Optional[str]) -> Optional[dict]:
+        if cache_path is None:
+            return None
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, cache_path: Optional[str], etag: str, content: str) -> None:
+        if cache_path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "content": content}, f, ensure_ascii=False)
+        os.replace(temp_path, cache_path)
+
+    def fetch(self, file_path: str) -> Optional[str]:
+        cache_path = self._cache_path(file_path)
+        cached = self._read_cache(cache_path)
+        if cached is not None and is_commit_sha(self.ref):
+            return cached["content"]  # コミットSHAの内容は変わらない
+
+        url = f"{self.api_base}/repos/{self.repo_full_name}/contents/{file_path}"
+        params = {"ref": self.ref} if self.ref else {}
+        request_headers = {}
+        if cached is not None and cached.get("etag"):
+            request_headers["If-None-Match"] = cached["etag"]
+        response = self.session.get(url, params=params, headers=request_headers)
+        if response.status_code == 304 and cached is not None:
+            return cached["content"]
+        if response.status_code != 200:
+            print(
+                f"ファイル {file_path} の取得に失敗しました。ステータスコード: {response.status_code}"
+            )
+            return None
+        response.encoding = "utf-8"
+        self._write_cache(cache_path, response.headers.get("ETag", ""), response.text)
+        return response.text
+
+
+def is_commit_sha(ref: Optional[str]) -> bool:
+    return bool(ref) and len(ref) == 40 and all(c in "0123456789abcdef" for c in ref)
+
+
+def get_fetcher(token: Optional[str], repo_full_name: str, api_base: str = GITHUB_API_BASE):
+    """作業ツリーがあればそこから、無ければ GitHub API から取得する"""
+    workspace = os.getenv("GITHUB_WORKSPACE")
+    if workspace and os.path.isdir(workspace):
+        print(f"ファイルを作業ツリーから読み込みます: {workspace}")
+        return LocalFetcher(workspace)
+    return GitHubFetcher(
+        token, repo_full_name, os.getenv("GITHUB_SHA"), api_base=api_base
     )
 
-    # Claude APIの応答を出力
-    print("Claude APIの応答:")
-    print(response.content[0].text)
-
-    # Claude APIの応答をパースしてJSONを抽出
-    content = response.content[0].text
-    # JSON部分を抽出するために [ と ] で囲まれた部分を探す
-    start = content.find("[")
-    end = content.rfind("]") + 1
-    if start != -1 and end != -1:
-        json_str = content[start:end]
-        analysis_result = json.loads(json_str)
+
+def fetch_files(fetcher, file_paths: List[str]) -> Dict[str, str]:
+    """ファイルを並列に取得し、{パス: 内容} を file_paths の順で返す（取得できないものは除く）"""
+    with ThreadPoolExecutor(max_workers=max(1, FETCH_WORKERS)) as executor:
+        contents = list(executor.map(fetcher.fetch, file_paths))
+    return {
+        file_path: content
+        for file_path, content in zip(file_paths, contents)
+        if content is not None
+    }
+
+
+# --- ステージ ---
+def load_issue(environ: Optional[Dict[str, str]] = None) -> Issue:
+    """GitHubイベント（無ければ workflow_dispatch の入力）からIssueを読み込む"""
+    environ = os.environ if environ is None else environ
+    if "GITHUB_EVENT_PATH" in environ:
+        with open(environ["GITHUB_EVENT_PATH"]) as event_file:
+            github_event = json.load(event_file)
+        if "issue" in github_event:
+            return Issue(
+                number=str(github_event["issue"]["number"]),
+                title=github_event["issue"]["title"],
+                body=github_event["issue"]["body"] or "",
+                repo_full_name=github_event["repository"]["full_name"],
+            )
+    # workflow_dispatch からの入力を使用
+    return Issue(
+        number=str(environ["ISSUE_NUMBER"]),
+        title=environ["ISSUE_TITLE"],
+        body=environ.get("ISSUE_BODY") or "",
+        repo_full_name=environ["GITHUB_REPOSITORY"],
+    )
+
+
+def select_files(
+    issue: Issue, index: CodeIndex, max_files: int = MAX_RELATED_FILES
+) -> List[Dict[str, Any]]:
+    """関連ファイルをローカルのコードインデックスで特定する
+
+    パス・シンボル・import先・コメントを BM25 で検索するため、候補は必ず実在するファイルになる。
+    """
+    return [
+        {
+            "file_path": file_path,
+            "reason": f"Issueと一致する語: {', '.join(matched[:8])}（スコア {score:.2f}）",
+            "score": round(score, 4),
+        }
+        for file_path, score, matched in index.search(issue.query, max_files)
+    ]
+
+
+def build_prompt(issue: Issue, packed: PackedContext) -> str:
+    """コード改善案を求めるプロンプトを組み立てる"""
+    return (
+        "あなたは、ソフトウェア開発プロジェクトの問題を分析し、コードの改善案を提案する優秀なプログラマーです。与えられた情報を基に、具体的なコードの改善案を日本語で提示してください。\n\n"
+        "まず、以下のIssue情報を確認してください：\n\n"
+        "<issue>\n"
+        f"タイトル: {issue.title}\n"
+        f"本文: {issue.body}\n"
+        "</issue>\n\n"
+        "次に、このIssueに関連するファイルのコードを確認してください（関連する部分のみを行番号付きで抜粋しています。省略箇所は ... で示しています）：\n\n"
+        "<file_contents>\n"
+        f"{packed.text}\n"
+        "</file_contents>\n\n"
+        "以下の手順に従って、コードを分析し改善案を作成してください：\n\n"
+        "1. Issueの内容とコードを注意深く読み、問題点を特定してください。\n"
+        "2. コードの構造、パフォーマンス、可読性、保守性などの観点から改善が必要な箇所を見つけてください。\n"
+        "3. 特定した問題点に対する具体的な改善案を考えてください。\n"
+        "4. 各改善案について、なぜその改善が必要か、どのような利点があるかを説明してください。\n"
+        "5. 可能であれば、改善後のコードの例を提示してください。\n\n"
+        "あなたの回答は以下の形式で提示してください：\n\n"
+        "<analysis>\n"
+        "[コードの分析結果と全体的な所見をここに記述してください]\n"
+        "</analysis>\n\n"
+        "<improvements>\n"
+        "[改善案を以下の形式で列挙してください]\n"
+        "1. [改善案1]\n"
+        "   説明: [なぜこの改善が必要か、どのような利点があるかの説明]\n"
+        "   改善後のコード例:\n"
+        "   ```\n"
+        "   [コードスニペット]\n"
+        "   ```\n\n"
+        "2. [改善案2]\n"
+        "   説明: [なぜこの改善が必要か、どのような利点があるかの説明]\n"
+        "   改善後のコード例:\n"
+        "   ```\n"
+        "   [コードスニペット]\n"
+        "   ```\n\n"
+        "[必要に応じて追加の改善案を記述してください]\n"
+        "</improvements>\n\n"
+        "<conclusion>\n"
+        "[全体的な結論と、これらの改善によって期待される効果をまとめてください]\n"
+        "</conclusion>\n\n"
+        "必ず日本語で回答し、専門的な用語や概念については適切に説明を加えてください。改善案は具体的で実行可能なものにし、コードの品質向上に貢献する内容にしてください。"
+    )
+
+
+def analyze(model: Any, issue: Issue, packed: PackedContext) -> str:
+    """モデルにコード改善案を生成させる"""
+    return model.complete(build_prompt(issue, packed))
+
+
+def format_comment(selection: List[Dict[str, Any]], improvement: str) -> str:
+    """Issueに投稿するコメントの本文"""
+    analysis_result = [
+        {"file_path": item["file_path"], "reason": item["reason"]} for item in selection
+    ]
+    return (
+        f"{COMMENT_MARKER}\n"
+        f"## Issue分析結果:\n\n```json\n{json.dumps(analysis_result, indent=2, ensure_ascii=False)}\n```"
+        f"\n\n## コード改善案:\n\n{improvement}"
+    )
+
+
+def publish(github: Any, issue: Issue, body: str) -> bool:
+    """分析結果とコード改善案をIssueにコメントする（投稿済みのコメントがあれば更新する）"""
+    return github.upsert_comment(issue.repo_full_name, issue.number, body)
+
+
+def run_pipeline(
+    issue: Issue,
+    model: Any,
+    github: Optional[Any],
+    fetcher: Any,
+    index: Optional[CodeIndex] = None,
+    timer: Optional[StageTimer] = None,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    cache: Optional[AnalysisCache] = None,
+    commit_sha: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Issueを分析してコメントする（github が None の場合はコメントしない）
+
+    cache と commit_sha が与えられ、同じキーの結果があればファイルの選択・取得・
+    モデルの呼び出しを省略する（その場合 packed は None）。
+
+    Returns:
+        {"selection", "packed", "improvement", "comment", "published", "cached", "timings"}
+    """
+    timer = timer or StageTimer()
+    cache_key = None
+    if cache is not None and commit_sha:
+        cache_key = cache.key(issue, commit_sha, budget)
+        with timer.stage("cache"):
+            cached = cache.get(cache_key)
+        if cached is not None:
+            print("同じ内容の分析結果がキャッシュにあるため、再利用します。")
+            return _finish(
+                issue, github, timer, cached["selection"], None, cached["improvement"], True
+            )
+
+    with timer.stage("index"):
+        index = index or load_index()
+    with timer.stage("select"):
+        selection = select_files(issue, index)
+    if not selection:
+        raise ValueError("Issueに関連するファイルが見つかりませんでした。")
+    print(f"関連ファイル: {len(selection)} 件")
+
+    with timer.stage("fetch"):
+        fetched = fetch_files(fetcher, [item["file_path"] for item in selection])
+    with timer.stage("pack"):
+        # Issueとの関連度が高い関数・領域だけを行番号付きでトークン予算内に詰める
+        packed = pack_context(
+            issue.query,
+            fetched,
+            budget,
+            {item["file_path"]: item["score"] for item in selection},
+        )
+    print(
+        f"コンテキスト: {packed.tokens} / {packed.budget} トークン, "
+        f"{len(packed.included)} ファイル（省略: {packed.omitted}）"
+    )
+
+    with timer.stage("analyze"):
+        improvement = analyze(model, issue, packed)
+    if cache_key is not None:
+        cache.put(cache_key, {"selection": selection, "improvement": improvement})
+    return _finish(issue, github, timer, selection, packed, improvement, False)
+
+
+def _finish(
+    issue: Issue,
+    github: Optional[Any],
+    timer: StageTimer,
+    selection: List[Dict[str, Any]],
+    packed: Optional[PackedContext],
+    improvement: str,
+    cached: bool,
+) -> Dict[str, Any]:
+    comment = format_comment(selection, improvement)
+    published = False
+    if github is not None:
+        with timer.stage("publish"):
+            published = publish(github, issue, comment)
+    return {
+        "selection": selection,
+        "packed": packed,
+        "improvement": improvement,
+        "comment": comment,
+        "published": published,
+        "cached": cached,
+        "timings": timer.timings,
+    }
+
+
+# --- メイン処理 ---
+def require_env(name: str) -> str:
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"環境変数 '{name}' が設定されていません。")
+    return value
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="GitHubのIssueを分析し、関連ファイルとコード改善案をコメントする"
+    )
+    parser.add_argument("--issue-number", help="Issue番号（省略時は環境変数から読む）")
+    parser.add_argument("--issue-title", help="Issueのタイトル")
+    parser.add_argument("--issue-body", default="", help="Issueの本文")
+    parser.add_argument(
+        "--no-publish", action="store_true", help="コメントせずに結果を標準出力に表示する"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="キャッシュした分析結果を使わない"
+    )
+    args = parser.parse_args(argv)
+
+    if args.issue_number:
+        issue = Issue(
+            args.issue_number,
+            args.issue_title or "",
+            args.issue_body,
+            require_env("GITHUB_REPOSITORY"),
+        )
     else:
-        raise ValueError("Claude APIの応答からJSONを抽出できませんでした。")
-
-except json.JSONDecodeError as e:
-    print(f"JSONのパースに失敗しました。エラー: {e}")
-    print(f"Claude APIの応答: {content}")
-    exit(1)
-except Exception as e:
-    print(f"Claude APIリクエストに失敗しました。エラー: {e}")
-    exit(1)
-
-# 関連ファイルのコードを取得
-file_contents = {}
-for file_info in analysis_result:
-    file_path = file_info["file_path"]
-    file_url = f"{GITHUB_API_BASE}/repos/{repo_full_name}/contents/{file_path}"
-    file_response = requests.get(file_url, headers=headers)
-    if file_response.status_code == 200:
-        file_content = file_response.json()["content"]
-        decoded_content = base64.b64decode(file_content).decode("utf-8")
-        file_contents[
-            file_path
-        ] = f"File Path: {file_path}\n\nContent:\n{decoded_content}"
+        issue = load_issue()
+    model = AnthropicModel(require_env("ANTHROPIC_API_KEY"))
+    token = os.getenv("GITHUB_TOKEN") if args.no_publish else require_env("GITHUB_TOKEN")
+    github = None if args.no_publish else GitHubClient(token)
+    fetcher = get_fetcher(token, issue.repo_full_name)
+
+    timer = StageTimer()
+    try:
+        result = run_pipeline(
+            issue,
+            model,
+            github,
+            fetcher,
+            timer=timer,
+            cache=None if args.no_cache else AnalysisCache(),
+            commit_sha=os.getenv("GITHUB_SHA"),
+        )
+    except Exception as e:
+        print(f"Issueの分析に失敗しました。エラー: {e}")
+        return 1
+    print(f"所要時間: {timer.report()}")
+
+    if args.no_publish:
+        print(result["comment"])
+    elif result["published"]:
+        print("分析結果とコード改善案をIssueにコメントとして追加しました。")
     else:
-        print(f"ファイル {file_path} の取得に失敗しました。ステータスコード: {file_response.status_code}")
-
-# コード改善案を求めるためのClaude API呼び出し
-try:
-    improvement_response = anthropic.messages.create(
-        model="claude-3-5-sonnet-20240620",
-        max_tokens=2048,
-        messages=[
-            {
-                "role": "user",
-                "content": (
-                    "あなたは、ソフトウェア開発プロジェクトの問題を分析し、コードの改善案を提案する優秀なプログラマーです。与えられた情報を基に、具体的なコードの改善案を日本語で提示してください。\n\n"
-                    "まず、以下のIssue情報を確認してください：\n\n"
-                    "<issue>\n"
-                    f"タイトル: {issue_title}\n"
-                    f"本文: {issue_body}\n"
-                    "</issue>\n\n"
-                    "次に、このIssueに関連するファイルのコードを確認してください：\n\n"
-                    "<file_contents>\n"
-                    f"{json.dumps(file_contents, indent=2, ensure_ascii=False)}\n"
-                    "</file_contents>\n\n"
-                    "以下の手順に従って、コードを分析し改善案を作成してください：\n\n"
-                    "1. Issueの内容とコードを注意深く読み、問題点を特定してください。\n"
-                    "2. コードの構造、パフォーマンス、可読性、保守性などの観点から改善が必要な箇所を見つけてください。\n"
-                    "3. 特定した問題点に対する具体的な改善案を考えてください。\n"
-                    "4. 各改善案について、なぜその改善が必要か、どのような利点があるかを説明してください。\n"
-                    "5. 可能であれば、改善後のコードの例を提示してください。\n\n"
-                    "あなたの回答は以下の形式で提示してください：\n\n"
-                    "<analysis>\n"
-                    "[コードの分析結果と全体的な所見をここに記述してください]\n"
-                    "</analysis>\n\n"
-                    "<improvements>\n"
-                    "[改善案を以下の形式で列挙してください]\n"
-                    "1. [改善案1]\n"
-                    "   説明: [なぜこの改善が必要か、どのような利点があるかの説明]\n"
-                    "   改善後のコード例:\n"
-                    "   ```\n"
-                    "   [コードスニペット]\n"
-                    "   ```\n\n"
-                    "2. [改善案2]\n"
-                    "   説明: [なぜこの改善が必要か、どのような利点があるかの説明]\n"
-                    "   改善後のコード例:\n"
-                    "   ```\n"
-                    "   [コードスニペット]\n"
-                    "   ```\n\n"
-                    "[必要に応じて追加の改善案を記述してください]\n"
-                    "</improvements>\n\n"
-                    "<conclusion>\n"
-                    "[全体的な結論と、これらの改善によって期待される効果をまとめてください]\n"
-                    "</conclusion>\n\n"
-                    "必ず日本語で回答し、専門的な用語や概念については適切に説明を加えてください。改善案は具体的で実行可能なものにし、コードの品質向上に貢献する内容にしてください。"
-                ),
-            },
-        ],
-    )
-    improvement_result = improvement_response.content[0].text
-except Exception as e:
-    print(f"Claude APIリクエストに失敗しました。エラー: {e}")
-    exit(1)
-
-# GitHubのIssueにコメントを追加
-comment_url = f"{GITHUB_API_BASE}/repos/{repo_full_name}/issues/{issue_number}/comments"
-comment_data = {
-    "body": f"## Issue分析結果:\n\n```json\n{json.dumps(analysis_result, indent=2, ensure_ascii=False)}\n```\n\n## コード改善案:\n\n{improvement_result}"
-}
-
-response = requests.post(comment_url, headers=headers, json=comment_data)
-
-if response.status_code == 201:
-    print("分析結果とコード改善案をIssueにコメントとして追加しました。")
-else:
-    print(f"コメントの追加に失敗しました。ステータスコード: {response.status_code}")
-    print(response.text)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,21 @@
 import os
+import re
 import json
+import time
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import subprocess
 import requests
-import base64
-from typing import Dict, List, Any, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
 
-from langchain_openai import ChatOpenAI
+from tenacity import AsyncRetrying, stop_after_attempt, wait_random_exponential
+
+from token_count import estimate_tokens
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 # GitHub APIのベースURL
 GITHUB_API_BASE = "https://api.github.com"
@@ -15,24 +26,53 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TARGET_BRANCH = os.getenv("TARGET_BRANCH")
 BASE_BRANCH = os.getenv("BASE_BRANCH")
 REPO_FULL_NAME = os.getenv("REPO_FULL_NAME")
+# "stub" を指定するとAPIを呼ばずに翻訳結果を模擬するローカルLLMを使う
+TRANSLATE_LLM = os.getenv("TRANSLATE_LLM", "openai")
+
+# 翻訳元・既存翻訳ファイルの取得方法
+#   github:   GitHub REST API から取得する（GITHUB_TOKEN, REPO_FULL_NAME が必要）
+#   git:      ローカルリポジトリから `git show <ref>:<path>` で取得する
+#   worktree: TARGET_BRANCH（未指定ならチェックアウト中の内容）は作業ツリーから、
+#             それ以外のブランチは `git show` で取得する
+TRANSLATE_SOURCE = os.getenv(
+    "TRANSLATE_SOURCE", "github" if GITHUB_TOKEN and REPO_FULL_NAME else "worktree"
+)
+TRANSLATE_SOURCES = ("github", "git", "worktree")
+
+# 実行モード
+#   diff:      ベースとターゲットの ja/translation.json の差分だけを翻訳する
+#   reconcile: 全言語のファイルを日本語の原文と照合し、欠落・余分・未翻訳のキーを修復する
+TRANSLATE_MODE = os.getenv("TRANSLATE_MODE", "diff")
+TRANSLATE_MODES = ("diff", "reconcile")
+
+
+class ConfigurationError(ValueError):
+    """環境変数・ブランチの指定の誤り（CLIではメッセージだけを表示して終了する）"""
+
+
+def check_environment() -> None:
+    """実行に必要な環境変数が設定されているか確認する"""
+    required = ["BASE_BRANCH"] if TRANSLATE_MODE == "diff" else []
+    if TRANSLATE_LLM != "stub" and not DRY_RUN:
+        required.append("OPENAI_API_KEY")
+    if TRANSLATE_SOURCE != "worktree":
+        required.append("TARGET_BRANCH")
+    if TRANSLATE_SOURCE == "github":
+        required += ["GITHUB_TOKEN", "REPO_FULL_NAME"]
+    for name in required:
+        if not os.getenv(name):
+            raise ConfigurationError(f"環境変数 '{name}' が設定されていません。")
+    if TRANSLATE_SOURCE not in TRANSLATE_SOURCES:
+        raise ConfigurationError(
+            f"環境変数 'TRANSLATE_SOURCE' の値が不正です: {TRANSLATE_SOURCE} "
+            f"({', '.join(TRANSLATE_SOURCES)} のいずれかを指定してください)"
+        )
+    if TRANSLATE_MODE not in TRANSLATE_MODES:
+        raise ConfigurationError(
+            f"環境変数 'TRANSLATE_MODE' の値が不正です: {TRANSLATE_MODE} "
+            f"({', '.join(TRANSLATE_MODES)} のいずれかを指定してください)"
+        )
 
-# --- 環境変数チェック ---
-if not GITHUB_TOKEN:
-    raise ValueError("環境変数 'GITHUB_TOKEN' が設定されていません。")
-if not OPENAI_API_KEY:
-    raise ValueError("環境変数 'OPENAI_API_KEY' が設定されていません。")
-if not TARGET_BRANCH:
-    raise ValueError("環境変数 'TARGET_BRANCH' が設定されていません。")
-if not BASE_BRANCH:
-    raise ValueError("環境変数 'BASE_BRANCH' が設定されていません。")
-if not REPO_FULL_NAME:
-    raise ValueError("環境変数 'REPO_FULL_NAME' が設定されていません。")
-
-# GitHub API用のヘッダー
-headers = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github.v3+json",
-}
 
 # 翻訳対象の言語リスト (日本語を除く)
 TARGET_LANGUAGES = [
@@ -56,140 +96,1680 @@ TARGET_LANGUAGES = [
 # 翻訳対象のファイルパス (固定)
 SOURCE_JSON_PATH = "locales/ja/translation.json"
 
+# --- バッチ翻訳の設定 ---
+# 1リクエストに詰める原文のトークン数の上限（出力は言語数倍になるため控えめにする）
+BATCH_TOKEN_BUDGET = int(os.getenv("TRANSLATE_BATCH_TOKENS", "1500"))
+# 1リクエストに詰めるリーフ数の上限
+BATCH_MAX_ITEMS = int(os.getenv("TRANSLATE_BATCH_ITEMS", "40"))
+# 1リクエストでまとめて翻訳する言語数
+LANGUAGES_PER_REQUEST = int(os.getenv("TRANSLATE_LANGUAGES_PER_REQUEST", "1"))
+# "1" にするとバッチ応答を1行1件でストリーミングし、届いた行から検証する
+STREAM_BATCHES = os.getenv("TRANSLATE_STREAM", "").lower() in ("1", "true", "yes")
+
+# --- 並列実行の設定 ---
+# 同時に実行するLLMリクエスト数の上限
+MAX_CONCURRENCY = int(os.getenv("TRANSLATE_CONCURRENCY", "8"))
+# 1秒あたりに開始するLLMリクエスト数の上限（トークンバケットの補充速度）
+REQUESTS_PER_SECOND = float(os.getenv("TRANSLATE_REQUESTS_PER_SECOND", "5"))
+# 1リクエストあたりの最大試行回数
+MAX_ATTEMPTS = int(os.getenv("TRANSLATE_MAX_ATTEMPTS", "4"))
+# 途中結果の保存先（正常終了時に削除される）
+CHECKPOINT_PATH = os.getenv(
+    "TRANSLATE_CHECKPOINT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".translate_checkpoint.json"),
+)
+
+# --- 計測の設定 ---
+# "1" にするとLLMを呼ばずに呼び出し回数・バッチ・トークン数の見積もりだけを出力する
+DRY_RUN = os.getenv("TRANSLATE_DRY_RUN", "").lower() in ("1", "true", "yes")
+# 実行時の計測結果（JSON）の保存先（空文字列なら標準出力にのみ出力する）
+METRICS_PATH = os.getenv("TRANSLATE_METRICS", "")
+
+# --- 翻訳メモリの設定 ---
+# 使用するモデル名
+MODEL_NAME = "gpt-4.1-mini"
+# プロンプトを変更したら上げる（翻訳メモリの過去の結果を使わなくなる）
+PROMPT_VERSION = "2"
+# 翻訳メモリのパス（空文字列で無効化）。リポジトリにコミットして実行間で共有する
+# （TRANSLATE_LLM=stub の場合は読み込むだけで追記しない）
+TRANSLATION_MEMORY_PATH = os.getenv(
+    "TRANSLATION_MEMORY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation_memory.jsonl"),
+)
+
 
 # --- LLM ---
+class StubLLM:
+    """APIを呼ばずに翻訳結果を模擬するローカルLLM（動作確認用）
+
+    バッチ翻訳のリクエストにはIDごとに "[言語] 原文" を返し、
+    単体翻訳のリクエストには "[言語] 原文" をそのまま返す。
+    """
+
+    class Response:
+        def __init__(self, content: str):
+            self.content = content
+
+    def invoke(self, messages: List[Dict[str, str]]) -> "StubLLM.Response":
+        prompt = messages[-1]["content"]
+        payload = _extract_json(prompt.rsplit("\n\n", 1)[-1])
+        if isinstance(payload, dict) and "items" in payload:
+            result = {
+                lang: {
+                    item_id: f"[{lang}] {text}"
+                    for item_id, text in payload["items"].items()
+                }
+                for lang in payload["languages"]
+            }
+            return self.Response(json.dumps(result, ensure_ascii=False))
+
+        match = re.search(r"to (\S+)\. .*Text to translate: \"(.*)\"$", prompt, re.S)
+        if not match:
+            return self.Response("")
+        return self.Response(f"[{match.group(1)}] {match.group(2)}")
+
+    async def ainvoke(self, messages: List[Dict[str, str]]) -> "StubLLM.Response":
+        await asyncio.sleep(0)
+        return self.invoke(messages)
+
+    async def astream(self, messages: List[Dict[str, str]]):
+        """バッチ翻訳の結果を1行1件の形式で少しずつ返す"""
+        content = self.invoke(messages).content
+        data = _extract_json(content)
+        if isinstance(data, dict):
+            content = "".join(
+                json.dumps(
+                    {"language": lang, "id": item_id, "text": text}, ensure_ascii=False
+                )
+                + "\n"
+                for lang, translated in data.items()
+                for item_id, text in translated.items()
+            )
+        for start in range(0, len(content), 16):
+            await asyncio.sleep(0)
+            yield self.Response(content[start : start + 16])
+
+
 def get_llm():
     """LLMインスタンスを取得する"""
-    return ChatOpenAI(model="gpt-4.1-mini", temperature=0, api_key=OPENAI_API_KEY)
+    if TRANSLATE_LLM == "stub":
+        return StubLLM()
+    # スタブ・ドライランでは langchain_openai が無くても動くように、ここで読み込む
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model=MODEL_NAME, temperature=0, api_key=OPENAI_API_KEY)
+
+
+# --- ファイル取得 ---
+class GitHubProvider:
+    """GitHub REST API からファイルを取得する（接続はセッションで使い回す）"""
+
+    def __init__(self, token: str, repo_full_name: str, pool_size: int = 16):
+        self.repo_full_name = repo_full_name
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {
+                "Authorization": f"token {token}",
+                # raw 形式ならcontents APIの1MB制限を超えるファイルも取得できる
+                "Accept": "application/vnd.github.raw+json",
+            }
+        )
+
+    def get_file_content(
+        self, file_path: str, ref: Optional[str] = None
+    ) -> Optional[str]:
+        """指定されたファイルの内容を取得する"""
+        url = f"{GITHUB_API_BASE}/repos/{self.repo_full_name}/contents/{file_path}"
+        params = {}
+        if ref:
+            params["ref"] = ref
+
+        try:
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            return response.text
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404:
+                print(f"ファイルが見つかりません: {file_path} (ref: {ref})")
+                return None  # ファイルが存在しない
+            else:
+                print(f"ファイル取得エラー ({file_path}, ref: {ref}): {e}")
+                raise
+        except Exception as e:
+            print(f"予期せぬエラー ({file_path}, ref: {ref}): {e}")
+            raise
+
+
+class GitProvider:
+    """ローカルリポジトリからファイルを取得する
+
+    worktree_ref と一致するref（または ref 未指定）は作業ツリーから読み込み、
+    それ以外は `git show <ref>:<path>` で読み込む。ref が見つからない場合は
+    origin/<ref> を試す。
+    """
+
+    def __init__(self, root: str = ".", worktree_ref: Optional[str] = None):
+        self.root = root
+        self.worktree_ref = worktree_ref
+
+    def get_file_content(
+        self, file_path: str, ref: Optional[str] = None
+    ) -> Optional[str]:
+        """指定されたファイルの内容を取得する"""
+        if ref is None or ref == self.worktree_ref:
+            try:
+                with open(
+                    os.path.join(self.root, file_path), "r", encoding="utf-8"
+                ) as f:
+                    return f.read()
+            except FileNotFoundError:
+                print(f"ファイルが見つかりません: {file_path} (作業ツリー)")
+                return None
+
+        for candidate in (ref, f"origin/{ref}"):
+            if not self._ref_exists(candidate):
+                continue
+            result = subprocess.run(
+                ["git", "-C", self.root, "show", f"{candidate}:{file_path}"],
+                capture_output=True,
+            )
+            if result.returncode != 0:
+                print(f"ファイルが見つかりません: {file_path} (ref: {candidate})")
+                return None
+            return result.stdout.decode("utf-8")
+
+        raise ConfigurationError(
+            f"ブランチ '{ref}' がローカルリポジトリに見つかりません。"
+        )
+
+    def _ref_exists(self, ref: str) -> bool:
+        command = ["git", "-C", self.root, "rev-parse", "--verify", "--quiet"]
+        result = subprocess.run(command + [f"{ref}^{{commit}}"], capture_output=True)
+        return result.returncode == 0
+
 
+def get_provider():
+    """TRANSLATE_SOURCE に応じたファイル取得方法を返す"""
+    if TRANSLATE_SOURCE == "github":
+        return GitHubProvider(GITHUB_TOKEN, REPO_FULL_NAME)
+    if TRANSLATE_SOURCE == "git":
+        return GitProvider()
+    return GitProvider(worktree_ref=TARGET_BRANCH)
 
-# --- GitHub API 関数 ---
-def get_file_content(file_path: str, ref: Optional[str] = None) -> Optional[str]:
-    """指定されたファイルの内容を取得する"""
-    url = f"{GITHUB_API_BASE}/repos/{REPO_FULL_NAME}/contents/{file_path}"
-    params = {}
-    if ref:
-        params["ref"] = ref
 
+def replace_file(file_path: str, data: bytes) -> None:
+    """同じディレクトリの一時ファイルに書き込んでから file_path と置き換える
+
+    一時ファイル名は実行ごとに一意なので、同時に実行しても互いの書き込みを壊さない。
+    既存ファイルの権限を引き継ぐ（新規作成の場合は 0o644）。失敗した場合は一時ファイルを
+    削除して例外を送出する。
+    """
+    directory = os.path.dirname(file_path) or "."
+    temp = tempfile.NamedTemporaryFile(
+        dir=directory,
+        prefix=f".{os.path.basename(file_path)}.",
+        suffix=".tmp",
+        delete=False,
+    )
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        content = response.json().get("content")
-        if content:
-            return base64.b64decode(content).decode("utf-8")
-        return ""  # ファイルは存在するが空の場合
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            print(f"ファイルが見つかりません: {file_path} (ref: {ref})")
-            return None  # ファイルが存在しない
+        with temp:
+            temp.write(data)
+            temp.flush()
+            os.fsync(temp.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp.name)
         else:
-            print(f"ファイル取得エラー ({file_path}, ref: {ref}): {e}")
-            raise
-    except Exception as e:
-        print(f"予期せぬエラー ({file_path}, ref: {ref}): {e}")
+            os.chmod(temp.name, 0o644)
+        os.replace(temp.name, file_path)
+    except BaseException:
+        try:
+            os.remove(temp.name)
+        except OSError:
+            pass
         raise
 
 
-def save_file_locally(file_path: str, content: str) -> bool:
-    """ファイルをローカルに保存する"""
+def write_file_atomic(file_path: str, content: str) -> Optional[bool]:
+    """ファイルを一時ファイル経由で置き換えて保存する（中断されても壊れたファイルを残さない）
+
+    既存ファイルと内容（バイト列）が同じ場合は書き込まない。
+
+    Returns:
+        保存した場合は True、内容が同じ場合は False、保存に失敗した場合は None
+    """
+    data = content.encode("utf-8")
     try:
-        # ディレクトリが存在しない場合は作成
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
-        print(f"ファイル保存成功: {file_path}")
+    try:
+        # ディレクトリが存在しない場合は作成
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        replace_file(file_path, data)
         return True
     except Exception as e:
         print(f"ファイル保存失敗 ({file_path}): {e}")
-        return False
+        return None
 
 
 # --- 差分計算 & 翻訳関数 ---
+def escape_pointer(key: Any) -> str:
+    """JSONポインタの1要素をエスケープする（RFC 6901）"""
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def split_pointer(pointer: str) -> List[str]:
+    """JSONポインタを要素のリストに分解する"""
+    if not pointer:
+        return []
+    return [
+        part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")
+    ]
+
+
 def get_json_diff(
-    base_json: Dict[str, Any], target_json: Dict[str, Any]
+    base_json: Dict[str, Any], target_json: Dict[str, Any], path: str = ""
 ) -> Dict[str, Any]:
-    """2つのJSONオブジェクト間の差分を計算する"""
-    base_keys = set(base_json.keys())
-    target_keys = set(target_json.keys())
-
-    added_keys = target_keys - base_keys
-    deleted_keys = base_keys - target_keys
-    common_keys = base_keys & target_keys
-
-    modified_keys = {
-        key
-        for key in common_keys
-        if json.dumps(base_json[key], sort_keys=True)
-        != json.dumps(target_json[key], sort_keys=True)
-    }
+    """2つのJSONオブジェクト間の差分をJSONポインタ単位で計算する
+
+    辞書は再帰的に比較し、それ以外（文字列・リストなど）は値全体を1つのリーフとして扱う。
+    キーの順序は target_json（削除は base_json）の順序に従う。
+
+    Returns:
+        {"added": {ポインタ: 値}, "modified": {ポインタ: 値}, "deleted": [ポインタ]}
+    """
+    diff = {"added": {}, "modified": {}, "deleted": []}
+
+    for key, value in target_json.items():
+        pointer = f"{path}/{escape_pointer(key)}"
+        if key not in base_json:
+            diff["added"][pointer] = value
+        elif isinstance(value, dict) and isinstance(base_json[key], dict):
+            child = get_json_diff(base_json[key], value, pointer)
+            diff["added"].update(child["added"])
+            diff["modified"].update(child["modified"])
+            diff["deleted"].extend(child["deleted"])
+        elif base_json[key] != value or type(base_json[key]) is not type(value):
+            diff["modified"][pointer] = value
+
+    for key in base_json:
+        if key not in target_json:
+            diff["deleted"].append(f"{path}/{escape_pointer(key)}")
 
-    diff = {
-        "added": {key: target_json[key] for key in added_keys},
-        "modified": {key: target_json[key] for key in modified_keys},
-        "deleted": list(deleted_keys),
-    }
     return diff
 
 
-def translate_text(text: str, target_language: str, llm: ChatOpenAI) -> str:
-    """指定されたテキストを翻訳する（JSONの値用）"""
-    if not isinstance(text, str) or not text.strip():
-        return text  # 文字列でない場合や空文字列はそのまま返す
+def _insert_key(
+    node: Dict[str, Any], key: str, value: Any, order: Optional[List[str]]
+) -> None:
+    """辞書にキーを追加する。order（原文のキー順）があればその位置に挿入する
 
+    原文で直前にある既存キーの後ろ（無ければ直後にある既存キーの前）に入れ、
+    どちらも無い場合は末尾に追加する。
+    """
+    if key in node or not order or key not in order:
+        node[key] = value
+        return
+    index = order.index(key)
+    anchor = None
+    for before in reversed(order[:index]):
+        if before in node:
+            anchor = (before, 1)
+            break
+    else:
+        for after in order[index + 1 :]:
+            if after in node:
+                anchor = (after, 0)
+                break
+    if anchor is None:
+        node[key] = value
+        return
+
+    items = list(node.items())
+    position = [k for k, _ in items].index(anchor[0]) + anchor[1]
+    items.insert(position, (key, value))
+    node.clear()
+    node.update(items)
+
+
+def set_pointer(
+    document: Dict[str, Any],
+    pointer: str,
+    value: Any,
+    source: Optional[Dict[str, Any]] = None,
+) -> None:
+    """JSONポインタの位置に値を設定する
+
+    既存のキーはその位置のまま値だけを置き換え、途中の辞書が無ければ作成する。
+    source（原文）を渡すと、新しいキーは原文と同じ位置に挿入する。
+    """
+    parts = split_pointer(pointer)
+    node = document
+    for depth, part in enumerate(parts):
+        order = list(source) if isinstance(source, dict) else None
+        if depth == len(parts) - 1:
+            _insert_key(node, part, value, order)
+            return
+        if not isinstance(node.get(part), dict):
+            if part in node:
+                node[part] = {}
+            else:
+                _insert_key(node, part, {}, order)
+        node = node[part]
+        source = source.get(part) if isinstance(source, dict) else None
+
+
+def delete_pointer(document: Dict[str, Any], pointer: str) -> bool:
+    """JSONポインタの位置の値を削除する（存在しない場合は False）"""
+    parts = split_pointer(pointer)
+    node = document
+    for part in parts[:-1]:
+        node = node.get(part)
+        if not isinstance(node, dict):
+            return False
+    if parts[-1] not in node:
+        return False
+    del node[parts[-1]]
+    return True
+
+
+def flatten_json(value: Dict[str, Any], path: str = "") -> Dict[str, Any]:
+    """辞書を {JSONポインタ: 値} に平坦化する（get_json_diff と同じく辞書以外はリーフ）"""
+    flat = {}
+    for key, item in value.items():
+        pointer = f"{path}/{escape_pointer(key)}"
+        if isinstance(item, dict):
+            flat.update(flatten_json(item, pointer))
+        else:
+            flat[pointer] = item
+    return flat
+
+
+# ひらがな・カタカナ。未翻訳のまま残った値の判定に使う
+# （漢字だけの文字列は中国語の翻訳と一致し得るため対象にしない）
+KANA_PATTERN = re.compile(r"[぀-ヿ]")
+
+
+def is_stale(source_value: Any, current_value: Any) -> bool:
+    """既存の翻訳が作り直しを必要とするか判定する
+
+    型が原文と異なる値と、かなを含む原文がそのまま残っている値を古いとみなす。
+    """
+    if type(source_value) is not type(current_value):
+        return True
+    if source_value != current_value:
+        return False
+    return any(
+        KANA_PATTERN.search(text) for text in collect_leaves(source_value).values()
+    )
+
+
+def _is_related_pointer(pointer: str, others: List[str]) -> bool:
+    """pointer が others のいずれかと同じか、その祖先・子孫か判定する"""
+    return any(
+        pointer == other
+        or other.startswith(f"{pointer}/")
+        or pointer.startswith(f"{other}/")
+        for other in others
+    )
+
+
+def get_reconcile_diff(
+    source_json: Dict[str, Any], lang_json: Dict[str, Any]
+) -> Dict[str, Any]:
+    """1言語のファイルを原文と照合し、get_json_diff と同じ形式の修復内容を返す
+
+    平坦化したキーの集合演算で欠落（原文にだけある）・余分（翻訳にだけある）・
+    古い（is_stale）キーを求める。欠落と古いキーは "added" に原文の値で入れ、
+    余分なキーは "deleted" に入れる。書き込むキーの祖先・子孫は置き換えで消えるため削除しない。
+
+    Returns:
+        {"added": {ポインタ: 値}, "modified": {}, "deleted": [ポインタ],
+         "missing": [ポインタ], "stale": [ポインタ]}
+    """
+    source_flat = flatten_json(source_json)
+    lang_flat = flatten_json(lang_json)
+    missing = [pointer for pointer in source_flat if pointer not in lang_flat]
+    stale = [
+        pointer
+        for pointer in source_flat
+        if pointer in lang_flat and is_stale(source_flat[pointer], lang_flat[pointer])
+    ]
+    repaired = set(missing) | set(stale)
+    extra = [
+        pointer
+        for pointer in lang_flat
+        if pointer not in source_flat
+        and not _is_related_pointer(pointer, list(repaired))
+    ]
+    return {
+        # 原文のキー順に並べる（欠落と古いキーを分けずに書き込む）
+        "added": {
+            pointer: value
+            for pointer, value in source_flat.items()
+            if pointer in repaired
+        },
+        "modified": {},
+        "deleted": extra,
+        "missing": missing,
+        "stale": stale,
+    }
+
+
+# --- プレースホルダー処理 ---
+# 翻訳で変えてはいけない部分（i18next の補間・ネスト、タグ、URL）
+PLACEHOLDER_PATTERN = re.compile(
+    r"\{\{[^{}]*\}\}|\$t\([^()]*\)|</?[A-Za-z0-9]+\s*/?>|https?://[^\s\"'<>]+"
+)
+# プレースホルダーを置き換える番号付きの目印
+SENTINEL_PATTERN = re.compile(r"⟦(\d+)⟧")
+# 数値・バージョン番号（翻訳不要の判定用）
+NUMBER_PATTERN = re.compile(r"\bv?\d+(?:[.,:]\d+)*\b")
+# 記号と空白だけの文字列（翻訳不要の判定用）
+SYMBOLS_ONLY_PATTERN = re.compile(r"^[\W_]*$")
+# 翻訳しない固有名詞（TRANSLATE_PROTECTED_TERMS にカンマ区切りで追加できる）
+PROTECTED_TERMS = [
+    "AITuberKit",
+    "YouTube",
+    "OpenAI",
+    "Azure",
+    "Live2D",
+    "VRM",
+    "VRMA",
+    "ON",
+    "OFF",
+] + [
+    term.strip()
+    for term in os.getenv("TRANSLATE_PROTECTED_TERMS", "").split(",")
+    if term.strip()
+]
+PROTECTED_TERMS_PATTERN = re.compile(
+    r"\b(?:"
+    + "|".join(re.escape(term) for term in sorted(PROTECTED_TERMS, key=len, reverse=True))
+    + r")\b"
+)
+# プレースホルダーが壊れた翻訳を個別に翻訳し直す回数
+PLACEHOLDER_RETRIES = int(os.getenv("TRANSLATE_PLACEHOLDER_RETRIES", "2"))
+
+
+def mask_placeholders(text: str) -> Tuple[str, List[str]]:
+    """プレースホルダーを ⟦番号⟧ に置き換え、(置換後の文字列, 元のプレースホルダー) を返す
+
+    原文に目印と同じ形式の文字列が含まれる場合は置き換えない。
+    """
+    if SENTINEL_PATTERN.search(text):
+        return text, []
+    placeholders = []
+
+    def replace(match: re.Match) -> str:
+        placeholders.append(match.group(0))
+        return f"⟦{len(placeholders) - 1}⟧"
+
+    return PLACEHOLDER_PATTERN.sub(replace, text), placeholders
+
+
+def unmask_placeholders(text: str, placeholders: List[str]) -> Optional[str]:
+    """⟦番号⟧ を元のプレースホルダーに戻す
+
+    各目印がちょうど1回ずつ現れない場合（欠落・重複・未知の番号）は None を返す。
+    """
+    if not placeholders:
+        return text
+    indices = sorted(int(index) for index in SENTINEL_PATTERN.findall(text))
+    if indices != list(range(len(placeholders))):
+        return None
+    return SENTINEL_PATTERN.sub(lambda m: placeholders[int(m.group(1))], text)
+
+
+def placeholders_match(source: str, translated: str) -> bool:
+    """原文と翻訳でプレースホルダーの多重集合が一致するか確認する"""
+    return sorted(PLACEHOLDER_PATTERN.findall(source)) == sorted(
+        PLACEHOLDER_PATTERN.findall(translated)
+    )
+
+
+def restore_translation(
+    source: str, translated: str, placeholders: List[str]
+) -> Optional[str]:
+    """マスクした翻訳結果を元に戻して検証する（プレースホルダーが壊れていれば None）"""
+    restored = unmask_placeholders(translated, placeholders)
+    if restored is None or not placeholders_match(source, restored):
+        return None
+    return restored
+
+
+def is_untranslatable(text: str) -> bool:
+    """翻訳不要な文字列か判定する
+
+    プレースホルダー・URL・数値・固有名詞を除くと記号と空白しか残らない場合は
+    LLMに送らず原文をそのまま使う。
+    """
+    remainder = PLACEHOLDER_PATTERN.sub(" ", text)
+    remainder = NUMBER_PATTERN.sub(" ", remainder)
+    remainder = PROTECTED_TERMS_PATTERN.sub(" ", remainder)
+    return bool(SYMBOLS_ONLY_PATTERN.match(remainder))
+
+
+def build_text_messages(text: str, target_language: str) -> List[Dict[str, str]]:
+    """単体翻訳用のメッセージを組み立てる"""
     # 翻訳結果のみを得るための洗練されたプロンプト
     prompt = (
         f"Translate the following Japanese text to {target_language}. "
-        "Preserve any variables or placeholders like '{{variable}}' or '$t(key)' exactly as they appear. "
+        "Placeholders have been replaced with markers like '⟦0⟧'; keep every marker exactly once and unchanged. "
         "Return ONLY the translation without any explanations, quotes, or additional text.\n\n"
         f'Text to translate: "{text}"'
     )
 
-    messages = [
+    return [
         {
             "role": "system",
-            "content": "You are a precise translation engine for software localization. Always return ONLY the translated text without any explanations, formatting, or quotation marks. Preserve all variables and placeholders exactly as they appear in the original text.",
+            "content": "You are a precise translation engine for software localization. Always return ONLY the translated text without any explanations, formatting, or quotation marks. Keep all markers like '⟦0⟧' exactly as they appear in the original text.",
         },
         {"role": "user", "content": prompt},
     ]
 
-    try:
-        response = llm.invoke(messages)
+
+async def translate_text(
+    text: str, target_language: str, llm: "ChatOpenAI", runner: "RequestRunner"
+) -> str:
+    """指定されたテキストを翻訳する（JSONの値用）
+
+    プレースホルダーはマスクしてから送り、翻訳結果で壊れていた場合は
+    PLACEHOLDER_RETRIES 回まで翻訳し直す。それでも壊れている場合は原文を返す。
+    """
+    if not isinstance(text, str) or not text.strip():
+        return text  # 文字列でない場合や空文字列はそのまま返す
+    if is_untranslatable(text):
+        return text
+
+    masked, placeholders = mask_placeholders(text)
+    for _ in range(max(0, PLACEHOLDER_RETRIES) + 1):
+        try:
+            response = await runner.invoke(
+                llm, build_text_messages(masked, target_language), "text"
+            )
+        except Exception as e:
+            print(f"翻訳エラー: {e}")
+            return text  # エラー時は元のテキストを返す
         translated = response.content.strip().strip('"')  # 前後の引用符を除去
-        # 翻訳結果が空文字列の場合があるため、元のテキストを返すなどの考慮が必要かもしれない
-        # if not translated:
-        #     print(f"警告: 翻訳結果が空です。元テキスト: '{text}'")
-        #     return text # 空の場合は元を返す（要検討）
+        restored = restore_translation(text, translated, placeholders)
+        if restored is not None and restored.strip():
+            return restored
+        print(f"警告: プレースホルダーが一致しません ({target_language}): '{translated}'")
+    return text
+
+
+# --- 並列実行 ---
+class TokenBucket:
+    """一定速度で補充されるトークンバケットによるレート制限"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """トークンを1つ取得する（足りない場合は補充されるまで待つ）"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Metrics:
+    """LLM呼び出しのレイテンシ・リトライ・キャッシュヒット・言語ごとの所要時間を集計する"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.calls: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = {}
+        self.languages: Dict[str, float] = {}
+
+    def record_call(
+        self,
+        kind: str,
+        latency: float,
+        elapsed: float,
+        attempts: int,
+        input_tokens: int,
+        ok: bool,
+    ) -> None:
+        """1回のLLM呼び出し（リトライを含む）を記録する
+
+        latency は最後の試行の応答時間、elapsed は待ち時間・バックオフを含む全体の時間。
+        """
+        self.calls.append(
+            {
+                "kind": kind,
+                "latency": round(latency, 3),
+                "elapsed": round(elapsed, 3),
+                "attempts": attempts,
+                "input_tokens": input_tokens,
+                "ok": ok,
+            }
+        )
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def language_progress(self, lang: str) -> None:
+        """言語の翻訳が進んだ時点を記録する（最後の記録がその言語の所要時間になる）"""
+        self.languages[lang] = round(time.monotonic() - self.started, 3)
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(call["latency"] for call in self.calls)
+
+        def percentile(ratio: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * ratio))]
+
+        kinds = {}
+        for call in self.calls:
+            kinds[call["kind"]] = kinds.get(call["kind"], 0) + 1
+        return {
+            "wall_time": round(time.monotonic() - self.started, 3),
+            "calls": len(self.calls),
+            "calls_by_kind": kinds,
+            "failed_calls": sum(1 for call in self.calls if not call["ok"]),
+            "retries": sum(call["attempts"] - 1 for call in self.calls),
+            "input_tokens": sum(call["input_tokens"] for call in self.calls),
+            "latency": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": latencies[-1] if latencies else None,
+            },
+            "counters": self.counters,
+            "language_wall_time": self.languages,
+            "call_log": self.calls,
+        }
+
+
+def emit_report(name: str, report: Dict[str, Any]) -> None:
+    """計測結果・見積もりをJSONで出力する（METRICS_PATH が設定されていれば保存もする）"""
+    text = json.dumps({name: report}, ensure_ascii=False, indent=2)
+    print(text)
+    if METRICS_PATH:
+        with open(METRICS_PATH, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+class RequestRunner:
+    """同時実行数・レート制限・リトライを適用してLLMを呼び出す"""
+
+    def __init__(
+        self,
+        concurrency: int = MAX_CONCURRENCY,
+        rate: float = REQUESTS_PER_SECOND,
+        attempts: int = MAX_ATTEMPTS,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.bucket = TokenBucket(rate) if rate > 0 else None
+        self.attempts = max(1, attempts)
+        self.metrics = metrics
+
+    async def invoke(
+        self, llm: "ChatOpenAI", messages: List[Dict[str, str]], kind: str = "text"
+    ) -> Any:
+        """LLMを呼び出す。失敗時はジッター付き指数バックオフで再試行する"""
+        started = time.monotonic()
+        attempts = 0
+        latency = 0.0
+        ok = False
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(self.attempts),
+                wait=wait_random_exponential(multiplier=1, max=30),
+                reraise=True,
+            ):
+                with attempt:
+                    async with self.semaphore:
+                        if self.bucket is not None:
+                            await self.bucket.acquire()
+                        attempts += 1
+                        attempt_started = time.monotonic()
+                        try:
+                            response = await llm.ainvoke(messages)
+                        finally:
+                            latency = time.monotonic() - attempt_started
+                        ok = True
+                        return response
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_call(
+                    kind,
+                    latency,
+                    time.monotonic() - started,
+                    attempts,
+                    sum(estimate_tokens(message["content"]) for message in messages),
+                    ok,
+                )
+
+    async def stream(
+        self,
+        llm: "ChatOpenAI",
+        messages: List[Dict[str, str]],
+        consume: Any,
+        reset: Optional[Any] = None,
+        kind: str = "stream",
+    ) -> bool:
+        """LLMの応答をストリーミングし、届いた断片を順に consume に渡す
+
+        consume が False を返した時点でストリームを閉じて生成を打ち切る。
+        接続エラーなどで失敗した場合は invoke と同じく再試行する。各試行の最初に reset を
+        呼ぶため、途中まで受け取った断片はそこで捨てる（consume は同じ内容を再度受け取る）。
+
+        Returns:
+            最後まで受信した場合は True、consume により打ち切った場合は False
+        """
+        started = time.monotonic()
+        attempts = 0
+        latency = 0.0
+        ok = False
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(self.attempts),
+                wait=wait_random_exponential(multiplier=1, max=30),
+                reraise=True,
+            ):
+                with attempt:
+                    async with self.semaphore:
+                        if self.bucket is not None:
+                            await self.bucket.acquire()
+                        attempts += 1
+                        attempt_started = time.monotonic()
+                        if reset is not None:
+                            reset()
+                        chunks = llm.astream(messages)
+                        try:
+                            async for chunk in chunks:
+                                if consume(chunk.content) is False:
+                                    ok = True
+                                    return False
+                        finally:
+                            await chunks.aclose()
+                            latency = time.monotonic() - attempt_started
+                        ok = True
+                        return True
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_call(
+                    kind,
+                    latency,
+                    time.monotonic() - started,
+                    attempts,
+                    sum(estimate_tokens(message["content"]) for message in messages),
+                    ok,
+                )
+
+
+class Checkpoint:
+    """翻訳済みのリーフを保存し、中断後の再実行で再利用する
+
+    fingerprint（翻訳対象のリーフとモデル設定から計算）が一致する場合だけ再利用する。
+    """
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.translations: Dict[str, Dict[str, str]] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("fingerprint") == fingerprint:
+                self.translations = data.get("translations", {})
+        except (OSError, ValueError):
+            pass
+
+    def get(self, lang: str) -> Dict[str, str]:
+        return self.translations.get(lang, {})
+
+    def update(self, lang: str, translations: Dict[str, str]) -> None:
+        """翻訳結果を追加して保存する（一時ファイル経由で置き換える）"""
+        self.translations.setdefault(lang, {}).update(translations)
+        data = json.dumps(
+            {"fingerprint": self.fingerprint, "translations": self.translations},
+            ensure_ascii=False,
+        )
+        replace_file(self.path, data.encode("utf-8"))
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class TranslationMemory:
+    """原文ハッシュ・翻訳先言語・プロンプト/モデルのバージョンをキーに翻訳結果を保存する
+
+    JSONL形式で1行に1件を追記する。同じキーが複数ある場合は後の行が優先される。
+    read_only=True の場合は読み込みだけを行い、ファイルには追記しない。
+    """
+
+    def __init__(self, path: str, version: str, read_only: bool = False):
+        self.path = path
+        self.version = version
+        self.read_only = read_only
+        self.entries: Dict[Tuple[str, str, str], str] = {}
+        self.hits = 0
+        self.misses = 0
+        if not path:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        key = (entry["hash"], entry["lang"], entry["version"])
+                        self.entries[key] = entry["text"]
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 壊れた行は無視する
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def source_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def lookup(self, text: str, lang: str) -> Optional[str]:
+        """翻訳済みの結果を返す（無い場合は None）"""
+        translated = self.entries.get((self.source_hash(text), lang, self.version))
+        if translated is None:
+            self.misses += 1
+        else:
+            self.hits += 1
         return translated
-    except Exception as e:
-        print(f"翻訳エラー: {e}")
-        return text  # エラー時は元のテキストを返す
+
+    def store(self, lang: str, pairs: List[Tuple[str, str]]) -> None:
+        """(原文, 翻訳) の組を追加してファイルに追記する"""
+        lines = []
+        for text, translated in pairs:
+            key = (self.source_hash(text), lang, self.version)
+            if self.entries.get(key) == translated:
+                continue
+            self.entries[key] = translated
+            lines.append(
+                json.dumps(
+                    {
+                        "hash": key[0],
+                        "lang": lang,
+                        "version": self.version,
+                        "text": translated,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        if not lines or not self.path or self.read_only:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def memory_version() -> str:
+    """翻訳メモリのキーに使うプロンプト/モデルのバージョン"""
+    model = "stub" if TRANSLATE_LLM == "stub" else MODEL_NAME
+    return f"{model}:{PROMPT_VERSION}"
 
 
-def translate_value(value: Any, target_language: str, llm: ChatOpenAI) -> Any:
-    """JSONの値（文字列、リスト、辞書）を再帰的に翻訳する"""
+def leaves_fingerprint(leaves: Dict[str, str]) -> str:
+    """リーフと翻訳設定からチェックポイント照合用のハッシュを計算する"""
+    payload = json.dumps(
+        {"llm": TRANSLATE_LLM, "leaves": leaves}, ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# --- バッチ翻訳 ---
+def collect_leaves(value: Any, path: str = "") -> Dict[str, str]:
+    """翻訳対象の文字列リーフを {JSONポインタ: 文字列} で収集する
+
+    JSONポインタは値の中での位置から決まるため、同じ入力に対して常に同じIDになる。
+    """
+    leaves = {}
     if isinstance(value, str):
-        return translate_text(value, target_language, llm)
+        if value.strip():
+            leaves[path] = value
     elif isinstance(value, list):
-        return [translate_value(item, target_language, llm) for item in value]
+        for index, item in enumerate(value):
+            leaves.update(collect_leaves(item, f"{path}/{index}"))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            leaves.update(collect_leaves(item, f"{path}/{escape_pointer(key)}"))
+    return leaves
+
+
+def apply_leaves(value: Any, translations: Dict[str, str], path: str = "") -> Any:
+    """collect_leaves と同じ走査順で、翻訳済みの文字列に置き換えた値を返す"""
+    if isinstance(value, str):
+        return translations.get(path, value)
+    elif isinstance(value, list):
+        return [
+            apply_leaves(item, translations, f"{path}/{index}")
+            for index, item in enumerate(value)
+        ]
     elif isinstance(value, dict):
         return {
-            key: translate_value(val, target_language, llm)
-            for key, val in value.items()
+            key: apply_leaves(item, translations, f"{path}/{escape_pointer(key)}")
+            for key, item in value.items()
         }
+    return value
+
+
+def chunk_leaves(
+    leaves: Dict[str, str],
+    token_budget: int = BATCH_TOKEN_BUDGET,
+    max_items: int = BATCH_MAX_ITEMS,
+) -> List[Dict[str, str]]:
+    """リーフをトークン数とリーフ数の上限に収まるバッチに分割する
+
+    上限を単独で超えるリーフはそのリーフだけのバッチにする。
+    """
+    batches = []
+    current = {}
+    current_tokens = 0
+    for leaf_id, text in leaves.items():
+        tokens = estimate_tokens(leaf_id) + estimate_tokens(text)
+        if current and (
+            current_tokens + tokens > token_budget or len(current) >= max_items
+        ):
+            batches.append(current)
+            current = {}
+            current_tokens = 0
+        current[leaf_id] = text
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _extract_json(text: str) -> Any:
+    """応答テキストからJSONを取り出す（コードブロックで囲まれていても可）"""
+    match = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+    if match:
+        text = match.group(1)
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        return json.loads(text[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+
+
+def build_batch_messages(
+    items: Dict[str, str], languages: List[str], streaming: bool = False
+) -> List[Dict[str, str]]:
+    """バッチ翻訳用のメッセージを組み立てる（streaming では1行1件の形式で返させる）"""
+    payload = json.dumps(
+        {"languages": languages, "items": items}, ensure_ascii=False, indent=1
+    )
+    if streaming:
+        output_format = (
+            "Return ONLY one JSON object per line, each of the form "
+            '{"language": "<language>", "id": "<id>", "text": "<translation>"}, '
+            "one line for every id in every language, using exactly the same ids, "
+            "with no explanations, code fences or additional text.\n\n"
+        )
     else:
-        return value  # 文字列、リスト、辞書以外はそのまま返す
+        output_format = (
+            "Return ONLY a JSON object of the form "
+            '{"<language>": {"<id>": "<translation>", ...}, ...} '
+            "using exactly the same ids, with no explanations or additional text.\n\n"
+        )
+    prompt = (
+        "Translate every Japanese string in \"items\" into each language listed in \"languages\". "
+        "Placeholders have been replaced with markers like '⟦0⟧'; keep every marker exactly once and unchanged. "
+        f"{output_format}"
+        f"{payload}"
+    )
+    return [
+        {
+            "role": "system",
+            "content": "You are a precise translation engine for software localization. Always return ONLY valid JSON without any explanations or formatting. Keep all markers like '⟦0⟧' exactly as they appear in the original text.",
+        },
+        {"role": "user", "content": prompt},
+    ]
+
+
+def validate_batch_response(
+    data: Any, items: Dict[str, str], languages: List[str]
+) -> Dict[str, Dict[str, str]]:
+    """バッチ応答から有効な翻訳だけを取り出す
+
+    IDが存在しない・文字列でない・空のものは欠落として扱う。
+    """
+    result = {lang: {} for lang in languages}
+    if not isinstance(data, dict):
+        return result
+    for lang in languages:
+        translated = data.get(lang)
+        if not isinstance(translated, dict):
+            continue
+        for item_id in items:
+            text = translated.get(item_id)
+            if isinstance(text, str) and text.strip():
+                result[lang][item_id] = text
+    return result
+
+
+async def translate_batch(
+    items: Dict[str, str],
+    languages: List[str],
+    llm: "ChatOpenAI",
+    runner: RequestRunner,
+) -> Dict[str, Dict[str, str]]:
+    """複数リーフを1リクエストで翻訳し、{言語: {ID: 翻訳}} を返す（欠落あり得る）
+
+    プレースホルダーはマスクして送り、戻したときに一致しない翻訳は欠落として扱う。
+    """
+    masked_items = {}
+    placeholders = {}
+    for item_id, text in items.items():
+        masked_items[item_id], placeholders[item_id] = mask_placeholders(text)
+    if STREAM_BATCHES:
+        return await translate_batch_streaming(
+            items, masked_items, placeholders, languages, llm, runner
+        )
+    try:
+        response = await runner.invoke(
+            llm, build_batch_messages(masked_items, languages), "batch"
+        )
+    except Exception as e:
+        print(f"バッチ翻訳エラー: {e}")
+        return {lang: {} for lang in languages}
+    result = validate_batch_response(
+        _extract_json(response.content), masked_items, languages
+    )
+    for lang in languages:
+        for item_id, translated in list(result[lang].items()):
+            restored = restore_translation(
+                items[item_id], translated, placeholders[item_id]
+            )
+            if restored is None:
+                del result[lang][item_id]
+            else:
+                result[lang][item_id] = restored
+    return result
+
+
+class BatchStreamParser:
+    """1行1件で届くバッチ応答を行単位で検証する
+
+    行が揃うたびにJSONとして読み、言語・ID・プレースホルダーを確認して result に加える。
+    不正な行があった時点で malformed を立て、以降の入力は受け付けない。
+    """
+
+    def __init__(
+        self,
+        items: Dict[str, str],
+        placeholders: Dict[str, List[str]],
+        languages: List[str],
+    ):
+        self.items = items
+        self.placeholders = placeholders
+        self.languages = languages
+        self.result: Dict[str, Dict[str, str]] = {lang: {} for lang in languages}
+        self.buffer = ""
+        self.malformed: Optional[str] = None
+
+    def reset(self) -> None:
+        """受信途中の行を捨てる（再試行の開始時に呼ぶ）"""
+        self.buffer = ""
+
+    def feed(self, text: str) -> bool:
+        """断片を追加する（不正な行を検出したら False）"""
+        if self.malformed is not None:
+            return False
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        return all(self._parse_line(line) for line in lines)
+
+    def finish(self) -> bool:
+        """最後の行（改行で終わっていない場合）を処理する"""
+        line, self.buffer = self.buffer, ""
+        return self.malformed is None and self._parse_line(line)
+
+    def _parse_line(self, line: str) -> bool:
+        line = line.strip()
+        if not line or line.startswith("```"):
+            return True
+        try:
+            entry = json.loads(line)
+            lang, item_id, text = entry["language"], entry["id"], entry["text"]
+        except (ValueError, KeyError, TypeError):
+            self.malformed = line
+            return False
+        restored = None
+        if lang in self.result and item_id in self.items and isinstance(text, str):
+            restored = restore_translation(
+                self.items[item_id], text, self.placeholders[item_id]
+            )
+        if restored is None or not restored.strip():
+            self.malformed = line
+            return False
+        self.result[lang][item_id] = restored
+        return True
+
+
+async def translate_batch_streaming(
+    items: Dict[str, str],
+    masked_items: Dict[str, str],
+    placeholders: Dict[str, List[str]],
+    languages: List[str],
+    llm: "ChatOpenAI",
+    runner: RequestRunner,
+) -> Dict[str, Dict[str, str]]:
+    """バッチ応答をストリーミングで受け取り、届いた行から順に検証する
+
+    不正な行が届いた時点でストリームを打ち切り、それまでに検証できた翻訳だけを返す
+    （残りは呼び出し元で個別に翻訳し直す）。
+    """
+    parser = BatchStreamParser(items, placeholders, languages)
+    try:
+        completed = await runner.stream(
+            llm,
+            build_batch_messages(masked_items, languages, streaming=True),
+            parser.feed,
+            parser.reset,
+        )
+        if completed:
+            parser.finish()
+    except Exception as e:
+        print(f"バッチ翻訳エラー: {e}")
+    if parser.malformed is not None:
+        print(f"    不正な行を受信したため打ち切りました: '{parser.malformed[:80]}'")
+        if runner.metrics:
+            runner.metrics.count("streams_cancelled")
+    return parser.result
+
+
+def _wants(
+    translations: Dict[str, Dict[str, str]],
+    needed: Optional[Dict[str, set]],
+    lang: str,
+    leaf_id: str,
+) -> bool:
+    """lang でまだ翻訳が必要なリーフか判定する"""
+    if leaf_id in translations[lang]:
+        return False
+    return needed is None or leaf_id in needed.get(lang, ())
+
+
+def prefill_translations(
+    leaves: Dict[str, str],
+    languages: List[str],
+    checkpoint: Optional[Checkpoint] = None,
+    memory: Optional[TranslationMemory] = None,
+    needed: Optional[Dict[str, set]] = None,
+    metrics: Optional["Metrics"] = None,
+) -> Dict[str, Dict[str, str]]:
+    """LLMを使わずに埋められる翻訳（チェックポイント・翻訳不要・翻訳メモリ）を集める"""
+    translations = {
+        lang: dict(checkpoint.get(lang)) if checkpoint else {} for lang in languages
+    }
+    if metrics:
+        metrics.count(
+            "checkpoint_hits", sum(len(translations[lang]) for lang in languages)
+        )
+    untranslatable = {
+        leaf_id: text for leaf_id, text in leaves.items() if is_untranslatable(text)
+    }
+    if untranslatable:
+        print(f"  翻訳不要な文字列: {len(untranslatable)} 件（原文のまま使用）")
+        for lang in languages:
+            translations[lang].update(untranslatable)
+        if metrics:
+            metrics.count("untranslatable", len(untranslatable))
+    if memory:
+        for lang in languages:
+            for leaf_id, text in leaves.items():
+                if not _wants(translations, needed, lang, leaf_id):
+                    continue
+                translated = memory.lookup(text, lang)
+                if translated is not None:
+                    translations[lang][leaf_id] = translated
+    return translations
+
+
+def plan_batches(
+    leaves: Dict[str, str],
+    languages: List[str],
+    translations: Dict[str, Dict[str, str]],
+    needed: Optional[Dict[str, set]] = None,
+) -> List[Tuple[List[str], List[Dict[str, str]]]]:
+    """LLMに送るバッチを言語グループごとに [(言語グループ, [バッチ])] で返す"""
+    groups = [
+        languages[i : i + LANGUAGES_PER_REQUEST]
+        for i in range(0, len(languages), max(1, LANGUAGES_PER_REQUEST))
+    ]
+    plan = []
+    for group in groups:
+        # グループ内のいずれかの言語で未翻訳の原文だけを重複なく送る
+        pending = {}
+        seen = set()
+        for leaf_id, text in leaves.items():
+            if text in seen:
+                continue
+            if any(_wants(translations, needed, lang, leaf_id) for lang in group):
+                pending[leaf_id] = text
+                seen.add(text)
+        plan.append((group, chunk_leaves(pending)))
+    return plan
+
+
+async def translate_leaves(
+    leaves: Dict[str, str],
+    languages: List[str],
+    llm: "ChatOpenAI",
+    runner: RequestRunner,
+    checkpoint: Optional[Checkpoint] = None,
+    memory: Optional[TranslationMemory] = None,
+    needed: Optional[Dict[str, set]] = None,
+) -> Dict[str, Dict[str, str]]:
+    """リーフをバッチ単位で全言語に並列翻訳し、{言語: {ID: 翻訳}} を返す
+
+    バッチ応答で欠落・不正だったリーフだけを translate_text で個別に翻訳し直す。
+    チェックポイント・翻訳メモリにある原文と、同じ原文を持つ2つ目以降のリーフ、
+    翻訳不要なリーフ（プレースホルダー・URL・数値・固有名詞だけのもの）はLLMに送らない。
+    同じ原文を持つリーフには、最後に代表のリーフの翻訳をコピーする。
+    needed を指定した場合、各言語ではそこに含まれるIDだけを翻訳する。
+    """
+    metrics = runner.metrics
+    translations = prefill_translations(
+        leaves, languages, checkpoint, memory, needed, metrics
+    )
+    # 言語ごとに翻訳が必要な原文。バッチには同じ原文のリーフを1件しか入れないため、
+    # 欠落したリーフは（そのリーフ自身でなく）同じ原文のいずれかのリーフが必要なら個別に翻訳する
+    wanted_texts = {
+        lang: {
+            text
+            for leaf_id, text in leaves.items()
+            if _wants(translations, needed, lang, leaf_id)
+        }
+        for lang in languages
+    }
+
+    async def run_batch(group: List[str], batch: Dict[str, str], label: str) -> None:
+        print(f"  バッチ翻訳 {label} ({', '.join(group)}): {len(batch)} 件")
+        result = await translate_batch(batch, group, llm, runner)
+        for lang in group:
+            missing = [
+                item_id
+                for item_id in batch
+                if item_id not in result[lang] and batch[item_id] in wanted_texts[lang]
+            ]
+            if missing:
+                print(f"    '{lang}' の {len(missing)} 件を個別に翻訳します")
+                if metrics:
+                    metrics.count("fallback_items", len(missing))
+                texts = await asyncio.gather(
+                    *(
+                        translate_text(batch[item_id], lang, llm, runner)
+                        for item_id in missing
+                    )
+                )
+                result[lang].update(zip(missing, texts))
+            translations[lang].update(result[lang])
+            # エラーで原文のまま返されたリーフは保存せず、次回の実行で翻訳し直す
+            succeeded = {
+                item_id: text
+                for item_id, text in result[lang].items()
+                if text != batch[item_id]
+            }
+            if checkpoint:
+                checkpoint.update(lang, succeeded)
+            if memory:
+                memory.store(
+                    lang,
+                    [(batch[item_id], text) for item_id, text in succeeded.items()],
+                )
+            if metrics:
+                metrics.language_progress(lang)
+
+    tasks = []
+    for group, batches in plan_batches(leaves, languages, translations, needed):
+        for number, batch in enumerate(batches, 1):
+            tasks.append(run_batch(group, batch, f"{number}/{len(batches)}"))
+    await asyncio.gather(*tasks)
+
+    # 同じ原文を持つリーフに翻訳結果をコピーする
+    for lang in languages:
+        by_text = {
+            leaves[leaf_id]: text
+            for leaf_id, text in translations[lang].items()
+            if leaf_id in leaves
+        }
+        for leaf_id, text in leaves.items():
+            if leaf_id not in translations[lang] and text in by_text:
+                translations[lang][leaf_id] = by_text[text]
+    return translations
+
+
+def estimate_plan(
+    plan: List[Tuple[List[str], List[Dict[str, str]]]]
+) -> Dict[str, Any]:
+    """バッチ計画から呼び出し回数と入出力トークン数の見積もりを返す
+
+    入力は実際に送るメッセージから数える。出力は訳文が原文と同程度の長さになると仮定する
+    （個別翻訳へのフォールバックは含まない）。
+    """
+    estimate = {
+        "calls": 0,
+        "items": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "languages": {},
+    }
+    for group, batches in plan:
+        for batch in batches:
+            masked = {
+                item_id: mask_placeholders(text)[0] for item_id, text in batch.items()
+            }
+            input_tokens = sum(
+                estimate_tokens(message["content"])
+                for message in build_batch_messages(masked, group, STREAM_BATCHES)
+            )
+            output_tokens = len(group) * estimate_tokens(
+                json.dumps(masked, ensure_ascii=False)
+            )
+            estimate["calls"] += 1
+            estimate["items"] += len(batch) * len(group)
+            estimate["input_tokens"] += input_tokens
+            estimate["output_tokens"] += output_tokens
+            for lang in group:
+                stats = estimate["languages"].setdefault(
+                    lang, {"batches": 0, "items": 0}
+                )
+                stats["batches"] += 1
+                stats["items"] += len(batch)
+    return estimate
+
+
+# --- 言語ごとの更新 ---
+def update_language(
+    lang: str,
+    diff: Dict[str, Any],
+    translations: Dict[str, str],
+    current_lang_content: Optional[str],
+    source_json: Optional[Dict[str, Any]] = None,
+) -> Optional[bool]:
+    """翻訳済みのリーフを1言語のファイルに適用して保存する
+
+    既存のキー順を維持し、新しいキーは source_json（日本語の原文）と同じ位置に挿入する。
+
+    Returns:
+        更新した場合は True、変更が無い場合は False、保存に失敗した場合は None
+    """
+    print(f"\n--- 言語 '{lang}' の処理を開始 ---")
+    target_lang_path = f"locales/{lang}/translation.json"
+
+    updated_lang_json = parse_locale(lang, current_lang_content)
+
+    # 差分を適用（変更されたリーフだけを書き換え、その他の翻訳とキー順は維持する）
+    # 追加分を翻訳して追加
+    if diff["added"]:
+        print(f"  '{lang}' にキーを追加しています...")
+        for pointer, value in diff["added"].items():
+            set_pointer(
+                updated_lang_json,
+                pointer,
+                apply_leaves(value, translations, pointer),
+                source_json,
+            )
+            print(f"    + {pointer}: (翻訳適用)")
+
+    # 変更分を翻訳して更新
+    if diff["modified"]:
+        print(f"  '{lang}' のキーを更新しています...")
+        for pointer, value in diff["modified"].items():
+            set_pointer(
+                updated_lang_json,
+                pointer,
+                apply_leaves(value, translations, pointer),
+                source_json,
+            )
+            print(f"    * {pointer}: (翻訳適用)")
+
+    # 削除分を削除
+    if diff["deleted"]:
+        print(f"  '{lang}' からキーを削除しています...")
+        for pointer in diff["deleted"]:
+            if delete_pointer(updated_lang_json, pointer):
+                print(f"    - {pointer}")
+
+    # 一度だけ文字列化し、ローカルファイルとバイト列が同じなら書き込まない
+    updated_content = (
+        json.dumps(updated_lang_json, indent=2, ensure_ascii=False) + "\n"
+    )  # 末尾に改行追加
+    result = write_file_atomic(target_lang_path, updated_content)
+    if result:
+        print(f"  '{target_lang_path}' に変更がありました。ファイルを更新しました。")
+    elif result is False:
+        print(f"  '{target_lang_path}' に変更はありませんでした。")
+    return result
+
+
+def parse_locale(lang: str, content: Optional[str]) -> Dict[str, Any]:
+    """言語ファイルの内容をパースする（存在しない・壊れている場合は空の辞書）"""
+    target_lang_path = f"locales/{lang}/translation.json"
+    if content is None:
+        print(f"'{target_lang_path}' は存在しません。新規作成します。")
+        return {}
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        print(
+            f"警告: '{target_lang_path}' のJSONパースに失敗しました。空のファイルとして扱います。"
+        )
+        return {}
+
+
+def plan_reconcile(
+    source_json: Dict[str, Any], contents: Dict[str, Optional[str]]
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str], Dict[str, set]]:
+    """全言語のファイルを原文と照合し、修復内容と翻訳が必要なリーフを求める
+
+    Returns:
+        (言語ごとの修復内容, 翻訳対象のリーフ, 言語ごとに翻訳が必要なリーフID)
+    """
+    diffs = {}
+    leaves = {}
+    needed = {}
+    for lang, content in contents.items():
+        diff = get_reconcile_diff(source_json, parse_locale(lang, content))
+        diffs[lang] = diff
+        needed[lang] = set()
+        for pointer, value in diff["added"].items():
+            lang_leaves = collect_leaves(value, pointer)
+            leaves.update(lang_leaves)
+            needed[lang].update(lang_leaves)
+        if diff["added"] or diff["deleted"]:
+            print(
+                f"  {lang}: 欠落 {len(diff['missing'])} 件 / 余分 {len(diff['deleted'])} 件"
+                f" / 未翻訳 {len(diff['stale'])} 件"
+            )
+            if diff["missing"]:
+                print(f"    欠落しているキー: {diff['missing']}")
+            if diff["deleted"]:
+                print(f"    余分なキー: {diff['deleted']}")
+            if diff["stale"]:
+                print(f"    未翻訳のキー: {diff['stale']}")
+    return diffs, leaves, needed
+
+
+async def fetch_locales(provider: Any) -> Dict[str, Optional[str]]:
+    """全言語のファイルを並列に取得する"""
+    contents = await asyncio.gather(
+        *(
+            asyncio.to_thread(
+                provider.get_file_content,
+                f"locales/{lang}/translation.json",
+                TARGET_BRANCH,
+            )
+            for lang in TARGET_LANGUAGES
+        )
+    )
+    return dict(zip(TARGET_LANGUAGES, contents))
+
+
+async def run_pipeline(
+    diffs: Dict[str, Dict[str, Any]],
+    leaves: Dict[str, str],
+    llm: "ChatOpenAI",
+    provider: Any,
+    needed: Optional[Dict[str, set]] = None,
+    contents: Optional[Dict[str, Optional[str]]] = None,
+    source_json: Optional[Dict[str, Any]] = None,
+) -> Tuple[int, int]:
+    """全言語のファイル取得とバッチ翻訳を並列に実行し、各言語のファイルを更新する
+
+    diffs は言語ごとに適用する差分。contents を渡した場合はファイルを取得し直さない。
+    source_json（日本語の原文）は新しいキーを挿入する位置の決定に使う。
+
+    Returns:
+        (更新したファイル数, 保存に失敗したファイル数)
+    """
+    checkpoint = Checkpoint(CHECKPOINT_PATH, leaves_fingerprint(leaves))
+    if checkpoint.translations:
+        print(f"チェックポイント '{CHECKPOINT_PATH}' の翻訳結果を再利用します。")
+    # スタブの結果はコミットされる翻訳メモリに残さない
+    memory = TranslationMemory(
+        TRANSLATION_MEMORY_PATH, memory_version(), read_only=TRANSLATE_LLM == "stub"
+    )
+
+    if DRY_RUN:
+        # LLMを呼ばずに実際の実行と同じ手順でバッチを組み、見積もりだけを出力する
+        translations = prefill_translations(
+            leaves, TARGET_LANGUAGES, checkpoint, memory, needed
+        )
+        estimate = estimate_plan(
+            plan_batches(leaves, TARGET_LANGUAGES, translations, needed)
+        )
+        estimate["leaves"] = len(leaves)
+        estimate["memory"] = {"hits": memory.hits, "misses": memory.misses}
+        print(
+            f"\nドライラン: LLM呼び出し {estimate['calls']} 回 / "
+            f"入力 約{estimate['input_tokens']} トークン / "
+            f"出力 約{estimate['output_tokens']} トークン"
+        )
+        emit_report("estimate", estimate)
+        return 0, 0
+
+    metrics = Metrics()
+    runner = RequestRunner(metrics=metrics)
+    # ターゲット言語の現在のファイル内容を翻訳と並行して取得
+    if contents is None:
+        fetch = asyncio.create_task(fetch_locales(provider))
+    translations = await translate_leaves(
+        leaves, TARGET_LANGUAGES, llm, runner, checkpoint, memory, needed
+    )
+    if TRANSLATION_MEMORY_PATH:
+        print(f"\n翻訳メモリ: ヒット {memory.hits} 件 / ミス {memory.misses} 件")
+    metrics.count("memory_hits", memory.hits)
+    metrics.count("memory_misses", memory.misses)
+    if contents is None:
+        contents = await fetch
+
+    updated_files_count = 0
+    error_files_count = 0
+    for lang in TARGET_LANGUAGES:
+        result = update_language(
+            lang, diffs[lang], translations[lang], contents[lang], source_json
+        )
+        if result is None:
+            error_files_count += 1
+        elif result:
+            updated_files_count += 1
+
+    if error_files_count == 0:
+        checkpoint.remove()
+    emit_report("metrics", metrics.summary())
+    return updated_files_count, error_files_count
 
 
 # --- メイン処理 ---
 def main():
-    print(f"ターゲットブランチ: {TARGET_BRANCH}")
+    check_environment()
+    provider = get_provider()
+    print(f"ターゲットブランチ: {TARGET_BRANCH or '(作業ツリー)'}")
     print(f"ベースブランチ: {BASE_BRANCH}")
+    print(f"取得方法: {TRANSLATE_SOURCE}")
+    print(f"実行モード: {TRANSLATE_MODE}{'（ドライラン）' if DRY_RUN else ''}")
+
+    if TRANSLATE_MODE == "reconcile":
+        updated_files_count, error_files_count = reconcile(provider)
+    else:
+        updated_files_count, error_files_count = translate_diff(provider)
+
+    # 結果を報告
+    if DRY_RUN:
+        print("\nドライランのためファイルは更新していません。")
+        return
+    if updated_files_count > 0:
+        print(f"\n合計 {updated_files_count} ファイルが更新されました。")
+        if error_files_count > 0:
+            print(f"警告: {error_files_count} ファイルの更新に失敗しました。")
+            exit(1)
+    else:
+        print("\n更新するファイルはありませんでした。")
+
+    print("\n処理が正常に完了しました。GitHub Actionsによりコミットが実行されます。")
+
+
+def reconcile(provider: Any) -> Tuple[int, int]:
+    """全言語のファイルを日本語の原文と照合し、欠落・余分・未翻訳のキーを修復する"""
+    print(f"'{SOURCE_JSON_PATH}' を取得しています...")
+    source_content = provider.get_file_content(SOURCE_JSON_PATH, TARGET_BRANCH)
+    if source_content is None:
+        print(f"エラー: '{SOURCE_JSON_PATH}' が見つかりません。")
+        exit(1)
+    try:
+        source_json = json.loads(source_content)
+    except json.JSONDecodeError as e:
+        print(f"エラー: '{SOURCE_JSON_PATH}' のJSONパースに失敗しました。 {e}")
+        exit(1)
+
+    print("全言語のファイルを原文と照合しています...")
+    contents = asyncio.run(fetch_locales(provider))
+    diffs, leaves, needed = plan_reconcile(source_json, contents)
+    if not any(diff["added"] or diff["deleted"] for diff in diffs.values()):
+        print("修復が必要なキーはありません。処理を終了します。")
+        exit(0)
+
+    llm = None if DRY_RUN else get_llm()
+    print(f"\n翻訳対象の文字列: {len(leaves)} 件")
+    return asyncio.run(
+        run_pipeline(diffs, leaves, llm, provider, needed, contents, source_json)
+    )
+
+
+def translate_diff(provider: Any) -> Tuple[int, int]:
+    """ベースとターゲットの ja/translation.json の差分を全言語に反映する"""
 
     # 1. ベースとターゲットの ja/translation.json を取得
     print(f"'{SOURCE_JSON_PATH}' を取得しています...")
-    base_ja_content = get_file_content(SOURCE_JSON_PATH, BASE_BRANCH)
-    target_ja_content = get_file_content(SOURCE_JSON_PATH, TARGET_BRANCH)
+    base_ja_content = provider.get_file_content(SOURCE_JSON_PATH, BASE_BRANCH)
+    target_ja_content = provider.get_file_content(SOURCE_JSON_PATH, TARGET_BRANCH)
 
     if target_ja_content is None:
         print(
@@ -221,94 +1801,27 @@ def main():
 
     print("差分が見つかりました:")
     if diff["added"]:
-        print(f"  追加されたキー: {list(diff['added'].keys())}")
+        print(f"  追加されたキー: {list(diff['added'])}")
     if diff["modified"]:
-        print(f"  変更されたキー: {list(diff['modified'].keys())}")
+        print(f"  変更されたキー: {list(diff['modified'])}")
     if diff["deleted"]:
         print(f"  削除されたキー: {diff['deleted']}")
 
-    # 4. 各言語の翻訳ファイルを更新
-    llm = get_llm()
-    updated_files_count = 0
-    error_files_count = 0
-
-    for lang in TARGET_LANGUAGES:
-        print(f"\n--- 言語 '{lang}' の処理を開始 ---")
-        target_lang_path = f"locales/{lang}/translation.json"
-
-        # ターゲット言語の現在のファイル内容を取得
-        current_lang_content = get_file_content(target_lang_path, TARGET_BRANCH)
-        if current_lang_content is None:
-            print(f"'{target_lang_path}' は存在しません。新規作成します。")
-            current_lang_json = {}
-        else:
-            try:
-                current_lang_json = json.loads(current_lang_content)
-            except json.JSONDecodeError:
-                print(
-                    f"警告: '{target_lang_path}' のJSONパースに失敗しました。空のファイルとして扱います。"
-                )
-                current_lang_json = {}
-
-        updated_lang_json = current_lang_json.copy()
-
-        # 差分を適用
-        # 追加分を翻訳して追加
-        if diff["added"]:
-            print(f"  '{lang}' にキーを追加しています...")
-            for key, value in diff["added"].items():
-                translated_value = translate_value(value, lang, llm)
-                updated_lang_json[key] = translated_value
-                print(f"    + {key}: (翻訳適用)")
-
-        # 変更分を翻訳して更新
-        if diff["modified"]:
-            print(f"  '{lang}' のキーを更新しています...")
-            for key, value in diff["modified"].items():
-                translated_value = translate_value(value, lang, llm)
-                updated_lang_json[key] = translated_value
-                print(f"    * {key}: (翻訳適用)")
-
-        # 削除分を削除
-        if diff["deleted"]:
-            print(f"  '{lang}' からキーを削除しています...")
-            for key in diff["deleted"]:
-                if key in updated_lang_json:
-                    del updated_lang_json[key]
-                    print(f"    - {key}")
-
-        # 変更があったか確認 (元のJSONと比較)
-        if json.dumps(current_lang_json, sort_keys=True) != json.dumps(
-            updated_lang_json, sort_keys=True
-        ):
-            print(f"  '{target_lang_path}' に変更がありました。ファイルを更新します。")
-            # JSONを整形して文字列化
-            updated_content = json.dumps(
-                updated_lang_json,
-                indent=2,
-                ensure_ascii=False,
-            )
-            # ローカルファイルとして保存
-            if save_file_locally(
-                target_lang_path, updated_content + "\n"
-            ):  # 末尾に改行追加
-                updated_files_count += 1
-            else:
-                error_files_count += 1
-        else:
-            print(f"  '{target_lang_path}' に変更はありませんでした。")
-
-    # 5. 結果を報告
-    if updated_files_count > 0:
-        print(f"\n合計 {updated_files_count} ファイルが更新されました。")
-        if error_files_count > 0:
-            print(f"警告: {error_files_count} ファイルの更新に失敗しました。")
-            exit(1)
-    else:
-        print("\n更新するファイルはありませんでした。")
-
-    print("\n処理が正常に完了しました。GitHub Actionsによりコミットが実行されます。")
+    # 4. 変更された文字列を全言語分まとめて翻訳し、各言語のファイルを更新
+    llm = None if DRY_RUN else get_llm()
+    leaves = {}
+    for pointer, value in {**diff["added"], **diff["modified"]}.items():
+        leaves.update(collect_leaves(value, pointer))
+    print(f"\n翻訳対象の文字列: {len(leaves)} 件")
+    diffs = {lang: diff for lang in TARGET_LANGUAGES}
+    return asyncio.run(
+        run_pipeline(diffs, leaves, llm, provider, source_json=target_ja_json)
+    )
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except ConfigurationError as e:
+        print(f"エラー: {e}")
+        exit(1)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+analyze_issue.py のパイプラインをネットワーク無しで実行するベンチマーク・動作確認
+
+偽のモデル（プロンプトを記録して定型の改善案を返す）と、ローカルで起動する
+偽のGitHubサーバー（contents API と Issueコメントの一覧・投稿・更新を実装）に
+差し替えて run_pipeline を実行し、ステージごとの所要時間を表示します。
+Issueごとに次の順で分析します:
+    cold    初回（モデルを呼び、コメントを投稿する）
+    rerun   同じ内容で再実行（キャッシュを使い、コメントは変更しない）
+    retouch 空白・HTMLコメントだけを変更（キャッシュを使う）
+    edited  本文を変更（モデルを呼び、既存のコメントを更新する）
+edited の前に、ボットのコメントを引用した（目印を含む）ユーザーのコメントを追加し、
+そのコメントが更新されないことも確認します。
+
+--check を付けると、コメントの投稿・選ばれたファイルの実在・トークン予算・
+キャッシュの効果・コメントが重複しないことを検証し、満たさない場合は終了コード1で終了します。
+
+Usage:
+    python bench_analyze_issue.py                 # 既定のIssueで計測
+    python bench_analyze_issue.py --check         # 検証も行う
+    python bench_analyze_issue.py --budget 4000 --model-latency 0.5
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+import analyze_issue
+from code_index import DEFAULT_ROOT, CodeIndex
+
+REPO_FULL_NAME = "example/aituber-kit"
+# 偽のサーバーで投稿したコメントの投稿者
+BOT_USER = {"login": "github-actions[bot]", "type": "Bot"}
+QUOTING_USER = {"login": "octocat", "type": "User"}
+# コミットSHAとして扱われる ref（2回目の取得はキャッシュから返る）
+COMMIT_SHA = "0" * 40
+
+SAMPLE_ISSUES = [
+    ("スライドモードで音声が再生されない", "スライドを進めてもセリフの音声が再生されません。"),
+    ("YouTubeのコメントを取得できない", "YouTube Live のコメント取得が止まります。"),
+    ("VRMモデルの表情が反映されない", "感情タグを付けても表情が変わりません。"),
+]
+
+
+class FakeModel:
+    """プロンプトを記録し、定型の改善案を返すモデル"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.prompts = []
+
+    def complete(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        time.sleep(self.latency)
+        files = re.findall(r"^### (\S+)", prompt, re.M)
+        return (
+            "<analysis>\n偽のモデルによる分析です。\n</analysis>\n\n"
+            f"<improvements>\n1. {files[0] if files else '(なし)'} を確認してください。\n</improvements>"
+        )
+
+
+class FakeGitHub:
+    """contents API とIssueコメントの一覧・投稿・更新を実装したローカルのGitHubサーバー"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.requests = []
+        self.comments = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def next_id(self) -> int:
+        return sum(len(comments) for comments in self.comments.values()) + 1
+
+    def add_comment(self, issue_number: str, body: str, user: dict) -> dict:
+        comment = {"id": self.next_id(), "body": body, "user": user}
+        self.comments.setdefault(issue_number, []).append(comment)
+        return comment
+
+    def find(self, comment_id: int):
+        for comments in self.comments.values():
+            for comment in comments:
+                if comment["id"] == comment_id:
+                    return comment
+        return None
+
+    def count(self, method: str, kind: str) -> int:
+        return sum(1 for m, k in self.requests if m == method and k == kind)
+
+    def _handler(self):
+        github = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes = b"", headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length))
+
+            def do_GET(self):
+                path = unquote(urlparse(self.path).path)
+                match = re.match(r"^/repos/[^/]+/[^/]+/issues/(\d+)/comments$", path)
+                if match:
+                    github.requests.append(("GET", "comments"))
+                    body = json.dumps(github.comments.get(match.group(1), []))
+                    return self._send(200, body.encode("utf-8"))
+                match = re.match(r"^/repos/[^/]+/[^/]+/contents/(.+)$", path)
+                github.requests.append(("GET", "contents"))
+                if not match:
+                    return self._send(404)
+                file_path = (github.root / match.group(1)).resolve()
+                if github.root not in file_path.parents or not file_path.is_file():
+                    return self._send(404)
+                data = file_path.read_bytes()
+                etag = f'"{hashlib.sha1(data).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, headers={"ETag": etag})
+                self._send(200, data, {"ETag": etag, "Content-Type": "text/plain"})
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                match = re.match(r"^/repos/[^/]+/[^/]+/issues/(\d+)/comments$", path)
+                github.requests.append(("POST", "comments"))
+                if not match:
+                    return self._send(404)
+                payload = self._read_json()
+                comment = github.add_comment(match.group(1), payload["body"], BOT_USER)
+                self._send(201, json.dumps(comment).encode("utf-8"))
+
+            def do_PATCH(self):
+                path = urlparse(self.path).path
+                match = re.match(r"^/repos/[^/]+/[^/]+/issues/comments/(\d+)$", path)
+                github.requests.append(("PATCH", "comments"))
+                comment = match and github.find(int(match.group(1)))
+                if not comment:
+                    return self._send(404)
+                comment["body"] = self._read_json()["body"]
+                self._send(200, json.dumps(comment).encode("utf-8"))
+
+        return Handler
+
+
+def run(args: argparse.Namespace) -> int:
+    failures = []
+    root = Path(args.root).resolve()
+    with tempfile.TemporaryDirectory() as temp_dir, FakeGitHub(root) as github:
+        started = time.perf_counter()
+        index = CodeIndex(root, Path(temp_dir) / "index.json").update()
+        print(f"インデックス作成: {len(index.entries)} ファイル {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        model = FakeModel(args.model_latency)
+        client = analyze_issue.GitHubClient("dummy", api_base=github.url)
+        fetcher = analyze_issue.GitHubFetcher(
+            "dummy",
+            REPO_FULL_NAME,
+            COMMIT_SHA,
+            cache_dir=str(Path(temp_dir) / "fetch_cache"),
+            api_base=github.url,
+        )
+        cache = analyze_issue.AnalysisCache(str(Path(temp_dir) / "analysis_cache"))
+
+        for number, (title, body) in enumerate(SAMPLE_ISSUES, 1):
+            variants = [
+                ("cold", body, False),
+                ("rerun", body, True),
+                ("retouch", f"<!-- テンプレートの説明 -->\n  {body}  \n\n", True),
+                ("edited", f"{body}\n設定を変えても再現します。", False),
+            ]
+            quote = None
+            for attempt, variant_body, expect_cached in variants:
+                if attempt == "edited":
+                    # ボットのコメントを引用したユーザーのコメント（目印も含まれる）
+                    bot_body = github.comments[str(number)][0]["body"]
+                    quote = github.add_comment(
+                        str(number), f"> {bot_body}\n\n参考になりました。", QUOTING_USER
+                    )
+                    quote_body = quote["body"]
+                issue = analyze_issue.Issue(str(number), title, variant_body, REPO_FULL_NAME)
+                before = github.count("GET", "contents")
+                timer = analyze_issue.StageTimer()
+                result = analyze_issue.run_pipeline(
+                    issue,
+                    model,
+                    client,
+                    fetcher,
+                    index,
+                    timer,
+                    args.budget,
+                    cache=cache,
+                    commit_sha=COMMIT_SHA,
+                )
+                fetched = github.count("GET", "contents") - before
+                packed = result["packed"]
+                print(
+                    f"#{number} {attempt}: {timer.report()} "
+                    f"(取得リクエスト {fetched} 件, "
+                    f"{'キャッシュ' if result['cached'] else f'{packed.tokens} トークン'})"
+                )
+
+                if not result["published"]:
+                    failures.append(f"#{number} {attempt}: コメントが投稿されていません")
+                if result["cached"] != expect_cached:
+                    failures.append(f"#{number} {attempt}: キャッシュの利用が想定と異なります")
+                missing = [
+                    item["file_path"]
+                    for item in result["selection"]
+                    if not (root / item["file_path"]).is_file()
+                ]
+                if missing:
+                    failures.append(f"#{number}: 存在しないファイルが選ばれました: {missing}")
+                if packed is not None and packed.tokens > args.budget:
+                    failures.append(f"#{number}: トークン予算を超えています")
+                if result["cached"] and fetched:
+                    failures.append(f"#{number} {attempt}: キャッシュ利用時にファイルを取得しました")
+
+            comments = [
+                comment
+                for comment in github.comments.get(str(number), [])
+                if comment["user"] == BOT_USER
+            ]
+            if len(comments) != 1:
+                failures.append(f"#{number}: コメントが {len(comments)} 件あります（1件のはず）")
+            elif quote is not None and comments[0]["body"] == bot_body:
+                failures.append(f"#{number}: 編集後の分析でコメントが更新されていません")
+            if quote is not None and quote["body"] != quote_body:
+                failures.append(f"#{number}: ユーザーのコメントが更新されました")
+
+        print(
+            f"コメント投稿: {github.count('POST', 'comments')} 件, "
+            f"更新: {github.count('PATCH', 'comments')} 件, "
+            f"モデル呼び出し: {len(model.prompts)} 回"
+        )
+        if len(model.prompts) != 2 * len(SAMPLE_ISSUES):
+            failures.append(f"モデル呼び出しが {len(model.prompts)} 回あります")
+
+    if args.check:
+        for failure in failures:
+            print(f"NG: {failure}")
+        if failures:
+            return 1
+        print("OK")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="analyze_issue.py のパイプラインを偽のモデルとGitHubサーバーで実行する"
+    )
+    parser.add_argument("--root", default=str(DEFAULT_ROOT), help="リポジトリのルート")
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=analyze_issue.CONTEXT_TOKEN_BUDGET,
+        help="コンテキストのトークン数の上限",
+    )
+    parser.add_argument(
+        "--model-latency", type=float, default=0.0, help="偽のモデルの応答時間（秒）"
+    )
+    parser.add_argument("--check", action="store_true", help="結果を検証する")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+vrma_to_json.py のベンチマーク・回帰チェック
+
+合成したVRMAファイル（ボーン数・キーフレーム数・補間方式・byteStride・
+サンプラー共有の有無を変えたもの）を一時ディレクトリに生成し、
+read_glb / read_accessor / parse_vrma / シリアライズを個別に計測します。
+ピークメモリは tracemalloc で計測します。ネットワークは使用しません。
+ストリーム出力（stream_vrma）のピークメモリが最大のトラック程度に収まっていることも確認し、
+クリップ全体に比例して増えている場合は終了コード1で終了します。
+
+計測結果は保存したベースラインと比較し、許容範囲を超えて遅くなった
+ステージがあれば終了コード1で終了します。
+
+Usage:
+    python bench_vrma_to_json.py                        # 既定のシナリオを計測
+    python bench_vrma_to_json.py --save-baseline        # 結果をベースラインとして保存
+    python bench_vrma_to_json.py --scenario mocap-10k   # シナリオを指定
+    python bench_vrma_to_json.py --compare-decoders     # struct方式とNumPy方式を比較
+"""
+
+import argparse
+import io
+import json
+import math
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import vrma_to_json
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / ".vrma_bench_baseline.json"
+
+# ベースラインに対してこの割合を超えて遅くなったら回帰とみなす
+DEFAULT_TOLERANCE = 0.25
+
+# VRM 1.0 のヒューマノイドボーン名（合成クリップのボーン割り当てに使用）
+HUMAN_BONES = [
+    "hips", "spine", "chest", "upperChest", "neck", "head", "leftEye",
+    "rightEye", "jaw", "leftUpperLeg", "leftLowerLeg", "leftFoot", "leftToes",
+    "rightUpperLeg", "rightLowerLeg", "rightFoot", "rightToes", "leftShoulder",
+    "leftUpperArm", "leftLowerArm", "leftHand", "rightShoulder",
+    "rightUpperArm", "rightLowerArm", "rightHand", "leftThumbMetacarpal",
+    "leftThumbProximal", "leftThumbDistal", "leftIndexProximal",
+    "leftIndexIntermediate", "leftIndexDistal", "leftMiddleProximal",
+    "leftMiddleIntermediate", "leftMiddleDistal", "leftRingProximal",
+    "leftRingIntermediate", "leftRingDistal", "leftLittleProximal",
+    "leftLittleIntermediate", "leftLittleDistal", "rightThumbMetacarpal",
+    "rightThumbProximal", "rightThumbDistal", "rightIndexProximal",
+    "rightIndexIntermediate", "rightIndexDistal", "rightMiddleProximal",
+    "rightMiddleIntermediate", "rightMiddleDistal", "rightRingProximal",
+    "rightRingIntermediate", "rightRingDistal", "rightLittleProximal",
+    "rightLittleIntermediate", "rightLittleDistal",
+]  # fmt: skip
+
+# シナリオ名 → 合成クリップのパラメータ
+SCENARIOS = {
+    "idle": {"bones": 21, "keyframes": 250},
+    "mocap-1k": {"bones": 55, "keyframes": 1_000},
+    "mocap-10k": {"bones": 55, "keyframes": 10_000},
+    "interleaved-10k": {"bones": 55, "keyframes": 10_000, "interleaved": True},
+    "unshared-10k": {"bones": 55, "keyframes": 10_000, "shared_times": False},
+    "step-10k": {"bones": 55, "keyframes": 10_000, "interpolation": "STEP"},
+    "cubic-10k": {"bones": 55, "keyframes": 10_000, "interpolation": "CUBICSPLINE"},
+}
+
+DEFAULT_SCENARIOS = ["idle", "mocap-1k", "mocap-10k", "interleaved-10k", "cubic-10k"]
+
+# ストリーム出力のピークメモリの上限（最大トラックのエンコード後のサイズの倍数 + 固定分）
+# 丸め後の1トラックはPythonのfloatのリストになり、エンコード後の7倍程度になる
+# クリップ全体をデコードすると数十倍になるため、この上限で区別できる
+STREAM_PEAK_FACTOR = 10
+STREAM_PEAK_SLACK = 256 * 1024
+
+# ストリーム出力のピークメモリの計測に使う変換オプション
+STREAM_OPTIONS = {
+    "format": "json",
+    "stream": True,
+    "precision": 5,
+    "reduce": False,
+    "sharedTimelines": False,
+    "rotationTolerance": vrma_to_json.DEFAULT_ROTATION_TOLERANCE,
+    "positionTolerance": vrma_to_json.DEFAULT_POSITION_TOLERANCE,
+}
+
+# byteStride の上限（glTF仕様）
+MAX_BYTE_STRIDE = 252
+
+
+def _quaternion(bone: int, frame: int) -> tuple:
+    """ボーンとフレームから決まる単位クォータニオンを返す"""
+    half = 0.5 * math.sin(frame * 0.01 + bone)
+    return (math.sin(half), 0.0, 0.0, math.cos(half))
+
+
+def build_vrma(
+    bones: int,
+    keyframes: int,
+    interpolation: str = "LINEAR",
+    interleaved: bool = False,
+    shared_times: bool = True,
+) -> bytes:
+    """ボーンごとに回転トラックを持つ合成VRMA（GLB）のバイト列を生成する
+
+    interleaved=True の場合は複数ボーンの回転を1つのbufferViewにインターリーブし、
+    byteStride 付きで格納する。shared_times=False の場合はボーンごとに時刻accessorを持つ。
+    CUBICSPLINE では [inTangent, value, outTangent] の3要素組で値を格納する。
+    """
+    bones = min(bones, len(HUMAN_BONES))
+    cubic = interpolation == "CUBICSPLINE"
+    samples = keyframes * 3 if cubic else keyframes
+
+    chunks = []
+    buffer_views = []
+    accessors = []
+    offset = 0
+
+    def add_view(data: bytes, stride: int = 0) -> int:
+        nonlocal offset
+        view = {"buffer": 0, "byteOffset": offset, "byteLength": len(data)}
+        if stride:
+            view["byteStride"] = stride
+        buffer_views.append(view)
+        chunks.append(data)
+        offset += len(data)
+        return len(buffer_views) - 1
+
+    def add_accessor(view: int, count: int, type_: str, byte_offset: int = 0) -> int:
+        accessor = {
+            "bufferView": view,
+            "componentType": 5126,
+            "count": count,
+            "type": type_,
+        }
+        if byte_offset:
+            accessor["byteOffset"] = byte_offset
+        accessors.append(accessor)
+        return len(accessors) - 1
+
+    times = struct.pack(f"<{keyframes}f", *(i / 30.0 for i in range(keyframes)))
+    shared_input = add_accessor(add_view(times), keyframes, "SCALAR")
+
+    def sample_values(bone: int) -> list:
+        values = []
+        for frame in range(keyframes):
+            if cubic:
+                values.extend((0.0, 0.0, 0.0, 0.0))
+            values.extend(_quaternion(bone, frame))
+            if cubic:
+                values.extend((0.0, 0.0, 0.0, 0.0))
+        return values
+
+    outputs = []
+    if interleaved:
+        group = MAX_BYTE_STRIDE // 16
+        for start in range(0, bones, group):
+            members = list(range(start, min(start + group, bones)))
+            per_bone = [sample_values(bone) for bone in members]
+            rows = []
+            for sample in range(samples):
+                for values in per_bone:
+                    rows.extend(values[sample * 4 : sample * 4 + 4])
+            stride = 16 * len(members)
+            view = add_view(struct.pack(f"<{len(rows)}f", *rows), stride)
+            for i, _bone in enumerate(members):
+                outputs.append(add_accessor(view, samples, "VEC4", 16 * i))
+    else:
+        for bone in range(bones):
+            values = sample_values(bone)
+            view = add_view(struct.pack(f"<{len(values)}f", *values))
+            outputs.append(add_accessor(view, samples, "VEC4"))
+
+    samplers = []
+    channels = []
+    for bone in range(bones):
+        if shared_times:
+            input_accessor = shared_input
+        else:
+            input_accessor = add_accessor(add_view(times), keyframes, "SCALAR")
+        samplers.append(
+            {
+                "input": input_accessor,
+                "output": outputs[bone],
+                "interpolation": interpolation,
+            }
+        )
+        channels.append(
+            {"sampler": bone, "target": {"node": bone, "path": "rotation"}}
+        )
+
+    json_data = {
+        "asset": {"version": "2.0"},
+        "extensionsUsed": ["VRMC_vrm_animation"],
+        "extensions": {
+            "VRMC_vrm_animation": {
+                "specVersion": "1.0",
+                "humanoid": {
+                    "humanBones": {
+                        HUMAN_BONES[bone]: {"node": bone} for bone in range(bones)
+                    }
+                },
+            }
+        },
+        "nodes": [{"name": HUMAN_BONES[bone]} for bone in range(bones)],
+        "animations": [{"channels": channels, "samplers": samplers}],
+        "accessors": accessors,
+        "bufferViews": buffer_views,
+        "buffers": [{"byteLength": offset}],
+    }
+
+    json_chunk = json.dumps(json_data).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    bin_chunk = b"".join(chunks)
+    bin_chunk += b"\0" * (-len(bin_chunk) % 4)
+    length = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+
+    return b"".join(
+        [
+            struct.pack("<III", vrma_to_json.GLB_MAGIC, 2, length),
+            struct.pack("<II", len(json_chunk), vrma_to_json.CHUNK_TYPE_JSON),
+            json_chunk,
+            struct.pack("<II", len(bin_chunk), vrma_to_json.CHUNK_TYPE_BIN),
+            bin_chunk,
+        ]
+    )
+
+
+def check_clip(path: str, params: dict) -> list[str]:
+    """合成クリップの解析結果が生成パラメータと一致するかを確認し、問題点を返す"""
+    problems = []
+    bones = min(params["bones"], len(HUMAN_BONES))
+    keyframes = params["keyframes"]
+    cubic = params.get("interpolation") == "CUBICSPLINE"
+
+    json_data, bin_data = vrma_to_json.read_glb(path)
+    for i in range(len(json_data["accessors"])):
+        expected = vrma_to_json.read_accessor_list(json_data, bin_data, i)
+        actual = vrma_to_json.read_accessor(json_data, bin_data, i)
+        if hasattr(actual, "tolist"):
+            actual = actual.tolist()
+        if expected != actual:
+            problems.append(f"accessor {i}: struct/NumPy decode mismatch")
+
+    result = vrma_to_json.parse_vrma(path)
+    if len(result["boneNames"]) != bones:
+        problems.append(f"expected {bones} bones, got {len(result['boneNames'])}")
+    for bone in range(bones):
+        track = result["bones"][HUMAN_BONES[bone]]["rotation"]
+        if len(track["times"]) != keyframes:
+            problems.append(f"{HUMAN_BONES[bone]}: wrong keyframe count")
+            continue
+        frame = keyframes // 2
+        value = list(track["values"][frame * 3 + 1 if cubic else frame])
+        expected = _quaternion(bone, frame)
+        if max(abs(a - b) for a, b in zip(value, expected)) > 1e-6:
+            problems.append(f"{HUMAN_BONES[bone]}: wrong value at frame {frame}")
+    return problems
+
+
+def _best_time(fn, repeat: int) -> float:
+    """fn を repeat 回実行した最短時間（秒）を返す"""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _read_all_accessors(path: str) -> None:
+    with vrma_to_json.open_glb(path) as (json_data, bin_data):
+        for i in range(len(json_data["accessors"])):
+            vrma_to_json.read_accessor(json_data, bin_data, i)
+
+
+def _serialize_stream(result: dict) -> None:
+    vrma_to_json.write_json_stream(result, io.BytesIO())
+
+
+class _NullWriter:
+    """書き込まれたバイト数だけを数える出力先（出力自体をメモリに溜めない）"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+
+
+def largest_track_size(path: str, options: dict) -> int:
+    """丸め後のトラックをエンコードしたときの最大サイズ（バイト）を返す"""
+    result = vrma_to_json.parse_vrma(path)
+    if options["precision"] is not None:
+        result = vrma_to_json.round_arrays(result, options["precision"])
+    encode, _item_sep, _key_sep = vrma_to_json._stream_encoder()
+    tracks = [track for paths in result["bones"].values() for track in paths.values()]
+    tracks.extend(result.get("expressions", {}).values())
+    if "lookAt" in result:
+        tracks.append(result["lookAt"])
+    return max((len(encode(track)) for track in tracks), default=0)
+
+
+def measure_stream_memory(path: str, options: dict = STREAM_OPTIONS) -> int:
+    """stream_vrma で変換したときのピークメモリ（バイト）を返す"""
+    tracemalloc.start()
+    vrma_to_json.stream_vrma(path, options, _NullWriter())
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def measure(path: str, repeat: int) -> dict:
+    """各ステージの時間（ミリ秒）と解析＋シリアライズのピークメモリ（バイト）を返す"""
+    result = vrma_to_json.parse_vrma(path)
+    stages = {
+        "read_glb": lambda: vrma_to_json.read_glb(path),
+        "read_accessor": lambda: _read_all_accessors(path),
+        "parse_vrma": lambda: vrma_to_json.parse_vrma(path),
+        "to_json": lambda: vrma_to_json.to_json(result),
+        "stream": lambda: _serialize_stream(result),
+    }
+    metrics = {name: _best_time(fn, repeat) * 1000 for name, fn in stages.items()}
+
+    del result
+    tracemalloc.start()
+    vrma_to_json.to_json(vrma_to_json.parse_vrma(path))
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    metrics["peak_memory"] = peak
+    metrics["stream_peak_memory"] = measure_stream_memory(path)
+
+    return metrics
+
+
+def compare_with_baseline(
+    results: dict, baseline: dict, tolerance: float
+) -> list[str]:
+    """ベースラインより許容範囲を超えて悪化した項目を返す"""
+    regressions = []
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            base = baseline.get(scenario, {}).get(name)
+            if not base:
+                continue
+            if value > base * (1.0 + tolerance):
+                regressions.append(
+                    f"{scenario} {name}: {value:.2f} (baseline {base:.2f}, "
+                    f"+{value / base - 1.0:.0%})"
+                )
+    return regressions
+
+
+def compare_decoders(keyframe_counts: list[int], bones: int, repeat: int) -> None:
+    """struct方式とNumPy方式のアクセサ読み出し・シリアライズ時間を比較表示する"""
+
+    def read_array(json_data, bin_data, index):
+        return vrma_to_json.read_accessor_array(json_data, bin_data, index)
+
+    print(f"{'keyframes':>10} {'method':<8} {'read [ms]':>10} {'dump [ms]':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for keyframes in keyframe_counts:
+            path = Path(tmp) / f"decoders-{keyframes}.vrma"
+            path.write_bytes(build_vrma(bones, keyframes))
+            json_data, bin_data = vrma_to_json.read_glb(str(path))
+            indices = range(len(json_data["accessors"]))
+
+            for name, read in (
+                ("struct", vrma_to_json.read_accessor_list),
+                ("numpy", read_array),
+            ):
+                decoded = []
+
+                def read_all():
+                    decoded[:] = [read(json_data, bin_data, i) for i in indices]
+
+                read_time = _best_time(read_all, repeat)
+                dump_time = _best_time(
+                    lambda: vrma_to_json.to_json({"accessors": decoded}), repeat
+                )
+                print(
+                    f"{keyframes:>10} {name:<8} {read_time * 1000:>10.2f} "
+                    f"{dump_time * 1000:>10.2f}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="vrma_to_json のベンチマークと回帰チェックを実行する"
+    )
+    parser.add_argument(
+        "--scenario",
+        nargs="+",
+        choices=sorted(SCENARIOS),
+        default=DEFAULT_SCENARIOS,
+        help="計測するシナリオ",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数")
+    parser.add_argument(
+        "--baseline", default=str(DEFAULT_BASELINE), help="ベースラインファイルのパス"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="計測結果をベースラインとして保存する"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="回帰とみなす悪化率（0.25 = 25%%）",
+    )
+    parser.add_argument(
+        "--compare-decoders",
+        action="store_true",
+        help="struct方式とNumPy方式のアクセサ読み出しを比較する",
+    )
+    parser.add_argument(
+        "--keyframes",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000, 100_000],
+        help="--compare-decoders のキーフレーム数（複数指定可）",
+    )
+    parser.add_argument(
+        "--bones", type=int, default=55, help="--compare-decoders のボーン数"
+    )
+    args = parser.parse_args()
+
+    if vrma_to_json.np is None:
+        print("Error: NumPy is required for this benchmark", file=sys.stderr)
+        sys.exit(1)
+
+    if args.compare_decoders:
+        compare_decoders(args.keyframes, args.bones, args.repeat)
+        return
+
+    results = {}
+    failed = False
+    stages = ["read_glb", "read_accessor", "parse_vrma", "to_json", "stream"]
+    print(
+        f"{'scenario':<16} {'size':>10} "
+        + " ".join(f"{name:>13}" for name in stages)
+        + f" {'peak [MB]':>10} {'stream [MB]':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for scenario in args.scenario:
+            params = SCENARIOS[scenario]
+            path = Path(tmp) / f"{scenario}.vrma"
+            path.write_bytes(build_vrma(**params))
+
+            problems = check_clip(str(path), params)
+            if problems:
+                failed = True
+                for problem in problems:
+                    print(f"Error: {scenario}: {problem}", file=sys.stderr)
+                continue
+
+            metrics = measure(str(path), args.repeat)
+            results[scenario] = metrics
+            print(
+                f"{scenario:<16} {path.stat().st_size:>10} "
+                + " ".join(f"{metrics[name]:>10.2f} ms" for name in stages)
+                + f" {metrics['peak_memory'] / 1e6:>10.1f}"
+                + f" {metrics['stream_peak_memory'] / 1e6:>10.1f}"
+            )
+
+            largest = largest_track_size(str(path), STREAM_OPTIONS)
+            limit = STREAM_PEAK_FACTOR * largest + STREAM_PEAK_SLACK
+            if metrics["stream_peak_memory"] > limit:
+                failed = True
+                print(
+                    f"Error: {scenario}: stream peak memory "
+                    f"{metrics['stream_peak_memory']} bytes exceeds {limit} bytes "
+                    f"(largest track {largest} bytes)",
+                    file=sys.stderr,
+                )
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {baseline_path}", file=sys.stderr)
+    elif baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            failed = True
+            print("Regressions:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+        else:
+            print(f"No regressions against {baseline_path}", file=sys.stderr)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+リポジトリのソースコードを対象にしたローカル検索インデックス
+
+TS/TSX/JS/Python ファイルを走査して、パス・シンボル（関数・クラス・型・定数）・
+import先・コメントから語を抽出し、BM25 で検索できる転置インデックスを作成します。
+インデックスは JSON に保存し、次回以降は更新日時・サイズ（一致しない場合は内容のハッシュ）が
+変わったファイルだけを解析し直します。ネットワークは使用しません。
+
+英数字の識別子は camelCase / snake_case で分割し、日本語（コメントやIssue本文）は
+文字バイグラムで索引付けするため、日本語のIssueからも関連ファイルを検索できます。
+
+Usage:
+    python code_index.py --query "スライドの音声が再生されない"     # 関連ファイルを表示
+    python code_index.py --query "slide" --top 10 --root ..        # 件数・ルートを指定
+    python code_index.py --rebuild                                 # インデックスを作り直す
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parent / ".code_index.json"
+
+# 保存形式や語の抽出方法を変えたら上げる（古いインデックスは作り直す）
+INDEX_VERSION = 1
+
+# 索引付けするファイルの拡張子
+SOURCE_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".py")
+# 走査しないディレクトリ
+EXCLUDED_DIRS = {
+    "node_modules",
+    "public",
+    "dist",
+    "build",
+    "out",
+    "coverage",
+    "venv",
+    "__pycache__",
+}
+# 索引付けしないファイル（リポジトリルートからの相対パスのパターン）
+# Issue分析のツール自身は docstring に例として日本語のIssueを含み、検索結果の上位に
+# 来てアプリケーションのコードを押し出すため除外する
+EXCLUDED_FILES = (
+    "scripts/analyze_issue.py",
+    "scripts/code_index.py",
+    "scripts/context_packer.py",
+    "scripts/bench_*.py",
+)
+# これより大きいファイルは生成物とみなして索引付けしない
+MAX_FILE_SIZE = 512 * 1024
+
+# フィールドごとの重み（語の出現回数に掛ける）
+FIELD_WEIGHTS = {"path": 4, "symbol": 3, "import": 1, "comment": 1}
+
+# BM25 のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 検索に役立たない語（言語のキーワードや頻出語）
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "import", "export", "default", "const",
+    "let", "var", "function", "return", "async", "await", "class", "type",
+    "interface", "this", "that", "new", "true", "false", "null", "undefined",
+    "def", "self", "none", "src", "index", "tsx", "ts", "js", "py", "is", "to",
+    "of", "in", "on", "if", "it", "be", "as", "or", "an", "at", "by", "use",
+}
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9_$]+")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\d|\b)|[A-Z]?[a-z]+|[A-Z]+|\d+")
+CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿]+")
+# ひらがなだけの語（助詞・活用語尾など）は検索に役立たないため除く
+HIRAGANA_ONLY_PATTERN = re.compile(r"^[぀-ゟ]+$")
+
+TS_SYMBOL_PATTERN = re.compile(
+    r"(?:^|[\s;])(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:async\s+)?"
+    r"(?:function\*?|class|interface|type|enum|const|let|var)\s+([A-Za-z_$][\w$]*)"
+)
+TS_IMPORT_PATTERN = re.compile(
+    r"""(?:from|import)\s*['"]([^'"]+)['"]|(?:import|require)\s*\(\s*['"]([^'"]+)['"]\s*\)"""
+)
+TS_COMMENT_PATTERN = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+PY_SYMBOL_PATTERN = re.compile(
+    r"^\s*(?:async\s+)?(?:def|class)\s+(\w+)|^([A-Za-z_]\w*)\s*(?::[^=\n]*)?=", re.M
+)
+PY_IMPORT_PATTERN = re.compile(r"^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w.]+))", re.M)
+PY_COMMENT_PATTERN = re.compile(r"#[^\n]*|\"\"\".*?\"\"\"|'''.*?'''", re.S)
+
+
+# --- 語の抽出 ---
+def tokenize(text: str) -> List[str]:
+    """テキストを検索用の語に分解する
+
+    識別子は全体（小文字）と camelCase / snake_case の各部分に分け、
+    日本語の連続部分は文字バイグラムにする（ひらがなだけのバイグラムは除く）。
+    """
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        parts = [
+            part.lower()
+            for chunk in word.split("_")
+            for part in CAMEL_PATTERN.findall(chunk)
+        ]
+        whole = word.replace("$", "").lower()
+        if len(parts) > 1 and len(whole) >= 2:
+            tokens.append(whole)
+        tokens.extend(parts)
+    for run in CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return [
+        token
+        for token in tokens
+        if token not in STOPWORDS
+        and (len(token) >= 2 or CJK_PATTERN.match(token))
+        and not HIRAGANA_ONLY_PATTERN.match(token)
+    ]
+
+
+def extract_fields(rel_path: str, source: str) -> Dict[str, List[str]]:
+    """ファイルのパス・シンボル・import先・コメントを取り出す"""
+    if rel_path.endswith(".py"):
+        symbols = [a or b for a, b in PY_SYMBOL_PATTERN.findall(source)]
+        imports = [a or b for a, b in PY_IMPORT_PATTERN.findall(source)]
+        comments = PY_COMMENT_PATTERN.findall(source)
+    else:
+        symbols = TS_SYMBOL_PATTERN.findall(source)
+        imports = [a or b for a, b in TS_IMPORT_PATTERN.findall(source)]
+        comments = TS_COMMENT_PATTERN.findall(source)
+    return {
+        "path": [re.sub(r"\.[^./]+$", "", rel_path)],
+        "symbol": symbols,
+        "import": imports,
+        "comment": comments,
+    }
+
+
+def document_terms(fields: Dict[str, List[str]]) -> Dict[str, float]:
+    """フィールドの重みを掛けた語の出現回数を返す"""
+    terms: Dict[str, float] = {}
+    for field, values in fields.items():
+        weight = FIELD_WEIGHTS[field]
+        for value in values:
+            for token in tokenize(value):
+                terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+# --- インデックス ---
+class CodeIndex:
+    """ファイルごとの語の出現回数を保存し、BM25 でファイルを検索する
+
+    entries は {相対パス: {"mtime", "size", "sha", "terms", "length", "symbols"}}。
+    """
+
+    def __init__(self, root: Path, path: Optional[Path] = DEFAULT_INDEX_PATH):
+        self.root = Path(root).resolve()
+        self.path = Path(path) if path else None
+        self.entries: Dict[str, dict] = {}
+        self.stats = {"reused": 0, "rehashed": 0, "parsed": 0, "removed": 0}
+        self._idf: Optional[Dict[str, float]] = None
+        if self.path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("root") == str(self.root):
+            self.entries = data.get("entries", {})
+
+    def save(self) -> None:
+        """インデックスを一時ファイル経由で保存する"""
+        if self.path is None:
+            return
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": INDEX_VERSION, "root": str(self.root), "entries": self.entries},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(temp_path, self.path)
+
+    def iter_source_files(self):
+        """索引付けの対象になるファイルの相対パスを列挙する"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(
+                name
+                for name in dirnames
+                if name not in EXCLUDED_DIRS and not name.startswith(".")
+            )
+            for filename in sorted(filenames):
+                if filename.endswith(SOURCE_EXTENSIONS) and not filename.endswith(
+                    ".d.ts"
+                ):
+                    full_path = os.path.join(dirpath, filename)
+                    rel_path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+                    if not any(fnmatch.fnmatch(rel_path, p) for p in EXCLUDED_FILES):
+                        yield rel_path
+
+    def update(self) -> "CodeIndex":
+        """変更されたファイルだけを解析し直してインデックスを最新にする"""
+        seen = set()
+        for rel_path in self.iter_source_files():
+            full_path = self.root / rel_path
+            try:
+                stat = full_path.stat()
+            except OSError:
+                continue
+            if stat.st_size > MAX_FILE_SIZE:
+                continue
+            seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if (
+                entry
+                and entry["mtime"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size
+            ):
+                self.stats["reused"] += 1
+                continue
+
+            data = full_path.read_bytes()
+            sha = hashlib.sha1(data).hexdigest()
+            if entry and entry["sha"] == sha:
+                # チェックアウトなどで更新日時だけが変わった場合
+                entry["mtime"] = stat.st_mtime_ns
+                entry["size"] = stat.st_size
+                self.stats["rehashed"] += 1
+                continue
+
+            source = data.decode("utf-8", errors="replace")
+            fields = extract_fields(rel_path, source)
+            terms = document_terms(fields)
+            self.entries[rel_path] = {
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sha": sha,
+                "terms": terms,
+                "length": sum(terms.values()),
+                "symbols": sorted(set(fields["symbol"])),
+            }
+            self.stats["parsed"] += 1
+
+        for rel_path in list(self.entries):
+            if rel_path not in seen:
+                del self.entries[rel_path]
+                self.stats["removed"] += 1
+        self._idf = None
+        return self
+
+    def _document_frequencies(self) -> Dict[str, float]:
+        if self._idf is None:
+            df: Dict[str, int] = {}
+            for entry in self.entries.values():
+                for term in entry["terms"]:
+                    df[term] = df.get(term, 0) + 1
+            n = len(self.entries)
+            self._idf = {
+                term: math.log(1 + (n - count + 0.5) / (count + 0.5))
+                for term, count in df.items()
+            }
+        return self._idf
+
+    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float, List[str]]]:
+        """クエリに関連するファイルを BM25 のスコア順に返す
+
+        Returns:
+            [(相対パス, スコア, 一致した語)]（スコアが同じ場合はパス順）
+        """
+        if not self.entries:
+            return []
+        idf = self._document_frequencies()
+        query_terms = sorted(set(tokenize(query)))
+        average_length = sum(e["length"] for e in self.entries.values()) / len(
+            self.entries
+        )
+        results = []
+        for rel_path, entry in self.entries.items():
+            score = 0.0
+            matched = []
+            norm = BM25_K1 * (
+                1 - BM25_B + BM25_B * entry["length"] / max(average_length, 1e-9)
+            )
+            for term in query_terms:
+                tf = entry["terms"].get(term)
+                if not tf:
+                    continue
+                score += idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+                matched.append(term)
+            if score > 0:
+                results.append((rel_path, score, matched))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:top_k]
+
+
+def load_index(
+    root: Path = DEFAULT_ROOT, path: Optional[Path] = DEFAULT_INDEX_PATH
+) -> CodeIndex:
+    """保存済みのインデックスを読み込み、変更されたファイルを反映して保存する"""
+    index = CodeIndex(root, path).update()
+    if any(index.stats[key] for key in ("rehashed", "parsed", "removed")):
+        index.save()
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="リポジトリのソースコードを索引付けし、関連ファイルを検索する"
+    )
+    parser.add_argument("--root", default=str(DEFAULT_ROOT), help="リポジトリのルート")
+    parser.add_argument(
+        "--index", default=str(DEFAULT_INDEX_PATH), help="インデックスの保存先"
+    )
+    parser.add_argument("--query", help="検索するテキスト（Issueのタイトル・本文など）")
+    parser.add_argument("--top", type=int, default=20, help="表示する件数")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="保存済みのインデックスを使わずに作り直す"
+    )
+    args = parser.parse_args()
+
+    index_path = Path(args.index)
+    if args.rebuild and index_path.exists():
+        index_path.unlink()
+
+    started = time.perf_counter()
+    index = load_index(Path(args.root), index_path)
+    elapsed = (time.perf_counter() - started) * 1000
+    stats = ", ".join(f"{key}={value}" for key, value in index.stats.items())
+    print(
+        f"インデックス: {len(index.entries)} ファイル ({stats}) {elapsed:.1f} ms",
+        file=sys.stderr,
+    )
+
+    if args.query:
+        started = time.perf_counter()
+        results = index.search(args.query, args.top)
+        elapsed = (time.perf_counter() - started) * 1000
+        for rel_path, score, matched in results:
+            print(f"{score:8.3f}  {rel_path}  [{', '.join(matched[:8])}]")
+        print(f"検索: {len(results)} 件 {elapsed:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Issue分析のプロンプトに入れるコードをトークン予算内に詰める
+
+ファイルをトップレベルの宣言（関数・クラス・定数など）単位の領域に分け、
+Issueのテキストとの関連度（code_index と同じ語の抽出方法）で領域を順位付けし、
+予算に収まるまで関連度の高い順に採用します。採用した領域はファイルごとに行番号付きで
+出力するため、JSON文字列としてエスケープするよりトークン数が少なくなります。
+入力が同じなら結果も同じになり、ネットワークやモデルは使用しません。
+
+Usage:
+    python context_packer.py --query "スライドの音声が再生されない" src/features/stores/slide.ts
+    python context_packer.py --query "..." --budget 4000 src/a.ts src/b.tsx   # 予算を指定
+"""
+
+import argparse
+import math
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from code_index import tokenize
+from token_count import estimate_tokens
+
+# プロンプトに入れるコードのトークン数の上限
+DEFAULT_TOKEN_BUDGET = 30000
+# これ以下のファイルは領域に分けずにファイル全体を1つの領域として扱う
+WHOLE_FILE_TOKENS = 600
+# 1つの領域の行数の上限（超える場合は分割する）
+MAX_REGION_LINES = 80
+
+# トップレベルの宣言の開始行（インデントなし）
+TS_BOUNDARY_PATTERN = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:async\s+)?"
+    r"(?:function\b|class\b|interface\b|type\b|enum\b|const\b|let\b|var\b|describe\(|it\(|test\()"
+)
+PY_BOUNDARY_PATTERN = re.compile(r"^(?:async\s+def|def|class)\b")
+
+LANGUAGE_BY_EXTENSION = {
+    ".ts": "ts",
+    ".tsx": "tsx",
+    ".js": "js",
+    ".jsx": "jsx",
+    ".mjs": "js",
+    ".py": "python",
+    ".json": "json",
+    ".md": "markdown",
+}
+
+
+@dataclass
+class Region:
+    """ファイル内の連続した行の範囲（行番号は1始まり、end は含む）"""
+
+    path: str
+    start: int
+    end: int
+    text: str
+    tokens: int = 0
+    score: float = 0.0
+
+
+@dataclass
+class PackedContext:
+    """詰め込んだ結果"""
+
+    text: str
+    tokens: int
+    budget: int
+    # {パス: [(開始行, 終了行)]}（ファイル内は行番号順）
+    included: Dict[str, List[tuple]] = field(default_factory=dict)
+    # 1行も入らなかったファイル
+    omitted: List[str] = field(default_factory=list)
+
+
+# --- 領域の分割 ---
+def split_regions(path: str, content: str) -> List[Region]:
+    """ファイルをトップレベルの宣言ごとの領域に分ける
+
+    宣言の直前のコメント・デコレータは同じ領域に含め、長すぎる領域は
+    MAX_REGION_LINES 行ごとに分割する。小さいファイルは全体を1つの領域にする。
+    """
+    lines = content.splitlines()
+    if not lines:
+        return []
+    if estimate_tokens(content) <= WHOLE_FILE_TOKENS:
+        return [Region(path, 1, len(lines), "\n".join(lines))]
+
+    pattern = PY_BOUNDARY_PATTERN if path.endswith(".py") else TS_BOUNDARY_PATTERN
+    starts = [0]
+    for index, line in enumerate(lines):
+        if index == 0 or not pattern.match(line):
+            continue
+        # 直前のコメント・デコレータ（インデントなし）を宣言と同じ領域に入れる
+        start = index
+        while start > starts[-1] + 1 and lines[start - 1].startswith(
+            ("//", "/*", " *", "#", "@")
+        ):
+            start -= 1
+        if start > starts[-1]:
+            starts.append(start)
+
+    regions = []
+    bounds = starts + [len(lines)]
+    for begin, finish in zip(bounds, bounds[1:]):
+        for chunk_start in range(begin, finish, MAX_REGION_LINES):
+            chunk_end = min(finish, chunk_start + MAX_REGION_LINES)
+            text = "\n".join(lines[chunk_start:chunk_end])
+            if text.strip():
+                regions.append(Region(path, chunk_start + 1, chunk_end, text))
+    return regions
+
+
+# --- 関連度 ---
+def score_regions(
+    query: str,
+    regions: List[Region],
+    file_scores: Optional[Dict[str, float]] = None,
+) -> None:
+    """Issueのテキストと各領域の関連度を計算して region.score に設定する
+
+    クエリの語ごとに idf × log(1 + 出現回数) を足し、ファイル自体の関連度
+    （code_index の検索スコアなど）を正規化して加える。
+    """
+    query_terms = set(tokenize(query))
+    region_terms = []
+    df: Dict[str, int] = {}
+    for region in regions:
+        counts: Dict[str, int] = {}
+        for token in tokenize(region.text):
+            if token in query_terms:
+                counts[token] = counts.get(token, 0) + 1
+        region_terms.append(counts)
+        for token in counts:
+            df[token] = df.get(token, 0) + 1
+
+    n = max(1, len(regions))
+    top_file_score = max((file_scores or {}).values(), default=0) or 1
+    for region, counts in zip(regions, region_terms):
+        score = sum(
+            math.log(1 + n / df[token]) * math.log(1 + count)
+            for token, count in counts.items()
+        )
+        if file_scores:
+            score += file_scores.get(region.path, 0) / top_file_score
+        region.score = score
+
+
+# --- 詰め込み ---
+def render_region(region: Region) -> str:
+    """領域を行番号付きで出力する"""
+    width = len(str(region.end))
+    return "\n".join(
+        f"{str(number).rjust(width)}| {line}"
+        for number, line in enumerate(region.text.split("\n"), region.start)
+    )
+
+
+def merge_regions(regions: List[Region]) -> List[Region]:
+    """行番号順の領域のうち、連続するものを1つにまとめる"""
+    merged: List[Region] = []
+    for region in regions:
+        if merged and merged[-1].end + 1 == region.start:
+            last = merged[-1]
+            merged[-1] = Region(
+                last.path, last.start, region.end, f"{last.text}\n{region.text}"
+            )
+        else:
+            merged.append(region)
+    return merged
+
+
+def render_file(path: str, regions: List[Region]) -> str:
+    """ファイルの見出しと、採用した領域（省略箇所は ... ）をコードブロックで出力する"""
+    language = LANGUAGE_BY_EXTENSION.get(re.sub(r"^.*(\.[^.]+)$", r"\1", path), "")
+    blocks = merge_regions(regions)
+    ranges = ", ".join(f"{block.start}-{block.end}" for block in blocks)
+    body = "\n...\n".join(render_region(block) for block in blocks)
+    return f"### {path} (lines {ranges})\n```{language}\n{body}\n```"
+
+
+def pack_context(
+    query: str,
+    files: Dict[str, str],
+    budget: int = DEFAULT_TOKEN_BUDGET,
+    file_scores: Optional[Dict[str, float]] = None,
+) -> PackedContext:
+    """関連度の高い領域からトークン予算に収まるものを選び、プロンプト用のテキストにする
+
+    領域は (関連度の降順, ファイルの順, 開始行) で並べて貪欲に採用する。
+    ファイルの順は files の順（関連度の高いファイルから渡す想定）。
+    見出し・コードブロックの記号の分もトークン数に含め、それでも出力が予算を
+    超えた場合は関連度の低い領域から外して収める。
+    """
+    order = {path: index for index, path in enumerate(files)}
+    regions = [
+        region for path, content in files.items() for region in split_regions(path, content)
+    ]
+    score_regions(query, regions, file_scores)
+    for region in regions:
+        region.tokens = estimate_tokens(render_region(region)) + 1
+
+    ranked = sorted(regions, key=lambda r: (-r.score, order[r.path], r.start))
+    chosen: List[Region] = []
+    seen_paths = set()
+    used = 0
+    for region in ranked:
+        cost = region.tokens
+        if region.path not in seen_paths:
+            # 見出しとコードブロックの記号
+            cost += estimate_tokens(render_file(region.path, [])) + 8
+        if used + cost > budget:
+            continue
+        chosen.append(region)
+        seen_paths.add(region.path)
+        used += cost
+
+    while True:
+        text, included = _render(files, chosen)
+        tokens = estimate_tokens(text)
+        if tokens <= budget or not chosen:
+            break
+        chosen.pop()  # 最も関連度の低い領域を外す
+
+    return PackedContext(
+        text=text,
+        tokens=tokens,
+        budget=budget,
+        included=included,
+        omitted=[path for path in files if path not in included],
+    )
+
+
+def _render(files: Dict[str, str], chosen: List[Region]):
+    """採用した領域を files の順にファイルごとにまとめて出力する"""
+    by_path: Dict[str, List[Region]] = {}
+    for region in chosen:
+        by_path.setdefault(region.path, []).append(region)
+    sections = []
+    included = {}
+    for path in files:
+        if path not in by_path:
+            continue
+        file_regions = sorted(by_path[path], key=lambda r: r.start)
+        sections.append(render_file(path, file_regions))
+        included[path] = [
+            (block.start, block.end) for block in merge_regions(file_regions)
+        ]
+    return "\n\n".join(sections), included
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Issueに関連するコードの領域をトークン予算内に詰めて表示する"
+    )
+    parser.add_argument("files", nargs="+", help="対象のファイル（関連度の高い順）")
+    parser.add_argument("--query", required=True, help="Issueのタイトル・本文")
+    parser.add_argument(
+        "--budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="トークン数の上限"
+    )
+    args = parser.parse_args()
+
+    files = {}
+    for path in args.files:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            files[path] = f.read()
+    packed = pack_context(args.query, files, args.budget)
+    print(packed.text)
+    print(
+        f"\n{packed.tokens} / {packed.budget} トークン, "
+        f"{len(packed.included)} ファイル（省略 {len(packed.omitted)} ファイル）",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
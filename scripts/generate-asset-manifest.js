@@ -10,6 +10,7 @@
  * - 25MB超のファイルを除外
  * - 非ASCIIファイル名を除外
  */
+const crypto = require('crypto')
 const fs = require('fs')
 const path = require('path')
 const { execSync } = require('child_process')
@@ -201,6 +202,75 @@ function generatePngtuberList() {
   return results
 }
 
+// --- Poses ---
+
+function readPoseIndex() {
+  // scripts/vrma_to_json.py --pose-index で生成したインデックス（任意）
+  const indexPath = path.join(publicDir, 'poses', 'index.json')
+  try {
+    const index = JSON.parse(fs.readFileSync(indexPath, 'utf-8'))
+    return new Map(
+      (index.poses || []).map((entry) => [path.basename(entry.path), entry])
+    )
+  } catch {
+    return new Map()
+  }
+}
+
+function poseContentHash(fullPath, content, bufferName) {
+  // vrma_to_json.py の _pose_file_digest と同じ計算（サイドカーが無ければ null）
+  const hash = crypto.createHash('sha256').update(content)
+  if (bufferName) {
+    const bufferPath = path.join(
+      path.dirname(fullPath),
+      path.basename(bufferName)
+    )
+    if (!fs.existsSync(bufferPath)) return null
+    hash.update(fs.readFileSync(bufferPath))
+  }
+  return hash.digest('hex')
+}
+
+function generatePoseList() {
+  const files = getTrackedFiles('poses').filter(
+    (f) => f.endsWith('.json') && path.basename(f) !== 'index.json'
+  )
+  const poseIndex = readPoseIndex()
+
+  const results = []
+  for (const file of files) {
+    const fileName = path.basename(file)
+    const name = fileName.replace('.json', '')
+    const fullPath = path.join(projectRoot, file)
+    const content = fs.readFileSync(fullPath)
+
+    // インデックスと内容が一致する場合はパースを省略し、内容ハッシュも載せる
+    // （bin 形式はヘッダーと .bin サイドカーを合わせたハッシュ）
+    const entry = poseIndex.get(fileName)
+    if (entry && entry.hash) {
+      const hash = poseContentHash(fullPath, content, entry.buffer)
+      if (hash === entry.hash) {
+        results.push({ name, path: `/poses/${fileName}`, hash })
+        continue
+      }
+    }
+
+    // get-pose-list.tsと同じ判定でポーズJSONかを確認
+    try {
+      const json = JSON.parse(content.toString('utf-8'))
+      if ((json.specVersion && json.bones) || (json.version && json.pose)) {
+        results.push({ name, path: `/poses/${fileName}` })
+      }
+    } catch (e) {
+      console.warn(
+        `generate-asset-manifest: Warning: Could not parse ${fullPath}:`,
+        e.message
+      )
+    }
+  }
+  return results
+}
+
 // --- Slides ---
 
 function generateSlides() {
@@ -290,6 +360,7 @@ const manifest = {
   backgrounds: generateBackgroundList(),
   live2d: generateLive2dList(),
   pngtuber: generatePngtuberList(),
+  poses: generatePoseList(),
   slides: generateSlides(),
 }
 
@@ -300,4 +371,5 @@ console.log(`  vrm: ${manifest.vrm.length} files`)
 console.log(`  backgrounds: ${manifest.backgrounds.length} files`)
 console.log(`  live2d: ${manifest.live2d.length} models`)
 console.log(`  pngtuber: ${manifest.pngtuber.length} models`)
+console.log(`  poses: ${manifest.poses.length} files`)
 console.log(`  slides: ${manifest.slides.folders.length} folders`)
@@ -0,0 +1,48 @@
+"""
+プロンプトのトークン数の見積もり（auto_translate.py / context_packer.py で共通）
+
+tiktoken が使える場合は o200k_base（gpt-4o 以降・Claude の概算に使う）で数え、
+使えない場合（未インストール・エンコーディングを取得できない場合）は文字の種類で概算します。
+エンコーディングはプロセス内で一度だけ取得します。
+"""
+
+import math
+import sys
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+ENCODING_NAME = "o200k_base"
+
+_encoding = None
+
+
+def _get_encoding():
+    """tiktoken のエンコーディングを取得する（取得できない場合は None）"""
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(ENCODING_NAME)
+            except Exception as e:
+                print(
+                    f"警告: tiktoken のエンコーディングを取得できません。文字数で概算します。 {e}",
+                    file=sys.stderr,
+                )
+    return _encoding or None
+
+
+def estimate_tokens(text: str) -> int:
+    """テキストのトークン数を見積もる
+
+    tiktoken が使えない場合は、ASCII文字は4文字で1トークン、それ以外（日本語など）は
+    1文字で1トークンとして概算する（コードの実測に近く、日本語では多めに見積もる）。
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+    return len(encoding.encode(text))
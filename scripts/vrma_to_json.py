@@ -3,18 +3,51 @@
 VRMA (VRM Animation) ファイルからボーン情報を抽出してJSONに変換するCLIツール
 https://www.vrmwebpose.app/ で作成したVRMAファイルを解析して、ボーンのアニメーションデータをJSON形式で出力します。
 作成したjsonは public/poses/ 以下に配置する必要があります。
+NumPyがインストールされている場合はアクセサをゼロコピーで読み出し、変換が高速になります。
 
 Usage:
     python vrma_to_json.py input.vrma                    # 標準出力にJSON表示
     python vrma_to_json.py input.vrma -o output.json     # ファイルに保存
     python vrma_to_json.py input.vrma --pretty            # 整形表示
+    python vrma_to_json.py input.vrma --reduce --info     # キーフレーム削減の効果を確認
+    python vrma_to_json.py input.vrma --precision 5 -o output.json   # 小数5桁に丸めて保存
+    python vrma_to_json.py input.vrma --format bin --quantize -o output.json   # output.bin も出力
+    python vrma_to_json.py input.vrma --compare-formats   # 出力形式ごとのサイズを比較
+    python vrma_to_json.py input.vrma --stream -o output.json   # トラック単位で逐次書き出し
+    python vrma_to_json.py input.vrma --format ndjson     # 1行1トラックのNDJSONで出力
+    python vrma_to_json.py input.vrma --pose-at 0 1.5 -o pose.json   # pose_1.json, pose_2.json を出力
+    python vrma_to_json.py vrma_dir/ --out-dir public/poses/ --pose-index public/poses/index.json
+    python vrma_to_json.py vrma_dir/ --out-dir public/poses/   # ディレクトリを一括変換
+    python vrma_to_json.py "clips/**/*.vrma" --out-dir out/ -j 8   # globで一括変換（並列数指定）
 """
 
 import argparse
+import bisect
+import glob
+import hashlib
+import io
 import json
+import math
+import mmap
+import os
+import shutil
 import struct
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy未導入の場合はstructによるリスト展開で処理する
+    np = None
+
+try:
+    import orjson
+except ImportError:  # orjson未導入の場合は標準のjsonでストリーム出力する
+    orjson = None
 
 
 # componentType → (format char, byte size)
@@ -27,6 +60,15 @@ COMPONENT_TYPES = {
     5126: ("f", 4),  # FLOAT
 }
 
+# normalized=true の整数型を浮動小数に変換する際の除数
+NORMALIZE_DIVISORS = {
+    5120: 127.0,
+    5121: 255.0,
+    5122: 32767.0,
+    5123: 65535.0,
+    5125: 4294967295.0,
+}
+
 # type → 要素数
 TYPE_SIZES = {
     "SCALAR": 1,
@@ -37,43 +79,144 @@ TYPE_SIZES = {
 }
 
 
-def read_glb(path: str) -> tuple[dict, bytes]:
-    """GLBファイルからJSONチャンクとBINチャンクを読み出す"""
+GLB_MAGIC = 0x46546C67  # 'glTF'
+CHUNK_TYPE_JSON = 0x4E4F534A  # 'JSON'
+CHUNK_TYPE_BIN = 0x004E4942  # 'BIN\0'
+
+
+def _parse_glb_layout(buf, path: str) -> tuple[slice, Optional[slice]]:
+    """GLBのヘッダーとチャンク配置を検証し、JSON/BINチャンクの範囲を返す"""
+    if len(buf) < 20:
+        raise ValueError(f"Not a valid GLB file: {path}")
+
+    magic, _version, length = struct.unpack_from("<III", buf, 0)
+    if magic != GLB_MAGIC:
+        raise ValueError(f"Not a valid GLB file: {path}")
+    if length > len(buf):
+        raise ValueError(
+            f"GLB header length {length} exceeds file size {len(buf)}: {path}"
+        )
+
+    json_range = None
+    bin_range = None
+    pos = 12
+    while pos < length:
+        if pos + 8 > length:
+            raise ValueError(f"Truncated GLB chunk header at offset {pos}: {path}")
+        chunk_length, chunk_type = struct.unpack_from("<II", buf, pos)
+        if chunk_length % 4 != 0:
+            raise ValueError(
+                f"GLB chunk at offset {pos} is not 4-byte aligned "
+                f"(length {chunk_length}): {path}"
+            )
+        start = pos + 8
+        end = start + chunk_length
+        if end > length:
+            raise ValueError(f"GLB chunk at offset {pos} exceeds file length: {path}")
+
+        if json_range is None:
+            # 先頭チャンクは必ずJSON
+            if chunk_type != CHUNK_TYPE_JSON:
+                raise ValueError("Expected JSON chunk")
+            json_range = slice(start, end)
+        elif chunk_type == CHUNK_TYPE_BIN and bin_range is None:
+            bin_range = slice(start, end)
+        # 未知のチャンクは仕様に従い無視する
+        pos = end
+
+    if json_range is None:
+        raise ValueError("Expected JSON chunk")
+    return json_range, bin_range
+
+
+@contextmanager
+def open_glb(path: str) -> Iterator[tuple[dict, memoryview]]:
+    """GLBファイルをmmapで開き、JSONチャンクとBINチャンクのビューを返す
+
+    BINチャンクはファイル上のビューのままなので、実際に参照したアクセサの
+    ページだけが読み込まれる。ビューは with ブロックの外では使用できない。
+    """
     with open(path, "rb") as f:
-        magic, _version, length = struct.unpack("<III", f.read(12))
-        if magic != 0x46546C67:  # 'glTF'
+        if os.fstat(f.fileno()).st_size == 0:
             raise ValueError(f"Not a valid GLB file: {path}")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
-        # JSONチャンク
-        chunk_length, chunk_type = struct.unpack("<II", f.read(8))
-        if chunk_type != 0x4E4F534A:  # 'JSON'
-            raise ValueError("Expected JSON chunk")
-        json_data = json.loads(f.read(chunk_length))
+    view = memoryview(mapped)
+    bin_view = None
+    try:
+        json_range, bin_range = _parse_glb_layout(view, path)
+        json_data = json.loads(bytes(view[json_range]))
+        bin_view = view[bin_range] if bin_range is not None else memoryview(b"")
+        yield json_data, bin_view
+    finally:
+        try:
+            if bin_view is not None:
+                bin_view.release()
+            view.release()
+            mapped.close()
+        except BufferError:
+            # 呼び出し側がまだビューを保持している場合はGCに解放を任せる
+            pass
 
-        # BINチャンク (optional)
-        bin_data = b""
-        remaining = length - 12 - 8 - chunk_length
-        if remaining > 8:
-            chunk_length, chunk_type = struct.unpack("<II", f.read(8))
-            if chunk_type == 0x004E4942:  # 'BIN\0'
-                bin_data = f.read(chunk_length)
 
-    return json_data, bin_data
+def read_glb(path: str) -> tuple[dict, bytes]:
+    """GLBファイルからJSONチャンクとBINチャンクを読み出す"""
+    with open_glb(path) as (json_data, bin_view):
+        return json_data, bytes(bin_view)
 
 
-def read_accessor(json_data: dict, bin_data: bytes, accessor_index: int) -> list:
-    """accessorからデータを読み出してリストで返す"""
+def _accessor_layout(json_data: dict, accessor_index: int) -> dict:
+    """accessorとbufferViewからデータ配置情報をまとめて返す"""
     accessor = json_data["accessors"][accessor_index]
     buffer_view = json_data["bufferViews"][accessor["bufferView"]]
 
-    offset = buffer_view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
-    count = accessor["count"]
-
-    fmt_char, _byte_size = COMPONENT_TYPES[accessor["componentType"]]
+    component_type = accessor["componentType"]
+    fmt_char, byte_size = COMPONENT_TYPES[component_type]
     elem_size = TYPE_SIZES[accessor["type"]]
 
-    total = count * elem_size
-    data = struct.unpack_from(f"<{total}{fmt_char}", bin_data, offset)
+    # byteStride 未指定の場合は要素がタイトに詰まっている
+    packed_stride = byte_size * elem_size
+    stride = buffer_view.get("byteStride") or packed_stride
+
+    normalized = accessor.get("normalized", False) and component_type != 5126
+
+    return {
+        "offset": buffer_view.get("byteOffset", 0) + accessor.get("byteOffset", 0),
+        "count": accessor["count"],
+        "component_type": component_type,
+        "fmt_char": fmt_char,
+        "byte_size": byte_size,
+        "elem_size": elem_size,
+        "stride": stride,
+        "packed": stride == packed_stride,
+        "normalized": normalized,
+    }
+
+
+def _normalize_component(value: int, component_type: int) -> float:
+    """normalized=true の整数値を glTF の規則に従って浮動小数に変換する"""
+    return max(value / NORMALIZE_DIVISORS[component_type], -1.0)
+
+
+def read_accessor_list(json_data: dict, bin_data: bytes, accessor_index: int) -> list:
+    """accessorからデータを読み出してPythonのリストで返す（structによる展開）"""
+    layout = _accessor_layout(json_data, accessor_index)
+    count = layout["count"]
+    elem_size = layout["elem_size"]
+    offset = layout["offset"]
+
+    if layout["packed"]:
+        total = count * elem_size
+        data = struct.unpack_from(f"<{total}{layout['fmt_char']}", bin_data, offset)
+    else:
+        element = struct.Struct(f"<{elem_size}{layout['fmt_char']}")
+        data = []
+        for i in range(count):
+            data.extend(element.unpack_from(bin_data, offset + i * layout["stride"]))
+
+    if layout["normalized"]:
+        component_type = layout["component_type"]
+        data = [_normalize_component(v, component_type) for v in data]
 
     # SCALAR → フラットリスト、それ以外 → ネストリスト
     if elem_size == 1:
@@ -82,15 +225,114 @@ def read_accessor(json_data: dict, bin_data: bytes, accessor_index: int) -> list
         return [list(data[i * elem_size : (i + 1) * elem_size]) for i in range(count)]
 
 
+def read_accessor_array(json_data: dict, bin_data: bytes, accessor_index: int):
+    """accessorを (count, elem_size) 形状のNumPy配列として返す
+
+    正規化が不要な場合はBINチャンク上のゼロコピーのビューになる。
+    """
+    layout = _accessor_layout(json_data, accessor_index)
+    dtype = np.dtype(f"<{layout['fmt_char']}")
+
+    view = np.ndarray(
+        shape=(layout["count"], layout["elem_size"]),
+        dtype=dtype,
+        buffer=bin_data,
+        offset=layout["offset"],
+        strides=(layout["stride"], layout["byte_size"]),
+    )
+
+    if layout["normalized"]:
+        divisor = NORMALIZE_DIVISORS[layout["component_type"]]
+        view = np.maximum(view / divisor, -1.0)
+
+    return view
+
+
+def read_accessor(json_data: dict, bin_data: bytes, accessor_index: int):
+    """accessorからデータを読み出す
+
+    NumPyが利用可能な場合は配列のまま返し、リストへの変換はJSON出力時まで遅延する。
+    SCALAR はフラット、それ以外は要素ごとのネスト形状になる。
+    """
+    if np is None:
+        return read_accessor_list(json_data, bin_data, accessor_index)
+
+    data = read_accessor_array(json_data, bin_data, accessor_index)
+    if data.shape[1] == 1:
+        return data[:, 0]
+    return data
+
+
+def _last_time(times) -> float:
+    """キーフレーム時刻列の末尾を返す（空の場合は0）"""
+    if len(times) == 0:
+        return 0.0
+    return float(times[-1])
+
+
+def _first_component(values):
+    """各キーフレームの先頭成分だけを取り出す"""
+    if np is not None and isinstance(values, np.ndarray):
+        return values[:, 0] if values.ndim == 2 else values
+    return [v[0] if isinstance(v, list) else v for v in values]
+
+
+def _json_default(obj):
+    """json.dumps 用: NumPy配列/スカラーをここで初めてPythonのリストに変換する"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def to_json(result: dict, indent: Optional[int] = None) -> str:
+    """parse_vrma の結果をJSON文字列に変換する"""
+    return json.dumps(result, indent=indent, ensure_ascii=False, default=_json_default)
+
+
+def read_accessor_copy(json_data: dict, bin_data, accessor_index: int):
+    """accessorを読み出し、BINチャンクから切り離した（コピーした）データで返す"""
+    data = read_accessor(json_data, bin_data, accessor_index)
+    if np is not None:
+        return np.array(data)
+    return data
+
+
 def parse_vrma(path: str) -> dict:
-    """VRMAファイルを解析してdict構造で返す"""
-    json_data, bin_data = read_glb(path)
+    """VRMAファイルを解析してdict構造で返す
+
+    GLBはmmapで開き、アニメーションが参照するアクセサだけを読み出す。
+    """
+    with open_glb(path) as (json_data, bin_data):
+        return parse_vrma_data(json_data, bin_data)
+
+
+def accessor_reader(json_data: dict, bin_data, detach: bool = True):
+    """accessor番号からデータを返す関数を作る
+
+    同じaccessorを参照するサンプラー（全ボーン共通の時刻列など）は一度だけデコードする。
+    detach=False の場合はBINチャンク上のビューのまま返す（BINの有効期間内でのみ使用可）。
+    """
+    read_one = read_accessor_copy if detach else read_accessor
+    decoded = {}
+
+    def read(accessor_index: int):
+        if accessor_index not in decoded:
+            decoded[accessor_index] = read_one(json_data, bin_data, accessor_index)
+        return decoded[accessor_index]
 
+    return read
+
+
+def _vrma_extension(json_data: dict) -> dict:
+    """VRMC_vrm_animation 拡張を取り出す"""
     ext = json_data.get("extensions", {}).get("VRMC_vrm_animation")
     if ext is None:
         raise ValueError("VRMC_vrm_animation extension not found")
+    return ext
+
 
-    # ノード番号 → (type, name) のマッピング
+def _build_node_map(ext: dict) -> dict:
+    """ノード番号 → (type, name) のマッピングを作る"""
     node_map = {}
 
     human_bones = ext.get("humanoid", {}).get("humanBones", {})
@@ -105,72 +347,62 @@ def parse_vrma(path: str) -> dict:
     if "lookAt" in ext:
         node_map[ext["lookAt"]["node"]] = ("lookAt", "lookAt")
 
-    # アニメーショントラック解析
-    bone_tracks = {}
-    expression_tracks = {}
-    look_at_track = None
+    return node_map
+
+
+def _plan_tracks(json_data: dict, ext: dict) -> tuple[dict, dict, Optional[dict]]:
+    """チャンネルを出力のトラックごとのサンプラーに振り分ける
+
+    (ボーン → パス → サンプラー, 表情名 → サンプラー, lookAt のサンプラー) を返す。
+    アクセサは読み出さない。同じトラックを複数のチャンネルが指す場合は後のものを使う。
+    """
+    node_map = _build_node_map(ext)
+    bones = {}
+    expressions = {}
+    look_at = None
 
     for animation in json_data.get("animations", []):
-        channels = animation["channels"]
         samplers = animation["samplers"]
 
-        for channel in channels:
+        for channel in animation["channels"]:
             target_node = channel["target"]["node"]
             target_path = channel["target"]["path"]
             sampler = samplers[channel["sampler"]]
 
-            times = read_accessor(json_data, bin_data, sampler["input"])
-            values = read_accessor(json_data, bin_data, sampler["output"])
-            interpolation = sampler.get("interpolation", "LINEAR")
-
             track_type, track_name = node_map.get(
                 target_node, ("unknown", f"node_{target_node}")
             )
 
-            track_data = {
-                "times": times,
-                "values": values,
-                "interpolation": interpolation,
-            }
-
             if track_type == "bone":
-                if track_name not in bone_tracks:
-                    bone_tracks[track_name] = {}
-                bone_tracks[track_name][target_path] = track_data
+                bones.setdefault(track_name, {})[target_path] = sampler
 
             elif track_type == "expression":
                 # 表情はtranslationのX成分をweightとして抽出
                 if target_path == "translation":
-                    expression_tracks[track_name] = {
-                        "times": times,
-                        "values": [v[0] if isinstance(v, list) else v for v in values],
-                        "interpolation": interpolation,
-                    }
+                    expressions[track_name] = sampler
 
             elif track_type == "lookAt":
-                look_at_track = track_data
+                look_at = sampler
+
+    return bones, expressions, look_at
+
+
+def _read_track(read, sampler: dict, weight: bool = False) -> dict:
+    """サンプラーの時刻列・値を読み出してトラックにする（weight=True は先頭成分のみ）"""
+    times = read(sampler["input"])
+    values = read(sampler["output"])
+    return {
+        "times": times,
+        "values": _first_component(values) if weight else values,
+        "interpolation": sampler.get("interpolation", "LINEAR"),
+    }
 
-    # メタ情報
-    duration = 0.0
-    for tracks in bone_tracks.values():
-        for track in tracks.values():
-            if track["times"]:
-                t = track["times"][-1]
-                if t > duration:
-                    duration = t
-    for track in expression_tracks.values():
-        if track["times"]:
-            t = track["times"][-1]
-            if t > duration:
-                duration = t
-    if look_at_track and look_at_track["times"]:
-        t = look_at_track["times"][-1]
-        if t > duration:
-            duration = t
 
+def _result_header(json_data: dict, ext: dict, bone_names, duration: float) -> dict:
+    """トラック以外のメタ情報（出力の先頭のキー）を作る"""
     # hipsの基準位置
     rest_hips_position = None
-    hips_bone = human_bones.get("hips")
+    hips_bone = ext.get("humanoid", {}).get("humanBones", {}).get("hips")
     if hips_bone is not None:
         hips_node_index = hips_bone["node"]
         nodes = json_data.get("nodes", [])
@@ -178,13 +410,43 @@ def parse_vrma(path: str) -> dict:
             node = nodes[hips_node_index]
             rest_hips_position = node.get("translation")
 
-    result = {
+    return {
         "specVersion": ext.get("specVersion", "unknown"),
         "duration": duration,
         "restHipsPosition": rest_hips_position,
-        "boneNames": sorted(bone_tracks.keys()),
-        "bones": bone_tracks,
+        "boneNames": sorted(bone_names),
+    }
+
+
+def parse_vrma_data(json_data: dict, bin_data) -> dict:
+    """GLBのJSONチャンクとBINチャンクからアニメーションデータを抽出する"""
+    ext = _vrma_extension(json_data)
+    bones, expressions, look_at = _plan_tracks(json_data, ext)
+    read = accessor_reader(json_data, bin_data)
+
+    # アニメーショントラック解析
+    bone_tracks = {
+        bone: {path: _read_track(read, sampler) for path, sampler in paths.items()}
+        for bone, paths in bones.items()
+    }
+    expression_tracks = {
+        name: _read_track(read, sampler, weight=True)
+        for name, sampler in expressions.items()
     }
+    look_at_track = _read_track(read, look_at) if look_at is not None else None
+
+    # メタ情報
+    duration = 0.0
+    for tracks in bone_tracks.values():
+        for track in tracks.values():
+            duration = max(duration, _last_time(track["times"]))
+    for track in expression_tracks.values():
+        duration = max(duration, _last_time(track["times"]))
+    if look_at_track:
+        duration = max(duration, _last_time(look_at_track["times"]))
+
+    result = _result_header(json_data, ext, bone_tracks.keys(), duration)
+    result["bones"] = bone_tracks
 
     if expression_tracks:
         result["expressions"] = expression_tracks
@@ -195,53 +457,1394 @@ def parse_vrma(path: str) -> dict:
     return result
 
 
+# --- 静止ポーズ抽出 ---
+
+POSE_FORMAT_VERSION = "1.0"
+
+# VRMAのボーン回転は VRM 1.0 の正規化ボーン空間で記述されている
+POSE_SOURCE_META_VERSION = "1"
+
+
+def _normalize_quat(q: list) -> list:
+    """クォータニオンを正規化する"""
+    norm = math.sqrt(sum(c * c for c in q))
+    return [c / norm for c in q] if norm > 0 else list(q)
+
+
+def _slerp_quat(q0: list, q1: list, u: float) -> list:
+    """2つのクォータニオンを球面線形補間する"""
+    dot = sum(a * b for a, b in zip(q0, q1))
+    if dot < 0.0:
+        # 最短経路で補間する
+        q1 = [-c for c in q1]
+        dot = -dot
+    if dot > 0.9995:
+        return _normalize_quat([a + (b - a) * u for a, b in zip(q0, q1)])
+    theta = math.acos(dot)
+    sin_theta = math.sin(theta)
+    w0 = math.sin((1.0 - u) * theta) / sin_theta
+    w1 = math.sin(u * theta) / sin_theta
+    return [w0 * a + w1 * b for a, b in zip(q0, q1)]
+
+
+def sample_track(times, values, interpolation: str, t: float, is_rotation: bool) -> list:
+    """VEC3/VEC4 のトラックを時刻 t でサンプリングする（範囲外は端のキーの値）
+
+    LINEAR の回転は slerp、STEP は直前のキー、CUBICSPLINE はエルミート補間で求める。
+    CUBICSPLINE の値は [inTangent, value, outTangent] の3要素組で並んでいる。
+    """
+    cubic = interpolation == "CUBICSPLINE"
+
+    def key(i: int, part: int = 1) -> list:
+        row = values[3 * i + part] if cubic else values[i]
+        return [float(c) for c in row]
+
+    count = len(times)
+    if t <= times[0]:
+        return key(0)
+    if t >= times[count - 1]:
+        return key(count - 1)
+
+    i = bisect.bisect_right(times, t) - 1
+    t0 = float(times[i])
+    dt = float(times[i + 1]) - t0
+    u = (t - t0) / dt if dt > 0 else 0.0
+
+    if interpolation == "STEP":
+        return key(i)
+
+    if cubic:
+        u2 = u * u
+        u3 = u2 * u
+        h00 = 2 * u3 - 3 * u2 + 1
+        h10 = u3 - 2 * u2 + u
+        h01 = -2 * u3 + 3 * u2
+        h11 = u3 - u2
+        p0, m0 = key(i), key(i, 2)
+        p1, m1 = key(i + 1), key(i + 1, 0)
+        value = [
+            h00 * a + h10 * dt * b + h01 * c + h11 * dt * d
+            for a, b, c, d in zip(p0, m0, p1, m1)
+        ]
+        return _normalize_quat(value) if is_rotation else value
+
+    if is_rotation:
+        return _slerp_quat(key(i), key(i + 1), u)
+    return [a + (b - a) * u for a, b in zip(key(i), key(i + 1))]
+
+
+def sample_poses(json_data: dict, bin_data, sample_times: list[float]) -> list[dict]:
+    """ボーン回転を各時刻でサンプリングし、public/poses 形式のポーズを時刻ごとに返す
+
+    トラック全体のdictは作らず、アクセサから直接サンプリングする。
+    """
+    ext = _vrma_extension(json_data)
+    node_map = _build_node_map(ext)
+    read = accessor_reader(json_data, bin_data, detach=False)
+
+    poses = [{} for _ in sample_times]
+    for animation in json_data.get("animations", []):
+        samplers = animation["samplers"]
+        for channel in animation["channels"]:
+            if channel["target"]["path"] != "rotation":
+                continue
+            track_type, bone_name = node_map.get(
+                channel["target"]["node"], ("unknown", None)
+            )
+            if track_type != "bone":
+                continue
+
+            sampler = samplers[channel["sampler"]]
+            times = read(sampler["input"])
+            if len(times) == 0:
+                continue
+            values = read(sampler["output"])
+            interpolation = sampler.get("interpolation", "LINEAR")
+
+            for pose, t in zip(poses, sample_times):
+                pose[bone_name] = {
+                    "rotation": sample_track(times, values, interpolation, t, True)
+                }
+
+    return [
+        {
+            "version": POSE_FORMAT_VERSION,
+            "sourceVrmMetaVersion": POSE_SOURCE_META_VERSION,
+            "pose": pose,
+        }
+        for pose in poses
+    ]
+
+
+def extract_poses(path: str, sample_times: list[float]) -> list[dict]:
+    """VRMAファイルから指定した各時刻の静止ポーズを抽出する"""
+    with open_glb(path) as (json_data, bin_data):
+        return sample_poses(json_data, bin_data, sample_times)
+
+
+# --- キーフレーム削減 ---
+
+# 回転の許容誤差（度）と、位置・表情ウェイトの許容誤差のデフォルト値
+DEFAULT_ROTATION_TOLERANCE = 0.1
+DEFAULT_POSITION_TOLERANCE = 1e-3
+
+
+def _slerp(q0, q1, u):
+    """2つのクォータニオン間を補間係数列 u で球面線形補間する"""
+    dot = float(np.dot(q0, q1))
+    if dot < 0.0:
+        # 最短経路で補間する
+        q1 = -q1
+        dot = -dot
+    if dot > 0.9995:
+        result = q0 + (q1 - q0) * u[:, None]
+        return result / np.linalg.norm(result, axis=1, keepdims=True)
+    theta = np.arccos(dot)
+    sin_theta = np.sin(theta)
+    w0 = np.sin((1.0 - u) * theta) / sin_theta
+    w1 = np.sin(u * theta) / sin_theta
+    return w0[:, None] * q0 + w1[:, None] * q1
+
+
+def _angular_errors(expected, actual):
+    """クォータニオン同士の角度差（ラジアン）を返す"""
+    dot = np.abs(np.sum(expected * actual, axis=1))
+    dot /= np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    return 2.0 * np.arccos(np.clip(dot, 0.0, 1.0))
+
+
+def _distance_errors(expected, actual):
+    """ベクトル同士のユークリッド距離を返す"""
+    return np.linalg.norm(expected - actual, axis=1)
+
+
+def _reduce_linear(times, values, is_rotation: bool, tolerance: float):
+    """LINEAR補間トラックで、前後のキーから誤差内で復元できるキーを削除する
+
+    Ramer-Douglas-Peucker法で区間内の最大誤差点を残していくため、
+    残したキー同士の補間結果はすべての元キーに対して許容誤差内に収まる。
+    """
+    n = len(times)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        span = times[j] - times[i]
+        u = (times[i + 1 : j] - times[i]) / span if span > 0 else np.zeros(j - i - 1)
+        if is_rotation:
+            reconstructed = _slerp(values[i], values[j], u)
+            errors = _angular_errors(reconstructed, values[i + 1 : j])
+        else:
+            reconstructed = values[i] + (values[j] - values[i]) * u[:, None]
+            errors = _distance_errors(reconstructed, values[i + 1 : j])
+        worst = int(np.argmax(errors))
+        if errors[worst] > tolerance:
+            k = i + 1 + worst
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+
+    return keep
+
+
+def _reduce_step(values, is_rotation: bool, tolerance: float):
+    """STEP補間トラックで、直前に残したキーと同じ値のキーを削除する"""
+    errors = _angular_errors if is_rotation else _distance_errors
+    n = len(values)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    last = 0
+    for k in range(1, n - 1):
+        if errors(values[last : last + 1], values[k : k + 1])[0] > tolerance:
+            keep[k] = True
+            last = k
+
+    return keep
+
+
+def _is_quaternion_track(track: dict) -> bool:
+    """値がクォータニオン（4成分）のトラックかを判定する
+
+    lookAt はターゲットノードの rotation とは限らない（translation などもある）ため、
+    回転として扱うかは値の形で決める。
+    """
+    values = track["values"]
+    if np is not None and isinstance(values, np.ndarray):
+        return values.ndim == 2 and values.shape[1] == 4
+    return len(values) > 0 and isinstance(values[0], list) and len(values[0]) == 4
+
+
+def reduce_track(
+    track: dict,
+    is_rotation: bool,
+    rotation_tolerance: float = DEFAULT_ROTATION_TOLERANCE,
+    position_tolerance: float = DEFAULT_POSITION_TOLERANCE,
+) -> dict:
+    """1トラックの冗長なキーフレームを削除した新しいトラックを返す
+
+    回転は slerp で復元したときの角度誤差（度）、位置・表情ウェイトは
+    線形補間で復元したときの距離で判定する。CUBICSPLINE はそのまま返す。
+    """
+    interpolation = track["interpolation"]
+    if interpolation == "CUBICSPLINE" or len(track["times"]) < 3:
+        return track
+
+    times = np.asarray(track["times"], dtype=np.float64)
+    values = np.asarray(track["values"], dtype=np.float64)
+    flat = values.ndim == 1
+    if flat:
+        values = values[:, None]
+
+    if is_rotation:
+        tolerance = np.radians(rotation_tolerance)
+    else:
+        tolerance = position_tolerance
+
+    if interpolation == "STEP":
+        keep = _reduce_step(values, is_rotation, tolerance)
+    else:
+        keep = _reduce_linear(times, values, is_rotation, tolerance)
+
+    reduced = dict(track)
+    reduced["times"] = np.asarray(track["times"])[keep]
+    reduced["values"] = np.asarray(track["values"])[keep]
+    return reduced
+
+
+def reduce_keyframes(
+    result: dict,
+    rotation_tolerance: float = DEFAULT_ROTATION_TOLERANCE,
+    position_tolerance: float = DEFAULT_POSITION_TOLERANCE,
+) -> dict:
+    """parse_vrma の結果の全トラックにキーフレーム削減を適用する
+
+    削減前後のキーフレーム総数を {"before": n, "after": m} で返す。
+    """
+    if np is None:
+        raise RuntimeError("Keyframe reduction requires NumPy")
+
+    stats = {"before": 0, "after": 0}
+
+    def reduce(track: dict, is_rotation: bool) -> dict:
+        reduced = reduce_track(
+            track, is_rotation, rotation_tolerance, position_tolerance
+        )
+        stats["before"] += len(track["times"])
+        stats["after"] += len(reduced["times"])
+        return reduced
+
+    for tracks in result["bones"].values():
+        for path, track in tracks.items():
+            tracks[path] = reduce(track, path == "rotation")
+    for name, track in result.get("expressions", {}).items():
+        result["expressions"][name] = reduce(track, False)
+    if "lookAt" in result:
+        look_at = result["lookAt"]
+        result["lookAt"] = reduce(look_at, _is_quaternion_track(look_at))
+
+    return stats
+
+
+def _timeline_key(times):
+    """時刻列の内容を比較するためのキーを返す"""
+    if np is not None and isinstance(times, np.ndarray):
+        return times.dtype.str, times.tobytes()
+    return tuple(times)
+
+
+def _share_track(track: dict, timelines: list, indices: dict) -> dict:
+    """トラックの時刻列を timelines に登録し、"times" を "timeline"（番号）に置き換える"""
+    key = _timeline_key(track["times"])
+    if key not in indices:
+        indices[key] = len(timelines)
+        timelines.append(track["times"])
+    return {
+        ("timeline" if name == "times" else name): (
+            indices[key] if name == "times" else value
+        )
+        for name, value in track.items()
+    }
+
+
+def share_timelines(result: dict) -> dict:
+    """同じ内容の時刻列を top-level の timelines にまとめ、トラックからは番号で参照する
+
+    各トラックの "times" は "timeline"（timelines のインデックス）に置き換わる。
+    """
+    timelines = []
+    indices = {}
+
+    def replace(track: dict) -> dict:
+        return _share_track(track, timelines, indices)
+
+    for tracks in result["bones"].values():
+        for path, track in tracks.items():
+            tracks[path] = replace(track)
+    for name, track in result.get("expressions", {}).items():
+        result["expressions"][name] = replace(track)
+    if "lookAt" in result:
+        result["lookAt"] = replace(result["lookAt"])
+
+    result["timelines"] = timelines
+    return result
+
+
+# --- 出力形式 ---
+
+OUTPUT_FORMATS = ("json", "ndjson", "bin")
+
+# --precision 未指定時に --compare-formats で比較する小数桁数
+DEFAULT_COMPARE_PRECISION = 5
+
+
+def map_track_arrays(result: dict, fn) -> dict:
+    """全トラックの時刻列・値配列に fn(array, kind) を適用した新しい結果を返す
+
+    kind は "times" / "rotation" / "vector" / "weight" のいずれか。
+    複数トラックで共有されている配列には一度だけ fn を適用する。
+    """
+    converted = {}
+
+    def convert_array(array, kind: str):
+        key = id(array)
+        if key not in converted:
+            # id を安定させるため元の配列も保持しておく
+            converted[key] = (array, fn(array, kind))
+        return converted[key][1]
+
+    def convert_track(track: dict, kind: str) -> dict:
+        return {
+            name: (
+                convert_array(value, "times" if name == "times" else kind)
+                if name in ("times", "values")
+                else value
+            )
+            for name, value in track.items()
+        }
+
+    mapped = dict(result)
+    mapped["bones"] = {
+        bone: {
+            path: convert_track(track, "rotation" if path == "rotation" else "vector")
+            for path, track in tracks.items()
+        }
+        for bone, tracks in result["bones"].items()
+    }
+    if "expressions" in result:
+        mapped["expressions"] = {
+            name: convert_track(track, "weight")
+            for name, track in result["expressions"].items()
+        }
+    if "lookAt" in result:
+        look_at = result["lookAt"]
+        kind = "rotation" if _is_quaternion_track(look_at) else "vector"
+        mapped["lookAt"] = convert_track(look_at, kind)
+    if "timelines" in result:
+        mapped["timelines"] = [
+            convert_array(times, "times") for times in result["timelines"]
+        ]
+    return mapped
+
+
+def _round_values(values, digits: int):
+    """配列の各要素を指定した小数桁数に丸める"""
+    if np is not None and isinstance(values, np.ndarray):
+        # float32 のまま丸めると出力時に桁が戻るため float64 で丸める
+        return np.round(values.astype(np.float64), digits)
+    return [
+        _round_values(v, digits) if isinstance(v, list) else round(v, digits)
+        for v in values
+    ]
+
+
+def round_arrays(result: dict, digits: int) -> dict:
+    """全トラックの数値を指定した小数桁数に丸めた結果を返す"""
+    return map_track_arrays(result, lambda values, _kind: _round_values(values, digits))
+
+
+def to_binary(result: dict, quantize: bool, buffer_uri: str) -> tuple[dict, bytes]:
+    """全トラックの配列をバイナリバッファにパックし、JSONインデックスとバッファを返す
+
+    インデックス側の配列は {"offset", "count", "size", "component"} の参照に置き換わる。
+    component は "f32"（Float32）または "i16"（[-1, 1] を Int16 に量子化）。
+    quantize=True の場合は回転（クォータニオン）と表情ウェイトを Int16 にする。
+    """
+    chunks = []
+    length = 0
+
+    def pack(values, kind: str) -> dict:
+        nonlocal length
+        array = np.asarray(values, dtype=np.float64)
+        size = 1 if array.ndim == 1 else array.shape[1]
+
+        if quantize and kind in ("rotation", "weight"):
+            data = np.round(np.clip(array, -1.0, 1.0) * 32767.0).astype("<i2")
+            component = "i16"
+        else:
+            data = array.astype("<f4")
+            component = "f32"
+
+        raw = data.tobytes()
+        ref = {
+            "offset": length,
+            "count": len(array),
+            "size": size,
+            "component": component,
+        }
+        # 各配列の先頭を4バイト境界に揃える
+        padding = -len(raw) % 4
+        chunks.append(raw + b"\0" * padding)
+        length += len(raw) + padding
+        return ref
+
+    index = map_track_arrays(result, pack)
+    index["buffer"] = {"uri": buffer_uri, "byteLength": length}
+    return index, b"".join(chunks)
+
+
+def _stream_encoder() -> tuple:
+    """ストリーム出力用の (エンコード関数, 要素区切り, キー区切り) を返す
+
+    orjson が利用可能な場合はそちらでトラック単位にエンコードする。
+    """
+    if orjson is not None:
+
+        def encode(obj) -> bytes:
+            return orjson.dumps(
+                obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY
+            )
+
+        return encode, b",", b":"
+
+    def encode(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, default=_json_default).encode(
+            "utf-8"
+        )
+
+    return encode, b", ", b": "
+
+
+def _write_object(fp, mapping: dict, encode, item_sep: bytes, key_sep: bytes, depth: int):
+    """dictをJSONオブジェクトとして書き出す（depth 階層までは値ごとに分けて書く）"""
+    fp.write(b"{")
+    for i, (key, value) in enumerate(mapping.items()):
+        if i:
+            fp.write(item_sep)
+        fp.write(encode(key) + key_sep)
+        if depth > 0 and isinstance(value, dict):
+            _write_object(fp, value, encode, item_sep, key_sep, depth - 1)
+        else:
+            fp.write(encode(_evaluate(value)))
+    fp.write(b"}")
+
+
+def _evaluate(value):
+    """遅延評価のトラック（引数なしの関数）なら評価した値を返す"""
+    return value() if callable(value) else value
+
+
+def write_json_stream(result: dict, fp) -> None:
+    """変換結果をトラック単位でエンコードしながらJSONとして fp に書き出す
+
+    出力全体の文字列を作らない。トラックが関数（stream_vrma の遅延評価）の場合は
+    書き出す直前に呼び出すため、デコード済みのデータも1トラック分しか残らない。
+    """
+    encode, item_sep, key_sep = _stream_encoder()
+    # bones は ボーン → パス → トラック、expressions は 名前 → トラック
+    depths = {"bones": 1, "expressions": 0}
+
+    fp.write(b"{")
+    for i, (key, value) in enumerate(result.items()):
+        if i:
+            fp.write(item_sep)
+        fp.write(encode(key) + key_sep)
+        if key in depths:
+            _write_object(fp, value, encode, item_sep, key_sep, depths[key])
+        else:
+            fp.write(encode(_evaluate(value)))
+    fp.write(b"}")
+
+
+def write_ndjson(result: dict, fp) -> None:
+    """変換結果を1行1トラックのNDJSONとして fp に書き出す
+
+    先頭行はトラック以外のメタ情報（type: "header"）になる。
+    """
+    encode, _item_sep, _key_sep = _stream_encoder()
+
+    header = {"type": "header"}
+    header.update(
+        (key, _evaluate(value))
+        for key, value in result.items()
+        if key not in ("bones", "expressions", "lookAt")
+    )
+    fp.write(encode(header) + b"\n")
+
+    for bone, tracks in result["bones"].items():
+        for path, track in tracks.items():
+            record = {"type": "bone", "bone": bone, "path": path}
+            record.update(_evaluate(track))
+            fp.write(encode(record) + b"\n")
+    for name, track in result.get("expressions", {}).items():
+        record = {"type": "expression", "name": name}
+        record.update(_evaluate(track))
+        fp.write(encode(record) + b"\n")
+    if "lookAt" in result:
+        record = {"type": "lookAt"}
+        record.update(_evaluate(result["lookAt"]))
+        fp.write(encode(record) + b"\n")
+
+
+def is_streaming(options: dict) -> bool:
+    """変換オプションがストリーム出力になるかどうか"""
+    return options["format"] == "ndjson" or (
+        options["format"] == "json" and options["stream"]
+    )
+
+
+def _accessor_end_time(json_data: dict, bin_data, accessor_index: int) -> float:
+    """時刻accessorの末尾の値を、accessor全体をデコードせずに返す（空の場合は0）"""
+    layout = _accessor_layout(json_data, accessor_index)
+    if layout["count"] == 0:
+        return 0.0
+    offset = layout["offset"] + (layout["count"] - 1) * layout["stride"]
+    (value,) = struct.unpack_from(f"<{layout['fmt_char']}", bin_data, offset)
+    if layout["normalized"]:
+        value = _normalize_component(value, layout["component_type"])
+    return float(value)
+
+
+def _lazy_result(json_data: dict, bin_data, options: dict) -> dict:
+    """トラックを関数（書き出す直前に評価する）で表した変換結果を作る
+
+    各関数は呼び出されるたびにBINチャンクから1トラックを読み出し、キーフレーム削減・
+    時刻列の共有・丸めを適用して返す。メタ情報はアクセサを読まずに求める。
+    --shared-timelines の場合は、異なる時刻列だけを timelines として最後まで保持する。
+    BINチャンクの有効期間内でのみ使用できる。
+    """
+    ext = _vrma_extension(json_data)
+    bones, expressions, look_at = _plan_tracks(json_data, ext)
+    samplers = [sampler for paths in bones.values() for sampler in paths.values()]
+    samplers.extend(expressions.values())
+    if look_at is not None:
+        samplers.append(look_at)
+    duration = max(
+        [0.0]
+        + [_accessor_end_time(json_data, bin_data, s["input"]) for s in samplers]
+    )
+
+    if np is not None:
+        # BINチャンク上のビューはコピーを伴わないため、共有の時刻列もキャッシュして一度だけ解釈する
+        view = accessor_reader(json_data, bin_data, detach=False)
+
+        def read(accessor_index: int):
+            # byteStride 付きのビューはトラック単位でコピーする（エンコード結果を揃える）
+            return np.ascontiguousarray(view(accessor_index))
+
+    else:
+        # struct でデコードしたリストはキャッシュすると全トラック分残るため、毎回読み出す
+        def read(accessor_index: int):
+            return read_accessor(json_data, bin_data, accessor_index)
+
+    digits = options["precision"]
+    timelines = []
+    indices = {}
+    # 未評価のトラック（評価順が timelines の番号になるため順序を保つ）
+    pending = {}
+
+    def load(sampler: dict, kind: str):
+        def track() -> dict:
+            pending.pop(track, None)
+            data = _read_track(read, sampler, weight=kind == "weight")
+            if options["reduce"]:
+                is_rotation = kind == "rotation" or (
+                    kind == "lookAt" and _is_quaternion_track(data)
+                )
+                data = reduce_track(
+                    data,
+                    is_rotation,
+                    options["rotationTolerance"],
+                    options["positionTolerance"],
+                )
+            if options["sharedTimelines"]:
+                data = _share_track(data, timelines, indices)
+            if digits is not None:
+                data = {
+                    name: (
+                        _round_values(value, digits)
+                        if name in ("times", "values")
+                        else value
+                    )
+                    for name, value in data.items()
+                }
+            return data
+
+        pending[track] = None
+        return track
+
+    def shared_timelines() -> list:
+        # ndjson ではヘッダーが先に書かれるため、未評価のトラックを評価して時刻列を集める
+        for track in list(pending):
+            track()
+        if digits is None:
+            return timelines
+        return [_round_values(times, digits) for times in timelines]
+
+    result = _result_header(json_data, ext, bones.keys(), duration)
+    result["bones"] = {
+        bone: {
+            path: load(sampler, "rotation" if path == "rotation" else "vector")
+            for path, sampler in paths.items()
+        }
+        for bone, paths in bones.items()
+    }
+    if expressions:
+        result["expressions"] = {
+            name: load(sampler, "weight") for name, sampler in expressions.items()
+        }
+    if look_at is not None:
+        result["lookAt"] = load(look_at, "lookAt")
+    if options["sharedTimelines"]:
+        result["timelines"] = shared_timelines
+    return result
+
+
+def stream_vrma(path: str, options: dict, fp) -> None:
+    """VRMAファイルを json（--stream）/ ndjson 形式で fp に逐次書き出す
+
+    全トラックを先にデコードせず、GLBを開いたまま1トラックずつ読み出し・削減・丸め・
+    エンコードして書き出すため、ピークメモリは最大のトラック程度になる。
+    """
+    with open_glb(path) as (json_data, bin_data):
+        result = _lazy_result(json_data, bin_data, options)
+        if options["format"] == "ndjson":
+            write_ndjson(result, fp)
+        else:
+            write_json_stream(result, fp)
+        del result
+
+
+def write_stream(result: dict, options: dict, fp) -> None:
+    """解析済みの変換結果を json（--stream）/ ndjson 形式で fp に逐次書き出す"""
+    if options["precision"] is not None:
+        result = round_arrays(result, options["precision"])
+    if options["format"] == "ndjson":
+        write_ndjson(result, fp)
+    else:
+        write_json_stream(result, fp)
+
+
+def output_suffixes(options: dict) -> list[str]:
+    """変換オプションに対応する出力ファイルのサフィックス一覧を返す（先頭が主出力）"""
+    if options["poseAt"]:
+        if len(options["poseAt"]) == 1:
+            return [".json"]
+        return [f"_{i}.json" for i in range(1, len(options["poseAt"]) + 1)]
+    if options["format"] == "bin":
+        return [".json", ".bin"]
+    if options["format"] == "ndjson":
+        return [".ndjson"]
+    return [".json"]
+
+
+def output_file(output_path: Path, suffix: str, options: dict) -> Path:
+    """主出力のパスから、指定したサフィックスの出力ファイルのパスを作る"""
+    primary = output_suffixes(options)[0]
+    name = output_path.name
+    stem = name[: -len(primary)] if name.endswith(primary) else output_path.stem
+    return output_path.with_name(stem + suffix)
+
+
+def encode_outputs(result: dict, options: dict, stem: str) -> dict[str, bytes]:
+    """変換結果を出力形式に従ってエンコードし、拡張子ごとの内容を返す"""
+    if is_streaming(options):
+        buffer = io.BytesIO()
+        write_stream(result, options, buffer)
+        return {output_suffixes(options)[0]: buffer.getvalue()}
+
+    if options["precision"] is not None:
+        result = round_arrays(result, options["precision"])
+
+    if options["format"] == "bin":
+        index, buffer = to_binary(result, options["quantize"], f"{stem}.bin")
+        return {
+            ".json": to_json(index, indent=options["indent"]).encode("utf-8"),
+            ".bin": buffer,
+        }
+
+    return {".json": to_json(result, indent=options["indent"]).encode("utf-8")}
+
+
+def write_outputs(result: dict, options: dict, output_path: Path) -> list[tuple[Path, int]]:
+    """変換結果をファイルに書き出し、(パス, サイズ) の一覧を返す
+
+    サイドカーは主出力の拡張子を置き換えたパスに書き出す。
+    """
+    stem = output_file(output_path, "", options).name
+    written = []
+    for suffix, data in encode_outputs(result, options, stem).items():
+        target = output_file(output_path, suffix, options)
+        target.write_bytes(data)
+        written.append((target, len(data)))
+    return written
+
+
+def write_poses(poses: list[dict], options: dict, output_path: Path) -> list[tuple[Path, int]]:
+    """抽出したポーズを1ポーズ1ファイルで書き出し、(パス, サイズ) の一覧を返す"""
+    written = []
+    for suffix, pose in zip(output_suffixes(options), poses):
+        target = output_file(output_path, suffix, options)
+        data = to_json(pose, indent=options["indent"]).encode("utf-8")
+        target.write_bytes(data)
+        written.append((target, len(data)))
+    return written
+
+
+def convert_file(input_path: str, options: dict, output_path: Path) -> list[tuple[Path, int]]:
+    """VRMAファイルを変換オプションに従って変換し、出力ファイルに書き出す"""
+    if options["poseAt"]:
+        return write_poses(extract_poses(input_path, options["poseAt"]), options, output_path)
+    if is_streaming(options):
+        # 解析結果全体を作らず、ファイルへ直接書き出す
+        with open(output_path, "wb") as f:
+            stream_vrma(input_path, options, f)
+        return [(output_path, output_path.stat().st_size)]
+    result, _stats = build_result(input_path, options)
+    return write_outputs(result, options, output_path)
+
+
+def compare_formats(result: dict, options: dict, stem: str) -> list[dict]:
+    """同じ変換結果を各出力形式でエンコードし、サイズとエンコード時間を返す"""
+    precision = options["precision"]
+    if precision is None:
+        precision = DEFAULT_COMPARE_PRECISION
+
+    variants = [
+        ("json", {"format": "json", "precision": None, "stream": False}),
+        (
+            f"json (precision={precision})",
+            {"format": "json", "precision": precision, "stream": False},
+        ),
+        ("ndjson", {"format": "ndjson", "precision": None}),
+        ("bin (float32)", {"format": "bin", "precision": None, "quantize": False}),
+        ("bin (int16)", {"format": "bin", "precision": None, "quantize": True}),
+    ]
+
+    rows = []
+    for name, overrides in variants:
+        start = time.perf_counter()
+        outputs = encode_outputs(result, dict(options, **overrides), stem)
+        seconds = time.perf_counter() - start
+        rows.append(
+            {
+                "format": name,
+                "size": sum(len(data) for data in outputs.values()),
+                "seconds": seconds,
+            }
+        )
+    return rows
+
+
+# --- バッチ変換 ---
+
+# 出力形式を変更した場合はキャッシュを無効化するために更新する
+CONVERTER_VERSION = "1"
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / ".vrma_cache"
+
+GLOB_CHARS = set("*?[")
+
+
+def conversion_options(args: argparse.Namespace) -> dict:
+    """出力内容に影響する変換オプションをまとめる（キャッシュキーにも使用する）"""
+    return {
+        "converterVersion": CONVERTER_VERSION,
+        "indent": 2 if args.pretty else None,
+        "sharedTimelines": args.shared_timelines,
+        "reduce": args.reduce,
+        "rotationTolerance": args.rotation_tolerance,
+        "positionTolerance": args.position_tolerance,
+        "format": args.format,
+        "precision": args.precision,
+        "quantize": args.quantize,
+        "stream": args.stream,
+        "poseAt": args.pose_at,
+    }
+
+
+def build_result(path: str, options: dict) -> tuple[dict, Optional[dict]]:
+    """VRMAファイルを解析し、変換オプションに応じた後処理を適用する
+
+    キーフレーム削減を行った場合はその統計も返す。
+    """
+    result = parse_vrma(path)
+
+    stats = None
+    if options["reduce"]:
+        stats = reduce_keyframes(
+            result, options["rotationTolerance"], options["positionTolerance"]
+        )
+    if options["sharedTimelines"]:
+        share_timelines(result)
+
+    return result, stats
+
+
+def cache_key(path: Path, options: dict, stem: str) -> str:
+    """入力ファイルの内容・変換オプション・出力名からキャッシュキー（SHA-256）を作る
+
+    バイナリ形式ではJSONインデックスにサイドカーのファイル名が入るため出力名も含める。
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    digest.update(stem.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def collect_inputs(patterns: list[str]) -> list[Path]:
+    """ファイル・ディレクトリ・globパターンから入力VRMAファイルの一覧を作る"""
+    inputs = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            inputs.extend(sorted(path.rglob("*.vrma")))
+        elif GLOB_CHARS & set(pattern):
+            inputs.extend(
+                sorted(Path(p) for p in glob.glob(pattern, recursive=True))
+            )
+        elif path.exists():
+            inputs.append(path)
+        else:
+            raise FileNotFoundError(pattern)
+
+    # 重複を除きつつ順序を保つ
+    unique = {}
+    for path in inputs:
+        if path.is_file():
+            unique.setdefault(path.resolve(), path)
+    return list(unique.values())
+
+
+def _convert_job(input_path: str, output_path: str, options: dict) -> dict:
+    """ワーカープロセスで1ファイルを変換して書き出す"""
+    start = time.perf_counter()
+    written = convert_file(input_path, options, Path(output_path))
+    return {
+        "seconds": time.perf_counter() - start,
+        "outputSize": sum(size for _path, size in written),
+    }
+
+
+def run_batch(
+    inputs: list[Path],
+    out_dir: Optional[Path],
+    options: dict,
+    jobs: Optional[int] = None,
+    cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+) -> list[dict]:
+    """複数のVRMAファイルを並列に変換し、ファイルごとの結果を返す
+
+    入力内容と変換オプションが同じファイルはキャッシュから復元し、
+    出力が既に同じ内容であれば書き込み自体をスキップする。
+    """
+    outputs = {}
+    for input_path in inputs:
+        output_path = (out_dir or input_path.parent) / (
+            input_path.stem + output_suffixes(options)[0]
+        )
+        if output_path in outputs.values():
+            raise ValueError(f"Duplicate output path: {output_path}")
+        outputs[input_path] = output_path
+
+    if out_dir:
+        out_dir.mkdir(parents=True, exist_ok=True)
+    if cache_dir:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+    records = {}
+    pending = {}
+    for input_path, output_path in outputs.items():
+        record = {
+            "input": str(input_path),
+            "output": str(output_path),
+            "inputSize": input_path.stat().st_size,
+        }
+        records[input_path] = record
+
+        start = time.perf_counter()
+        key = cache_key(input_path, options, output_path.stem)
+        record["key"] = key
+        cached = (
+            {suffix: cache_dir / f"{key}{suffix}" for suffix in output_suffixes(options)}
+            if cache_dir
+            else None
+        )
+
+        if cached and all(path.exists() for path in cached.values()):
+            record["status"] = "skipped"
+            record["outputSize"] = 0
+            for suffix, cached_path in cached.items():
+                data = cached_path.read_bytes()
+                target = output_file(output_path, suffix, options)
+                if not (target.exists() and target.read_bytes() == data):
+                    target.write_bytes(data)
+                    record["status"] = "cached"
+                record["outputSize"] += len(data)
+            record["seconds"] = time.perf_counter() - start
+        else:
+            pending[input_path] = cached
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(
+                    _convert_job, str(input_path), str(outputs[input_path]), options
+                ): input_path
+                for input_path in pending
+            }
+            for future in as_completed(futures):
+                input_path = futures[future]
+                record = records[input_path]
+                try:
+                    record.update(future.result())
+                    record["status"] = "converted"
+                except Exception as e:
+                    record["status"] = "error"
+                    record["error"] = str(e)
+                    continue
+
+                cached = pending[input_path]
+                if cached:
+                    for suffix, cached_path in cached.items():
+                        shutil.copyfile(
+                            output_file(outputs[input_path], suffix, options),
+                            cached_path,
+                        )
+
+    return [records[input_path] for input_path in inputs]
+
+
+# --- ポーズインデックス ---
+
+POSE_INDEX_VERSION = 1
+
+DEFAULT_INDEX_URL_PREFIX = "/poses/"
+
+
+def _describe_pose_file(data: dict) -> tuple[list[str], float]:
+    """出力JSONからボーン一覧と再生時間を取り出す"""
+    if "pose" in data:
+        return sorted(data["pose"].keys()), 0.0
+    return list(data.get("boneNames", [])), float(data.get("duration", 0.0))
+
+
+def json_output_files(records: list[dict], options: dict) -> list[Path]:
+    """変換に成功した出力のうち、ポーズとして読み込めるJSONファイルの一覧を返す"""
+    files = []
+    for record in records:
+        if record["status"] == "error":
+            continue
+        for suffix in output_suffixes(options):
+            if suffix.endswith(".json"):
+                files.append(output_file(Path(record["output"]), suffix, options))
+    return files
+
+
+def _is_pose_file(data: dict) -> bool:
+    """/api/get-pose-list と同じ条件でポーズとして読み込めるJSONかを判定する"""
+    return bool(
+        (data.get("specVersion") and data.get("bones"))
+        or (data.get("version") and data.get("pose"))
+    )
+
+
+def _pose_file_digest(
+    path: Path, data: bytes, buffer_uri: Optional[str]
+) -> Optional[tuple[str, int]]:
+    """ポーズファイルの内容ハッシュとサイズを返す
+
+    --format bin のヘッダーはキーフレームを .bin サイドカーに持つため、サイドカーの内容も
+    ハッシュとサイズに含める（サイドカーだけが変わった場合もハッシュが変わるように）。
+    サイドカーが無い場合は None を返す。
+    """
+    digest = hashlib.sha256(data)
+    size = len(data)
+    if buffer_uri:
+        buffer_path = path.parent / Path(buffer_uri).name
+        if not buffer_path.is_file():
+            return None
+        buffer = buffer_path.read_bytes()
+        digest.update(buffer)
+        size += len(buffer)
+    return digest.hexdigest(), size
+
+
+def check_pose_index_dir(index_path: Path, output_dirs) -> None:
+    """ポーズインデックスが出力先ディレクトリに置かれているかを確認する
+
+    エントリのURLパスはファイル名から作るため、インデックスと出力先が異なると
+    実在しないパスを指してしまう。異なる場合は ValueError を送出する。
+    """
+    index_dir = index_path.resolve().parent
+    outside = sorted({str(d) for d in output_dirs if Path(d).resolve() != index_dir})
+    if outside:
+        raise ValueError(
+            f"--pose-index must be in the output directory ({', '.join(outside)})"
+        )
+
+
+def update_pose_index(
+    index_path: Path, files: list[Path], url_prefix: str = DEFAULT_INDEX_URL_PREFIX
+) -> bool:
+    """ポーズインデックスを差分更新する
+
+    インデックスはポーズファイルと同じディレクトリに置く。今回出力したファイルに加えて
+    同じディレクトリの既存ポーズも対象にし、エントリには名前・URLパス・サイズ・
+    内容ハッシュ・ボーン一覧・再生時間を記録する（bin 形式はサイドカー名も記録し、
+    サイズと内容ハッシュはヘッダーとサイドカーを合わせたもの）。内容ハッシュが変わっていない
+    ファイルは再解析せず、ファイルが無くなったエントリは削除する。
+    内容が変わった場合のみ書き込み、True を返す。内容が同じ場合も更新時刻は進める
+    （get-pose-list はインデックスより新しいポーズがあると走査に切り替えるため）。
+    """
+    check_pose_index_dir(index_path, [path.parent for path in files])
+    index = {}
+    if index_path.exists():
+        try:
+            index = json.loads(index_path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            print(f"Warning: Rebuilding invalid pose index: {index_path}", file=sys.stderr)
+    previous = {entry["name"]: entry for entry in index.get("poses", [])}
+
+    candidates = {path.resolve(): path for path in files}
+    if index_path.parent.is_dir():
+        for path in index_path.parent.glob("*.json"):
+            if path.resolve() != index_path.resolve():
+                candidates.setdefault(path.resolve(), path)
+
+    entries = []
+    for path in candidates.values():
+        data = path.read_bytes()
+        entry = previous.get(path.stem)
+        if entry and _pose_file_digest(path, data, entry.get("buffer")) == (
+            entry.get("hash"),
+            entry.get("size"),
+        ):
+            entries.append(entry)
+            continue
+        try:
+            pose = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(pose, dict) or not _is_pose_file(pose):
+            continue
+        buffer_uri = (pose.get("buffer") or {}).get("uri")
+        described = _pose_file_digest(path, data, buffer_uri)
+        if described is None:
+            print(f"Warning: Missing buffer for pose index: {path}", file=sys.stderr)
+            continue
+        digest, size = described
+        bones, duration = _describe_pose_file(pose)
+        entries.append(
+            {
+                "name": path.stem,
+                "path": url_prefix + path.name,
+                "size": size,
+                "hash": digest,
+                **({"buffer": Path(buffer_uri).name} if buffer_uri else {}),
+                "bones": bones,
+                "duration": duration,
+            }
+        )
+
+    entries.sort(key=lambda entry: entry["name"])
+    text = json.dumps(
+        {"version": POSE_INDEX_VERSION, "poses": entries}, indent=2, ensure_ascii=False
+    ) + "\n"
+    if index_path.exists() and index_path.read_text(encoding="utf-8") == text:
+        # 同じ内容で書き直されたポーズがあってもインデックスが最新であることを示す
+        os.utime(index_path)
+        return False
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    index_path.write_text(text, encoding="utf-8")
+    return True
+
+
+def print_batch_summary(records: list[dict]) -> None:
+    """バッチ変換のファイルごとの所要時間とサイズを表示する"""
+    print(
+        f"{'status':<10} {'time [ms]':>10} {'input':>10} {'output':>10}  file",
+        file=sys.stderr,
+    )
+    for record in records:
+        print(
+            f"{record['status']:<10} {record.get('seconds', 0) * 1000:>10.1f} "
+            f"{record['inputSize']:>10} {record.get('outputSize', 0):>10}  "
+            f"{record['output']}",
+            file=sys.stderr,
+        )
+        if "error" in record:
+            print(f"  Error: {record['error']}", file=sys.stderr)
+
+    counts = {}
+    for record in records:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    total_seconds = sum(record.get("seconds", 0) for record in records)
+    total_size = sum(record.get("outputSize", 0) for record in records)
+    summary = ", ".join(f"{status}: {n}" for status, n in sorted(counts.items()))
+    print(
+        f"Total: {len(records)} files ({summary}), "
+        f"{total_seconds:.2f}s CPU, {total_size} bytes",
+        file=sys.stderr,
+    )
+
+
+def print_info(result: dict, reduce_stats: Optional[dict] = None) -> None:
+    """parse_vrma の結果のサマリー情報を表示する"""
+    print(f"Spec Version: {result['specVersion']}")
+    print(f"Duration: {result['duration']:.3f}s")
+    print(f"Rest Hips Position: {result['restHipsPosition']}")
+    print(f"Bones ({len(result['boneNames'])}):")
+    for name in result["boneNames"]:
+        tracks = result["bones"][name]
+        paths = list(tracks.keys())
+        keyframes = max(len(t["times"]) for t in tracks.values())
+        print(f"  {name}: {', '.join(paths)} ({keyframes} keyframes)")
+    if "expressions" in result:
+        print(f"Expressions ({len(result['expressions'])}):")
+        for name in result["expressions"]:
+            print(f"  {name}")
+    if "lookAt" in result:
+        print("LookAt: yes")
+    if reduce_stats is not None:
+        before = reduce_stats["before"]
+        after = reduce_stats["after"]
+        ratio = 1.0 - after / before if before else 0.0
+        print(f"Keyframe Reduction: {before} -> {after} ({ratio:.1%} removed)")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="VRMAファイルからボーン情報を抽出してJSONに変換する"
     )
-    parser.add_argument("input", help="入力VRMAファイルのパス")
+    parser.add_argument(
+        "input",
+        nargs="+",
+        help="入力VRMAファイルのパス（ディレクトリやglobパターンを指定するとバッチ変換）",
+    )
     parser.add_argument("-o", "--output", help="出力JSONファイルのパス（省略時は標準出力）")
+    parser.add_argument(
+        "--out-dir",
+        help="バッチ変換時の出力ディレクトリ（省略時は入力ファイルと同じディレクトリ）",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="バッチ変換の並列プロセス数（省略時はCPU数）"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help="バッチ変換のキャッシュディレクトリ",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="バッチ変換でキャッシュを使用しない"
+    )
     parser.add_argument(
         "--pretty", action="store_true", help="JSONを整形して出力する"
     )
     parser.add_argument(
         "--info", action="store_true", help="サマリー情報のみ表示する"
     )
+    parser.add_argument(
+        "--shared-timelines",
+        action="store_true",
+        help="共通の時刻列を timelines にまとめ、トラックからはインデックスで参照する",
+    )
+    parser.add_argument(
+        "--reduce",
+        action="store_true",
+        help="補間で復元できる冗長なキーフレームを削除する（NumPyが必要）",
+    )
+    parser.add_argument(
+        "--rotation-tolerance",
+        type=float,
+        default=DEFAULT_ROTATION_TOLERANCE,
+        help="キーフレーム削減時の回転の許容誤差（度）",
+    )
+    parser.add_argument(
+        "--position-tolerance",
+        type=float,
+        default=DEFAULT_POSITION_TOLERANCE,
+        help="キーフレーム削減時の位置・表情ウェイトの許容誤差",
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="json",
+        help="出力形式（bin は JSONインデックス + .bin サイドカー、NumPyが必要）",
+    )
+    parser.add_argument(
+        "--precision", type=int, help="出力する数値を指定した小数桁数に丸める"
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="bin形式で回転と表情ウェイトを Int16 に量子化する",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="JSONをトラック単位で逐次書き出す（orjsonが利用可能なら使用する）",
+    )
+    parser.add_argument(
+        "--pose-at",
+        type=float,
+        nargs="+",
+        metavar="SECONDS",
+        help="指定した時刻（秒）のボーン回転を public/poses 形式の静止ポーズとして出力する",
+    )
+    parser.add_argument(
+        "--pose-index",
+        help="変換したJSONの情報でポーズインデックスを更新する（例: public/poses/index.json）",
+    )
+    parser.add_argument(
+        "--index-url-prefix",
+        default=DEFAULT_INDEX_URL_PREFIX,
+        help="ポーズインデックスに記録するURLパスの接頭辞",
+    )
+    parser.add_argument(
+        "--compare-formats",
+        action="store_true",
+        help="各出力形式のサイズとエンコード時間を比較表示する",
+    )
 
     args = parser.parse_args()
 
-    if not Path(args.input).exists():
-        print(f"Error: File not found: {args.input}", file=sys.stderr)
+    try:
+        inputs = collect_inputs(args.input)
+    except FileNotFoundError as e:
+        print(f"Error: File not found: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.reduce and np is None:
+        print("Error: --reduce requires NumPy", file=sys.stderr)
+        sys.exit(1)
+    if (args.format == "bin" or args.compare_formats) and np is None:
+        print("Error: binary output requires NumPy", file=sys.stderr)
+        sys.exit(1)
+
+    if args.stream and args.pretty:
+        print("Error: --stream cannot be used with --pretty", file=sys.stderr)
+        sys.exit(1)
+
+    if args.stream and args.format == "bin":
+        print("Error: --stream cannot be used with --format bin", file=sys.stderr)
         sys.exit(1)
 
-    result = parse_vrma(args.input)
+    batch = (
+        args.out_dir is not None
+        or len(args.input) > 1
+        or any(Path(p).is_dir() or GLOB_CHARS & set(p) for p in args.input)
+    )
+
+    if batch:
+        if args.output or args.info or args.compare_formats:
+            print(
+                "Error: --output/--info/--compare-formats cannot be used "
+                "with batch conversion",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        if not inputs:
+            print("Error: No VRMA files found", file=sys.stderr)
+            sys.exit(1)
+        if args.pose_index:
+            try:
+                check_pose_index_dir(
+                    Path(args.pose_index),
+                    [Path(args.out_dir)]
+                    if args.out_dir
+                    else [Path(p).parent for p in inputs],
+                )
+            except ValueError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+
+        records = run_batch(
+            inputs,
+            Path(args.out_dir) if args.out_dir else None,
+            conversion_options(args),
+            jobs=args.jobs,
+            cache_dir=None if args.no_cache else Path(args.cache_dir),
+        )
+        print_batch_summary(records)
+        if args.pose_index:
+            files = json_output_files(records, conversion_options(args))
+            if update_pose_index(Path(args.pose_index), files, args.index_url_prefix):
+                print(f"Updated pose index: {args.pose_index}", file=sys.stderr)
+        if any(record["status"] == "error" for record in records):
+            sys.exit(1)
+        return
+
+    input_path = str(inputs[0])
 
     if args.info:
-        print(f"Spec Version: {result['specVersion']}")
-        print(f"Duration: {result['duration']:.3f}s")
-        print(f"Rest Hips Position: {result['restHipsPosition']}")
-        print(f"Bones ({len(result['boneNames'])}):")
-        for name in result["boneNames"]:
-            tracks = result["bones"][name]
-            paths = list(tracks.keys())
-            keyframes = max(len(t["times"]) for t in tracks.values())
-            print(f"  {name}: {', '.join(paths)} ({keyframes} keyframes)")
-        if "expressions" in result:
-            print(f"Expressions ({len(result['expressions'])}):")
-            for name in result["expressions"]:
-                print(f"  {name}")
-        if "lookAt" in result:
-            print("LookAt: yes")
+        print_info(*build_result(input_path, conversion_options(args)))
+        return
+
+    options = conversion_options(args)
+
+    if args.compare_formats:
+        result, _stats = build_result(input_path, options)
+        print(f"{'format':<24} {'size [bytes]':>12} {'encode [ms]':>12}")
+        for row in compare_formats(result, options, Path(input_path).stem):
+            print(f"{row['format']:<24} {row['size']:>12} {row['seconds'] * 1000:>12.2f}")
         return
 
-    indent = 2 if args.pretty else None
-    json_str = json.dumps(result, indent=indent, ensure_ascii=False)
+    if args.pose_index and not args.output:
+        print("Error: --pose-index requires --output", file=sys.stderr)
+        sys.exit(1)
+
+    if args.pose_index:
+        try:
+            check_pose_index_dir(Path(args.pose_index), [Path(args.output).parent])
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.format == "bin" and not args.output:
+        print("Error: --format bin requires --output", file=sys.stderr)
+        sys.exit(1)
 
     if args.output:
-        Path(args.output).write_text(json_str, encoding="utf-8")
-        print(f"Saved to {args.output}", file=sys.stderr)
-    else:
-        print(json_str)
+        written = convert_file(input_path, options, Path(args.output))
+        for target, _size in written:
+            print(f"Saved to {target}", file=sys.stderr)
+        if args.pose_index:
+            files = [target for target, _size in written if target.suffix == ".json"]
+            if update_pose_index(Path(args.pose_index), files, args.index_url_prefix):
+                print(f"Updated pose index: {args.pose_index}", file=sys.stderr)
+        return
+
+    if args.pose_at:
+        poses = extract_poses(input_path, args.pose_at)
+        print(to_json(poses[0] if len(poses) == 1 else poses, indent=options["indent"]))
+        return
+
+    if is_streaming(options):
+        stream_vrma(input_path, options, sys.stdout.buffer)
+        sys.stdout.buffer.write(b"\n")
+        return
+
+    result, _stats = build_result(input_path, options)
+    outputs = encode_outputs(result, options, Path(input_path).stem)
+    print(outputs[".json"].decode("utf-8"))
 
 
 if __name__ == "__main__":
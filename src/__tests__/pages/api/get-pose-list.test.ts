@@ -0,0 +1,181 @@
+/**
+ * get-pose-list API Tests
+ */
+
+import { createMocks } from 'node-mocks-http'
+import handler from '@/pages/api/get-pose-list'
+import { NextApiRequest, NextApiResponse } from 'next'
+
+jest.mock('fs', () => ({
+  promises: {
+    readdir: jest.fn(),
+    readFile: jest.fn(),
+    stat: jest.fn(),
+  },
+}))
+
+import fs from 'fs'
+
+const mockFs = fs as jest.Mocked<typeof fs>
+const mockReaddir = mockFs.promises.readdir as unknown as jest.Mock
+const mockReadFile = mockFs.promises.readFile as unknown as jest.Mock
+const mockStat = mockFs.promises.stat as unknown as jest.Mock
+
+const enoent = () => Object.assign(new Error('not found'), { code: 'ENOENT' })
+
+/**
+ * posesディレクトリとインデックスの更新時刻（null は存在しない）。
+ * ポーズファイルは fileMtimes に無ければディレクトリと同じ時刻にする。
+ */
+const mockMtimes = (
+  dirMtime: number | null,
+  indexMtime: number | null,
+  fileMtimes: Record<string, number> = {}
+) => {
+  mockStat.mockImplementation(async (filePath: string) => {
+    const file = filePath.split('/').pop() ?? ''
+    const mtimeMs =
+      file === 'index.json' ? indexMtime : (fileMtimes[file] ?? dirMtime)
+    if (mtimeMs === null) throw enoent()
+    return { mtimeMs }
+  })
+}
+
+describe('/api/get-pose-list', () => {
+  beforeEach(() => {
+    jest.clearAllMocks()
+  })
+
+  it('インデックスが無い場合は各ポーズJSONを読み込んで判定する', async () => {
+    mockReaddir.mockResolvedValue(['bow.json', 'broken.json', 'note.txt'])
+    mockMtimes(1000, null)
+    mockReadFile.mockImplementation(async (filePath: string) => {
+      if (filePath.endsWith('bow.json')) {
+        return JSON.stringify({ version: '1.0', pose: { hips: {} } })
+      }
+      return '{"unrelated": true}'
+    })
+
+    const { req, res } = createMocks<NextApiRequest, NextApiResponse>({
+      method: 'GET',
+    })
+
+    await handler(req, res)
+
+    expect(res._getStatusCode()).toBe(200)
+    expect(JSON.parse(res._getData())).toEqual([
+      { name: 'bow', path: '/poses/bow.json' },
+    ])
+  })
+
+  it('インデックスより新しいディレクトリは走査し、インデックスにあるファイルは読み込まない', async () => {
+    mockReaddir.mockResolvedValue(['index.json', 'bow.json', 'wave.json'])
+    mockMtimes(2000, 1000, { 'bow.json': 500 })
+    mockReadFile.mockImplementation(async (filePath: string) => {
+      if (filePath.endsWith('index.json')) {
+        return JSON.stringify({
+          version: 1,
+          poses: [{ name: 'bow', path: '/poses/bow.json', hash: 'abc123' }],
+        })
+      }
+      return JSON.stringify({ specVersion: '1.0', bones: { hips: {} } })
+    })
+
+    const { req, res } = createMocks<NextApiRequest, NextApiResponse>({
+      method: 'GET',
+    })
+
+    await handler(req, res)
+
+    expect(res._getStatusCode()).toBe(200)
+    expect(JSON.parse(res._getData())).toEqual([
+      { name: 'bow', path: '/poses/bow.json?v=abc123', hash: 'abc123' },
+      { name: 'wave', path: '/poses/wave.json' },
+    ])
+    const readPaths = mockReadFile.mock.calls.map(([filePath]) => filePath)
+    expect(readPaths.some((p: string) => p.endsWith('bow.json'))).toBe(false)
+  })
+
+  it('インデックスがディレクトリより新しい場合は走査せずにインデックスから返す', async () => {
+    mockMtimes(3000, 3000)
+    mockReadFile.mockResolvedValue(
+      JSON.stringify({
+        version: 1,
+        poses: [
+          { name: 'bow', path: '/poses/bow.json', hash: 'abc123' },
+          { name: 'wave', path: '/poses/wave.json', hash: 'def456' },
+        ],
+      })
+    )
+
+    const { req, res } = createMocks<NextApiRequest, NextApiResponse>({
+      method: 'GET',
+    })
+
+    await handler(req, res)
+
+    expect(res._getStatusCode()).toBe(200)
+    expect(JSON.parse(res._getData())).toEqual([
+      { name: 'bow', path: '/poses/bow.json?v=abc123', hash: 'abc123' },
+      { name: 'wave', path: '/poses/wave.json?v=def456', hash: 'def456' },
+    ])
+    expect(mockReaddir).not.toHaveBeenCalled()
+
+    // 2回目はインデックスも読み込まない
+    const second = createMocks<NextApiRequest, NextApiResponse>({
+      method: 'GET',
+    })
+    await handler(second.req, second.res)
+    expect(JSON.parse(second.res._getData())).toHaveLength(2)
+    expect(mockReadFile).toHaveBeenCalledTimes(1)
+    expect(mockReaddir).not.toHaveBeenCalled()
+  })
+
+  it('インデックス作成後に上書きされたポーズは読み込み直す', async () => {
+    mockReaddir.mockResolvedValue(['index.json', 'bow.json', 'wave.json'])
+    // ファイル数は変わらないためディレクトリの更新時刻はインデックスより古い
+    mockMtimes(4000, 4000, { 'bow.json': 5000 })
+    mockReadFile.mockImplementation(async (filePath: string) => {
+      if (filePath.endsWith('index.json')) {
+        return JSON.stringify({
+          version: 1,
+          poses: [
+            { name: 'bow', path: '/poses/bow.json', hash: 'abc123' },
+            { name: 'wave', path: '/poses/wave.json', hash: 'def456' },
+          ],
+        })
+      }
+      return JSON.stringify({ specVersion: '1.0', bones: { hips: {} } })
+    })
+
+    const { req, res } = createMocks<NextApiRequest, NextApiResponse>({
+      method: 'GET',
+    })
+
+    await handler(req, res)
+
+    expect(res._getStatusCode()).toBe(200)
+    expect(JSON.parse(res._getData())).toEqual([
+      { name: 'bow', path: '/poses/bow.json' },
+      { name: 'wave', path: '/poses/wave.json?v=def456', hash: 'def456' },
+    ])
+    expect(mockReaddir).toHaveBeenCalled()
+    const readPaths = mockReadFile.mock.calls.map(([filePath]) => filePath)
+    expect(readPaths.some((p: string) => p.endsWith('bow.json'))).toBe(true)
+    expect(readPaths.some((p: string) => p.endsWith('wave.json'))).toBe(false)
+  })
+
+  it('posesディレクトリが存在しない場合は空配列を返す', async () => {
+    mockMtimes(null, null)
+    mockReaddir.mockRejectedValue(enoent())
+
+    const { req, res } = createMocks<NextApiRequest, NextApiResponse>({
+      method: 'GET',
+    })
+
+    await handler(req, res)
+
+    expect(res._getStatusCode()).toBe(200)
+    expect(JSON.parse(res._getData())).toEqual([])
+  })
+})
@@ -171,7 +171,9 @@ export const PoseConfigSettings = () => {
               onChange={(e) => {
                 setNewJson(e.target.value)
                 if (e.target.value && !newId.trim()) {
-                  const fileName = e.target.value.split('/').pop() ?? ''
+                  // 一覧のパスには ?v=<内容ハッシュ> が付くことがある
+                  const fileName =
+                    e.target.value.split('?')[0].split('/').pop() ?? ''
                   setNewId(fileName.replace('.json', ''))
                 }
               }}
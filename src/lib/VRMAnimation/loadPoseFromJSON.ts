@@ -4,7 +4,9 @@ import { VRMHumanBoneName } from '@pixiv/three-vrm'
 import { VRMAnimation } from '@/lib/VRMAnimation/VRMAnimation'
 
 interface PoseTrackData {
-  times: number[]
+  times?: number[]
+  /** timelines のインデックス（vrma_to_json.py --shared-timelines 出力） */
+  timeline?: number
   values: number[][]
   interpolation: string
 }
@@ -22,11 +24,83 @@ interface PoseJSON {
   bones: Record<string, PoseBoneData>
   expressions?: Record<
     string,
-    { times: number[]; values: number[]; interpolation: string }
+    {
+      times?: number[]
+      timeline?: number
+      values: number[]
+      interpolation: string
+    }
   >
+  timelines?: number[][]
   yRotationOffsetDeg?: number
 }
 
+function resolveTimes(
+  json: PoseJSON,
+  track: { times?: number[]; timeline?: number }
+): number[] {
+  if (track.times) return track.times
+  if (track.timeline !== undefined && json.timelines) {
+    return json.timelines[track.timeline] ?? []
+  }
+  return []
+}
+
+/** vrma_to_json.py --format bin 出力で .bin サイドカー内の配列を指す参照 */
+interface BinaryArrayRef {
+  offset: number
+  count: number
+  size: number
+  component: 'f32' | 'i16'
+}
+
+function isBinaryArrayRef(value: unknown): value is BinaryArrayRef {
+  return (
+    typeof value === 'object' &&
+    value !== null &&
+    typeof (value as BinaryArrayRef).offset === 'number' &&
+    typeof (value as BinaryArrayRef).count === 'number' &&
+    typeof (value as BinaryArrayRef).size === 'number' &&
+    typeof (value as BinaryArrayRef).component === 'string'
+  )
+}
+
+function decodeBinaryArray(
+  buffer: ArrayBuffer,
+  ref: BinaryArrayRef
+): number[] | number[][] {
+  const length = ref.count * ref.size
+  const flat =
+    ref.component === 'i16'
+      ? Array.from(new Int16Array(buffer, ref.offset, length), (v) =>
+          Math.max(v / 32767, -1)
+        )
+      : Array.from(new Float32Array(buffer, ref.offset, length))
+  if (ref.size === 1) return flat
+
+  const nested: number[][] = []
+  for (let i = 0; i < ref.count; i++) {
+    nested.push(flat.slice(i * ref.size, (i + 1) * ref.size))
+  }
+  return nested
+}
+
+function resolveBinaryArrays(value: unknown, buffer: ArrayBuffer): unknown {
+  if (isBinaryArrayRef(value)) return decodeBinaryArray(buffer, value)
+  if (Array.isArray(value)) {
+    return value.map((item) => resolveBinaryArrays(item, buffer))
+  }
+  if (typeof value === 'object' && value !== null) {
+    return Object.fromEntries(
+      Object.entries(value).map(([key, item]) => [
+        key,
+        resolveBinaryArrays(item, buffer),
+      ])
+    )
+  }
+  return value
+}
+
 function convertWebPoseToVrma(webPose: {
   pose: Record<string, { rotation?: number[] }>
 }): PoseJSON {
@@ -65,6 +139,18 @@ export async function loadPoseFromJSON(
     if (raw.version && raw.pose && !raw.specVersion) {
       json = convertWebPoseToVrma(raw)
       json.yRotationOffsetDeg = raw.yRotationOffsetDeg
+    } else if (raw.buffer?.uri) {
+      // バイナリ形式（JSONインデックス + .binサイドカー）の場合は配列を展開
+      // ?v=<内容ハッシュ> はサイドカーも含めたハッシュなので、サイドカーにも付ける
+      const [base, query] = url.split('?')
+      const bufferUrl =
+        base.slice(0, base.lastIndexOf('/') + 1) +
+        raw.buffer.uri +
+        (query ? `?${query}` : '')
+      const bufferResponse = await fetch(bufferUrl)
+      if (!bufferResponse.ok) return null
+      const buffer = await bufferResponse.arrayBuffer()
+      json = resolveBinaryArrays(raw, buffer) as PoseJSON
     } else {
       json = raw
     }
@@ -83,7 +169,7 @@ export async function loadPoseFromJSON(
 
   for (const [boneName, boneData] of Object.entries(json.bones)) {
     if (boneData.rotation) {
-      const times = new Float32Array(boneData.rotation.times)
+      const times = new Float32Array(resolveTimes(json, boneData.rotation))
       const values = new Float32Array(boneData.rotation.values.flat())
       const track = new THREE.VectorKeyframeTrack(
         `${boneName}.quaternion`,
@@ -95,7 +181,7 @@ export async function loadPoseFromJSON(
 
     // hipsのtranslationはスケール差で位置ずれするため除外し、位置はidleに任せる
     if (boneData.translation && boneName !== 'hips') {
-      const times = new Float32Array(boneData.translation.times)
+      const times = new Float32Array(resolveTimes(json, boneData.translation))
       const values = new Float32Array(boneData.translation.values.flat())
       const track = new THREE.VectorKeyframeTrack(
         `${boneName}.position`,
@@ -153,7 +239,7 @@ export async function loadPoseFromJSON(
 
   if (json.expressions) {
     for (const [exprName, exprData] of Object.entries(json.expressions)) {
-      const times = new Float32Array(exprData.times)
+      const times = new Float32Array(resolveTimes(json, exprData))
       const values = new Float32Array(exprData.values)
       const track = new THREE.NumberKeyframeTrack(
         `${exprName}.weight`,
@@ -9,7 +9,10 @@ import { routePolicies } from '@/lib/accessPolicy/routePolicies'
 
 interface PoseListItem {
   name: string
+  /** 内容ハッシュがある場合は ?v=<hash> 付き（内容が変わるとURLも変わる） */
   path: string
+  /** 内容ハッシュ（ポーズインデックスがある場合のみ。キャッシュ無効化用） */
+  hash?: string
 }
 
 interface AssetManifest {
@@ -17,18 +20,115 @@ interface AssetManifest {
   [key: string]: unknown
 }
 
+/** scripts/vrma_to_json.py --pose-index が生成するインデックスのエントリ */
+interface PoseIndexEntry {
+  name: string
+  path: string
+  hash?: string
+  /** bin 形式の .bin サイドカーのファイル名 */
+  buffer?: string
+}
+
+interface PoseIndex {
+  poses?: PoseIndexEntry[]
+}
+
 const manifest = assetManifest as AssetManifest
 
+const POSE_INDEX_FILE = 'index.json'
+
+interface IndexedPose {
+  item: PoseListItem
+  /** 内容ハッシュの計算に含まれるファイル（ポーズJSONとサイドカー） */
+  files: string[]
+}
+
+interface LoadedPoseIndex {
+  mtimeMs: number
+  /** ファイル名 → 一覧項目 */
+  entries: Map<string, IndexedPose>
+}
+
+let poseIndexCache: LoadedPoseIndex | null = null
+
+/** 内容ハッシュをURLのクエリに付け、書き換え後のポーズをキャッシュから返させない */
+function withVersion(item: PoseListItem): PoseListItem {
+  return item.hash ? { ...item, path: `${item.path}?v=${item.hash}` } : item
+}
+
+/**
+ * 事前生成されたポーズインデックスを読み込む（無い・読めない場合はnull）。
+ * インデックスの更新時刻が変わらない限り再読み込みしない。
+ */
+async function loadPoseIndex(
+  posesDir: string
+): Promise<LoadedPoseIndex | null> {
+  const indexPath = path.join(posesDir, POSE_INDEX_FILE)
+  try {
+    const stat = await fs.promises.stat(indexPath)
+    if (poseIndexCache && poseIndexCache.mtimeMs === stat.mtimeMs) {
+      return poseIndexCache
+    }
+
+    const index = JSON.parse(
+      await fs.promises.readFile(indexPath, 'utf-8')
+    ) as PoseIndex
+    const entries = new Map<string, IndexedPose>()
+    for (const entry of index.poses ?? []) {
+      if (typeof entry.name !== 'string' || typeof entry.path !== 'string') {
+        continue
+      }
+      const file = path.basename(entry.path)
+      entries.set(file, {
+        item: withVersion({
+          name: entry.name,
+          path: entry.path,
+          ...(typeof entry.hash === 'string' && { hash: entry.hash }),
+        }),
+        files:
+          typeof entry.buffer === 'string'
+            ? [file, path.basename(entry.buffer)]
+            : [file],
+      })
+    }
+    poseIndexCache = { mtimeMs: stat.mtimeMs, entries }
+    return poseIndexCache
+  } catch {
+    return null
+  }
+}
+
+/**
+ * インデックス作成後にファイルが書き換えられていないかを確認する。
+ * 内容は読まず、ポーズJSONとサイドカーの更新時刻をインデックスと比べる。
+ */
+async function isIndexUpToDate(
+  posesDir: string,
+  poseIndex: LoadedPoseIndex,
+  indexed: IndexedPose
+): Promise<boolean> {
+  try {
+    const stats = await Promise.all(
+      indexed.files.map((file) => fs.promises.stat(path.join(posesDir, file)))
+    )
+    return stats.every((stat) => stat.mtimeMs <= poseIndex.mtimeMs)
+  } catch {
+    return false
+  }
+}
+
 async function handler(req: NextApiRequest, res: NextApiResponse) {
   if (isRestrictedMode()) {
     const poses = Array.isArray(manifest.poses)
-      ? manifest.poses.filter(
-          (item): item is PoseListItem =>
-            typeof item === 'object' &&
-            item !== null &&
-            typeof item.name === 'string' &&
-            typeof item.path === 'string'
-        )
+      ? manifest.poses
+          .filter(
+            (item): item is PoseListItem =>
+              typeof item === 'object' &&
+              item !== null &&
+              typeof item.name === 'string' &&
+              typeof item.path === 'string'
+          )
+          .map(withVersion)
       : []
     return res.status(200).json(poses)
   }
@@ -36,12 +136,40 @@ async function handler(req: NextApiRequest, res: NextApiResponse) {
   const posesDir = path.join(process.cwd(), 'public', 'poses')
 
   try {
+    const dirStat = await fs.promises.stat(posesDir)
+    const poseIndex = await loadPoseIndex(posesDir)
+
+    // インデックスがディレクトリ（ファイルの追加・削除）と各ポーズ（上書き）より
+    // 新しければ、走査せずに返す
+    if (poseIndex && poseIndex.mtimeMs >= dirStat.mtimeMs) {
+      const indexed = Array.from(poseIndex.entries.values())
+      const upToDate = await Promise.all(
+        indexed.map((entry) => isIndexUpToDate(posesDir, poseIndex, entry))
+      )
+      if (upToDate.every(Boolean)) {
+        return res.status(200).json(indexed.map((entry) => entry.item))
+      }
+    }
+
     const files = await fs.promises.readdir(posesDir)
-    const jsonFiles = files.filter((file) => file.endsWith('.json'))
+    const jsonFiles = files.filter(
+      (file) => file.endsWith('.json') && file !== POSE_INDEX_FILE
+    )
 
     const poseFiles: PoseListItem[] = []
 
     for (const file of jsonFiles) {
+      // インデックス作成後に書き換えられていないファイルは読み込み・パースを省略する
+      const indexed = poseIndex?.entries.get(file)
+      if (
+        poseIndex &&
+        indexed &&
+        (await isIndexUpToDate(posesDir, poseIndex, indexed))
+      ) {
+        poseFiles.push(indexed.item)
+        continue
+      }
+
       try {
         const filePath = path.join(posesDir, file)
         const content = await fs.promises.readFile(filePath, 'utf-8')